@@ -0,0 +1,80 @@
+"""Logins/s with associations warmed at startup against cold ones.
+
+Sequential logins (offline authentication then verification) on one
+thread against the local stand-in OP:
+
+    * direct: no association, check_authentication on every login
+    * cold: the association (DH key exchange) is established on the
+      login, as the first login of every OP Endpoint after a restart
+    * cold, background: the login falls back to direct verification
+      while the association is established in the background, DH
+      exponentiations on a process pool (waited for after the login)
+    * warm: association prewarmed, signatures checked locally
+
+"logins/CPU s" is logins per CPU second of this process (the stand-in OP
+runs on a thread of it, the process pool doesn't).
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_association.py
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from openid_wargaming.association import AssociationStore
+from openid_wargaming.authentication import Authentication
+from openid_wargaming.nonce import MemoryNonceStore
+from openid_wargaming.testing import StandInOP
+from openid_wargaming.transport import Transport
+from openid_wargaming.verification import Verification
+
+
+RETURN_TO_BASE = 'https://example.com/openid/callback'
+
+
+def login(op, transport, associations):
+    auth = Authentication(return_to_base=RETURN_TO_BASE,
+                          associations=associations)
+    auth.authenticate(op.endpoint, offline=True)
+    url = op.assertion(auth.return_to, assoc_handle=auth.assoc_handle)
+    Verification(url, transport=transport, store=MemoryNonceStore(),
+                 associations=associations).verify()
+
+
+def measure(name, logins, run):
+    started, cpu = time.perf_counter(), time.process_time()
+    for _ in range(logins):
+        run()
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu
+    print('%-18s %8.1f logins/s %8.1f logins/CPU s' % (
+        name, logins / elapsed, logins / cpu))
+
+
+def main(logins=300):
+    with StandInOP() as op, ProcessPoolExecutor(max_workers=1) as pool:
+        transport = Transport()
+        pool.submit(int).result()  # worker started before measuring
+
+        warm = AssociationStore(transport, executor=pool)
+        assert warm.prewarm([op.endpoint])[op.endpoint] is not None
+
+        measure('direct', logins, lambda: login(op, transport, None))
+        measure('cold', logins, lambda: login(
+            op, transport, AssociationStore(transport)))
+
+        def background():
+            associations = AssociationStore(transport, executor=pool)
+            login(op, transport, associations)
+            associations.close()
+
+        measure('cold, background', logins, background)
+        calls = op.calls['check_authentication']
+        measure('warm', logins, lambda: login(op, transport, warm))
+
+        assert op.calls['check_authentication'] == calls
+        warm.close()
+        transport.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Login start throughput: live checkid_setup GET, offline redirect and
+AuthenticationTemplate.
+
+The live mode talks with a local stand-in OP over a pooled Transport,
+so it is a lower bound of the real cost (no TLS, no internet latency).
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_authentication.py [logins]
+"""
+import sys
+import time
+
+from openid_wargaming.authentication import Authentication
+from openid_wargaming.authentication import AuthenticationTemplate
+from openid_wargaming.testing import StandInOP
+from openid_wargaming.transport import Transport
+
+
+RETURN_TO_BASE = 'https://example.com/openid/callback'
+
+
+def run(endpoint, logins, transport=None, offline=False):
+    started = time.perf_counter()
+    for _ in range(logins):
+        auth = Authentication(return_to_base=RETURN_TO_BASE,
+                              transport=transport)
+        auth.authenticate(endpoint, offline=offline)
+    return logins / (time.perf_counter() - started)
+
+
+def run_template(endpoint, logins):
+    template = AuthenticationTemplate(endpoint, RETURN_TO_BASE)
+    started = time.perf_counter()
+    for _ in range(logins):
+        template.start()
+    return logins / (time.perf_counter() - started)
+
+
+def main(logins=2000):
+    with StandInOP() as op:
+        transport = Transport()
+        live = run(op.endpoint, logins, transport)
+        transport.close()
+
+    offline = run(op.endpoint, logins * 10, offline=True)
+    template = run_template(op.endpoint, logins * 100)
+
+    print('live     %10.0f logins/s' % live)
+    print('offline  %10.0f logins/s' % offline)
+    print('template %10.0f logins/s' % template)
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
@@ -0,0 +1,44 @@
+"""Identity parsing: per-call re.search versus parse_identity.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_identity.py
+"""
+import re
+import time
+
+from openid_wargaming.identity import parse_identity, WargamingIdentity
+
+
+REALMS = ('eu', 'na', 'asia', 'ru')
+
+
+def identities(count):
+    return ['https://%s.wargaming.net/id/%d-Player%d/'
+            % (REALMS[index % 4], 500000000 + index, index)
+            for index in range(count)]
+
+
+def legacy(url):
+    """README regex extended to every realm, looked up on every call"""
+    match = re.search(r'https://(eu|na|asia|ru).wargaming.net/id/'
+                      r'([0-9]+)-(\w+)/', url)
+    if match is None:
+        return None
+    return WargamingIdentity(int(match.group(2)), match.group(3),
+                             match.group(1))
+
+
+def main(count=1000000):
+    urls = identities(count)
+    for label, function in (('re.search', legacy),
+                            ('parse_identity', parse_identity)):
+        started = time.perf_counter()
+        for url in urls:
+            function(url)
+        elapsed = time.perf_counter() - started
+        print('%-20s %d identities %6.3f s  %6.0f ns/identity'
+              % (label, count, elapsed, elapsed / count * 1e9))
+
+
+if __name__ == '__main__':
+    main()
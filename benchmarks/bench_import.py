@@ -0,0 +1,40 @@
+"""Cold import time of the package (python -X importtime).
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_import.py
+"""
+import subprocess
+import sys
+
+
+CASES = (
+    ('verification', 'import openid_wargaming.verification'),
+    ('authentication', 'import openid_wargaming.authentication'),
+    ('transport + requests', 'import openid_wargaming.transport, requests'),
+)
+
+
+def import_time(code):
+    """Cumulative microseconds of the top-level imports of code"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            stderr=subprocess.PIPE, universal_newlines=True,
+                            check=True)
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  ') and cumulative.strip().isdigit():
+            total += int(cumulative)
+    return total
+
+
+def main(repeat=5):
+    baseline = min(import_time('pass') for _ in range(repeat))
+    for name, code in CASES:
+        elapsed = min(import_time(code) for _ in range(repeat)) - baseline
+        print('%-22s %8.1f ms' % (name, elapsed / 1000))
+
+
+if __name__ == '__main__':
+    main()
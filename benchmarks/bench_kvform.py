@@ -0,0 +1,62 @@
+"""Key-Value Form decoding: legacy parse_l2l versus kvform.decode.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_kvform.py
+"""
+import timeit
+
+from openid_wargaming.kvform import decode
+
+
+CHECK_AUTHENTICATION = (
+    'ns:http://specs.openid.net/auth/2.0\n'
+    'is_valid:true\n'
+)
+CHECK_AUTHENTICATION_INVALIDATE = (
+    'ns:http://specs.openid.net/auth/2.0\n'
+    'is_valid:true\n'
+    'invalidate_handle:{HMAC-SHA256}{5a2f1e8b}{dGVzdGhhbmRsZQ==}\n'
+)
+ASSOCIATE = (
+    'ns:http://specs.openid.net/auth/2.0\n'
+    'assoc_handle:{HMAC-SHA256}{5a2f1e8b}{dGVzdGhhbmRsZQ==}\n'
+    'session_type:DH-SHA256\n'
+    'assoc_type:HMAC-SHA256\n'
+    'expires_in:1209600\n'
+    'dh_server_public:' + 'A' * 172 + '\n'
+    'enc_mac_key:' + 'B' * 44 + '\n'
+)
+
+
+def legacy(response):
+    """Verification.parse_l2l before kvform"""
+    def convert_type(value):
+        TYPES = {
+            'false': False,
+            'true': True
+        }
+        return TYPES.get(value, value)
+
+    cleaned = response.strip().split('\n')
+    return {fields.split(':')[0].strip():
+            convert_type(''.join(fields.split(':')[1:]).strip())
+            for fields in cleaned}
+
+
+def main(number=100000):
+    for name, response in (('check_authentication', CHECK_AUTHENTICATION),
+                           ('check_authentication+invalidate',
+                            CHECK_AUTHENTICATION_INVALIDATE),
+                           ('associate', ASSOCIATE)):
+        data = response.encode('utf-8')
+        print(name)
+        for label, function, argument in (('legacy', legacy, response),
+                                          ('kvform', decode, response),
+                                          ('kvform bytes', decode, data)):
+            elapsed = min(timeit.repeat(lambda: function(argument),
+                                        number=number, repeat=3))
+            print('  %-13s %6.2f us' % (label, elapsed / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Callback throughput of OpenIDMiddleware against a plain WSGI handler.
+
+The plain handler does what the README used to ask for: rebuild the
+current URL from the environ and give it to Verification. Both verify
+the same fresh assertions, signed with a shared association so the
+signature is checked locally, against the local stand-in OP.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_middleware.py
+"""
+import time
+from urllib.parse import urlsplit
+from wsgiref.util import request_uri, setup_testing_defaults
+
+from openid_wargaming.association import AssociationStore
+from openid_wargaming.middleware import OpenIDMiddleware
+from openid_wargaming.nonce import MemoryNonceStore
+from openid_wargaming.testing import StandInOP
+from openid_wargaming.transport import Transport
+from openid_wargaming.utils import REALMS
+from openid_wargaming.verification import Verification
+
+
+RETURN_TO = 'https://example.com/openid/callback?request_id=' + 'a' * 32
+
+
+def environ_of(url):
+    parts = urlsplit(url)
+    environ = {'wsgi.url_scheme': parts.scheme, 'HTTP_HOST': parts.netloc,
+               'PATH_INFO': parts.path, 'QUERY_STRING': parts.query}
+    setup_testing_defaults(environ)
+    return environ
+
+
+def start_response(status, headers):
+    pass
+
+
+def ok(environ, start_response):
+    start_response('200 OK', [])
+    return [b'']
+
+
+def main(number=5000):
+    with StandInOP() as op:
+        # identities of the stand-in OP are trusted as eu ones
+        REALMS['eu'] += (op.endpoint,)
+        transport = Transport()
+        associations = AssociationStore(transport)
+        handle = associations.handle(op.endpoint)
+
+        def plain(environ, start_response):
+            Verification(request_uri(environ), store=store,
+                         associations=associations).verify()
+            return ok(environ, start_response)
+
+        store = MemoryNonceStore()
+        middleware = OpenIDMiddleware(ok, '/openid/callback', [op.endpoint],
+                                      store=store, associations=associations)
+
+        for name, app in (('plain handler', plain),
+                          ('middleware', middleware)):
+            environs = [environ_of(op.assertion(RETURN_TO,
+                                                assoc_handle=handle))
+                        for _ in range(number)]
+            started = time.perf_counter()
+            for environ in environs:
+                app(environ, start_response)
+            elapsed = time.perf_counter() - started
+            print('%-14s %9.1f callbacks/s %7.2f us/callback' % (
+                name, number / elapsed, elapsed / number * 1e6))
+
+        assert all(environ['openid_wargaming.identity'] is not None
+                   for environ in environs)
+        assert op.calls['check_authentication'] == 0
+        transport.close()
+
+
+if __name__ == '__main__':
+    main()
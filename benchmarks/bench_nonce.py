@@ -0,0 +1,90 @@
+"""Nonce stores throughput at millions of nonces.
+
+Simulates a steady login rate: every nonce carries the current
+(simulated) second, so old buckets keep expiring while the store
+is being filled.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_nonce.py [nonces] [logins/s]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from openid_wargaming.nonce import MemoryNonceStore, MmapNonceStore
+
+
+ENDPOINT = 'https://eu.wargaming.net/id/openid/'
+START = 1502366400
+
+
+class Clock:
+    now = START
+
+    def __call__(self):
+        return self.now
+
+
+def nonces(total, rate):
+    for index in range(total):
+        second = START + index // rate
+        stamp = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(second))
+        yield second, stamp + '%012x' % index
+
+
+def fill(samples, store, clock):
+    for second, nonce in samples:
+        clock.now = second
+        store.add(ENDPOINT, nonce)
+    return store
+
+
+def main(total=2000000, rate=5000):
+    samples = list(nonces(total, rate))
+
+    clock = Clock()
+    started = time.perf_counter()
+    store = fill(samples, MemoryNonceStore(max_age=300, clock=clock), clock)
+    elapsed = time.perf_counter() - started
+
+    clock = Clock()
+    tracemalloc.start()
+    measured = fill(samples, MemoryNonceStore(max_age=300, clock=clock),
+                    clock)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del measured
+
+    started = time.perf_counter()
+    replayed = sum(store.add(ENDPOINT, nonce) for _, nonce in samples[-rate:])
+    replay_elapsed = time.perf_counter() - started
+
+    print('inserted  %d nonces at %d logins/s (simulated)' % (total, rate))
+    print('MemoryNonceStore')
+    print('  insert  %10.0f ops/s' % (total / elapsed))
+    print('  replay  %10.0f ops/s (%d accepted)' % (rate / replay_elapsed,
+                                                   replayed))
+    print('  memory  %d nonces, %.1f MiB' % (len(store), current / 2 ** 20))
+
+    # Half full with max_age seconds of logins
+    capacity = rate * 300 * 2
+    with tempfile.TemporaryDirectory() as directory:
+        clock = Clock()
+        table = MmapNonceStore(os.path.join(directory, 'nonces'),
+                               capacity=capacity, clock=clock)
+        started = time.perf_counter()
+        fill(samples, table, clock)
+        elapsed = time.perf_counter() - started
+        size = len(table._map)
+        table.close()
+
+    print('MmapNonceStore')
+    print('  insert  %10.0f ops/s (%d rejected on full slots)' % (
+        total / elapsed, table.overflows))
+    print('  memory  %d slots, %.1f MiB' % (table.capacity, size / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
@@ -0,0 +1,84 @@
+"""Cost of rejecting garbage and replayed assertions.
+
+Every rejected assertion must fail on the local validators or the nonce
+store read: no request to the OP, no nonce saved.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_rejection.py
+"""
+import time
+import timeit
+from urllib.parse import urlencode
+
+from openid_wargaming.nonce import MemoryNonceStore
+from openid_wargaming.verification import Verification
+
+
+ENDPOINT = 'https://eu.wargaming.net/id/openid/'
+RETURN_TO = 'https://example.com/openid/callback?request_id=' + 'a' * 32
+
+
+class NoTransport:
+    """Transport failing the benchmark on any request"""
+    def get(self, *args, **kwargs):
+        raise AssertionError('network request sent')
+
+    post = get
+
+
+def assertion(**fields):
+    values = {
+        'openid.ns': 'http://specs.openid.net/auth/2.0',
+        'openid.mode': 'id_res',
+        'openid.op_endpoint': ENDPOINT,
+        'openid.claimed_id': 'https://eu.wargaming.net/id/1000000-JohnDoe/',
+        'openid.identity': 'https://eu.wargaming.net/id/1000000-JohnDoe/',
+        'openid.return_to': RETURN_TO,
+        'openid.response_nonce': time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                                               time.gmtime()) + 'b' * 12,
+        'openid.assoc_handle': '{HMAC-SHA256}{5a2f1e8b}{' + 'c' * 24 + '}',
+        'openid.signed': 'assoc_handle,claimed_id,identity,mode,ns,'
+                         'op_endpoint,response_nonce,return_to,signed',
+        'openid.sig': 'd' * 44,
+    }
+    values.update(fields)
+    return RETURN_TO + '&' + urlencode(
+        {key: value for key, value in values.items() if value is not None})
+
+
+def main(number=20000):
+    store = MemoryNonceStore()
+    replayed = assertion()
+    store.add(ENDPOINT,
+              Verification(replayed).parsed.fields['openid.response_nonce'])
+    size = len(store)
+    transport = NoTransport()
+
+    cases = (
+        ('garbage', 'https://example.com/openid/callback?foo=bar'),
+        ('cancel', assertion(**{'openid.mode': 'cancel'})),
+        ('wrong return_to', assertion(**{'openid.return_to':
+                                         RETURN_TO + 'x'})),
+        ('unsigned', assertion(**{'openid.sig': None})),
+        ('stale nonce', assertion(**{'openid.response_nonce':
+                                     '2017-08-10T12:00:00Zbbbb'})),
+        ('replayed', replayed),
+    )
+    for name, url in cases:
+        def reject():
+            try:
+                Verification(url, transport=transport, store=store).verify()
+            except AssertionError:
+                raise
+            except Exception:
+                return
+            raise AssertionError('%s accepted' % name)
+
+        elapsed = min(timeit.repeat(reject, number=number, repeat=3))
+        print('%-16s %6.2f us/rejection' % (name, elapsed / number * 1e6))
+
+    assert len(store) == size, 'nonces saved while rejecting'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Per-verification cost of the local validator chain.
+
+Compares the legacy behaviour (every validator parsing the assertion
+query again) against the current single-parse ParsedAssertion.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_verification.py
+"""
+import timeit
+from urllib.parse import urlparse, parse_qs, urlencode
+
+from openid_wargaming.verification import Verification
+
+
+RETURN_TO = 'https://example.com/openid/callback?request_id=' + 'a' * 32
+ASSERTION_URL = RETURN_TO + '&' + urlencode({
+    'openid.ns': 'http://specs.openid.net/auth/2.0',
+    'openid.mode': 'id_res',
+    'openid.op_endpoint': 'https://eu.wargaming.net/id/openid/',
+    'openid.claimed_id': 'https://eu.wargaming.net/id/1000000-JohnDoe/',
+    'openid.identity': 'https://eu.wargaming.net/id/1000000-JohnDoe/',
+    'openid.return_to': RETURN_TO,
+    'openid.response_nonce': '2017-08-10T12:00:00Z' + 'b' * 12,
+    'openid.assoc_handle': '{HMAC-SHA256}{5a2f1e8b}{' + 'c' * 24 + '}',
+    'openid.signed': 'assoc_handle,claimed_id,identity,mode,ns,'
+                     'op_endpoint,response_nonce,return_to,signed',
+    'openid.sig': 'd' * 44,
+})
+
+
+def legacy():
+    """Parsing pattern of the validator chain before ParsedAssertion"""
+    assertion = urlparse(ASSERTION_URL)
+
+    def return_to():
+        return urlparse(parse_qs(assertion.query)['openid.return_to'][0])
+
+    parse_qs(assertion.query)['openid.mode'][0]
+    for attribute in ('scheme', 'netloc', 'path'):
+        getattr(assertion, attribute) == getattr(return_to(), attribute)
+    parse_qs(return_to().query)
+    parse_qs(assertion.query)
+    parse_qs(assertion.query)['openid.response_nonce'][0]
+    query = parse_qs(assertion.query)
+    query['openid.mode'][0] = 'check_authentication'
+    urlencode({key: value[0] for key, value in query.items()})
+    parse_qs(assertion.query)['openid.op_endpoint'][0]
+    parse_qs(assertion.query)['openid.identity'][0]
+
+
+def current():
+    """Same work on top of the current Verification"""
+    verification = Verification(ASSERTION_URL)
+    verification.is_positive_assertion()
+    verification.verify_return_url()
+    verification.check_nonce()
+    verification.check_authentication_payload()
+    verification.op_endopint
+    verification.identify_the_end_user()
+
+
+def main(number=20000):
+    print('assertion url: %d bytes' % len(ASSERTION_URL))
+    for name, function in (('legacy', legacy), ('current', current)):
+        elapsed = min(timeit.repeat(function, number=number, repeat=3))
+        print('%-8s %8.2f us/verification' % (name,
+                                              elapsed / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Per-callback allocations of Verification against a shared Verifier.
+
+Both verify the same positive assertions with the same configuration
+(nonce store, transport answering is_valid:true without network). A
+Verification carries the whole configuration and builds its validator
+chain for every callback, a Verifier only creates the assertion state.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_verifier.py
+"""
+import time
+import timeit
+import tracemalloc
+from urllib.parse import urlencode
+
+from openid_wargaming.nonce import MemoryNonceStore
+from openid_wargaming.verification import Verification, Verifier
+
+
+ENDPOINT = 'https://eu.wargaming.net/id/openid/'
+RETURN_TO = 'https://example.com/openid/callback?request_id=' + 'a' * 32
+
+
+class Response:
+    text = 'is_valid:true\nns:http://specs.openid.net/auth/2.0\n'
+
+
+class SignedTransport:
+    """Transport answering every direct verification positively"""
+    def post(self, *args, **kwargs):
+        return Response()
+
+
+def assertions(number):
+    timestamp = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    return [RETURN_TO + '&' + urlencode({
+        'openid.ns': 'http://specs.openid.net/auth/2.0',
+        'openid.mode': 'id_res',
+        'openid.op_endpoint': ENDPOINT,
+        'openid.claimed_id': 'https://eu.wargaming.net/id/1000000-JohnDoe/',
+        'openid.identity': 'https://eu.wargaming.net/id/1000000-JohnDoe/',
+        'openid.return_to': RETURN_TO,
+        'openid.response_nonce': '%s%08d' % (timestamp, index),
+        'openid.assoc_handle': '{HMAC-SHA256}{5a2f1e8b}{' + 'c' * 24 + '}',
+        'openid.signed': 'assoc_handle,claimed_id,identity,mode,ns,'
+                         'op_endpoint,response_nonce,return_to,signed',
+        'openid.sig': 'd' * 44,
+    }) for index in range(number)]
+
+
+ASSERTION = assertions(1)[0]
+
+
+def peak(verify, urls):
+    """Median of the traced memory peak of every callback"""
+    tracemalloc.start()
+    peaks = []
+    for url in urls:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        verify(url)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return sorted(peaks)[len(peaks) // 2]
+
+
+def elapsed(verify, urls):
+    started = time.perf_counter()
+    for url in urls:
+        verify(url)
+    return (time.perf_counter() - started) / len(urls)
+
+
+def verification(transport):
+    store = MemoryNonceStore()
+    return lambda url: Verification(url, store=store,
+                                    transport=transport).verify()
+
+
+def verifier(transport):
+    return Verifier([ENDPOINT], store=MemoryNonceStore(),
+                    transport=transport).verify
+
+
+def main(number=5000, rounds=5):
+    transport = SignedTransport()
+    urls = iter(assertions((2 * rounds + 2) * number))
+
+    def batch():
+        return [next(urls) for _ in range(number)]
+
+    # fresh nonce stores for every batch and interleaved rounds, against
+    # the store growth and the machine noise
+    cases = (('Verification', verification), ('Verifier', verifier))
+    timings = {name: [] for name, _ in cases}
+    for _ in range(rounds):
+        for name, factory in cases:
+            timings[name].append(elapsed(factory(transport), batch()))
+
+    for name, factory in cases:
+        print('%-13s %7.2f us/callback  peak %6d bytes/callback' % (
+            name, min(timings[name]) * 1e6, peak(factory(transport),
+                                                  batch())))
+
+    # the part of a callback saved by a Verifier: per-callback setup of
+    # the configuration and the validator chain
+    assertion = Verification(ASSERTION).assertion
+    store, shared = MemoryNonceStore(), Verifier(transport=transport)
+    setups = (
+        ('Verification', lambda url: Verification(
+            url, store=store, transport=transport).validators),
+        ('Verifier', shared.context),
+    )
+    for name, setup in setups:
+        print('%-13s %7.2f us/setup     peak %6d bytes/setup' % (
+            name, min(timeit.repeat(lambda: setup(assertion), number=20000,
+                                    repeat=3)) / 20000 * 1e6,
+            peak(setup, [assertion] * 1000)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,6 @@
 """Example to test library."""
 
 
-import re
 import _thread
 from http.server import BaseHTTPRequestHandler, HTTPServer
 
@@ -47,14 +46,12 @@ httpd = HTTPServer(('', PORT), SimpleHTTP)
 httpd.serve_forever()
 
 current_url = '{0}{1}'.format(return_to.rstrip('/'), VERIFY_URL)
-regex = r'https://eu.wargaming.net/id/([0-9]+)-(\w+)/'
-
 verify = Verification(current_url)
 identities = verify.verify()
 
-match = re.search(regex, identities['identity'])
-account_id = match.group(1)
-nickname = match.group(2)
+player = verify.identify_the_end_user(as_identity=True)
+account_id = player.account_id
+nickname = player.nickname
 
 print('''
 ### Wargaming nickname authenticated: {0}'''.format(nickname))
\ No newline at end of file
@@ -0,0 +1,362 @@
+"""OpenID 2.0 - Establishing Associations
+
+Shared secrets between the Relying Party and the OP, used to check the
+assertion signatures locally instead of asking the OP (direct
+verification) on every login.
+
+Ref: https://openid.net/specs/openid-authentication-2_0.html#associations
+"""
+import base64
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlparse
+
+from .exceptions import OpenIDAssociationFailed
+from .kvform import decode
+from .transport import post
+
+
+OPENID_NS = 'http://specs.openid.net/auth/2.0'
+
+# Section 8.1.2
+DEFAULT_MODULUS = int(
+    'DCF93A0B883972EC0E19989AC5A2CE310E1D37717E8D9571BB7623731866E61E'
+    'F75A2E27898B057F9891C2E27A639C3F29B60814581CD3B2CA3986D2683705577'
+    'D45C2E7E52DC81C7A171876E5CEA74B1448BFDFAF18828EFD2519F14E45E38266'
+    '34AF1949E5B535CC829A483B8A76223E5D490A257F05BDFF16F2FB22C583AB', 16)
+DEFAULT_GENERATOR = 2
+
+DIGESTS = {
+    'HMAC-SHA1': hashlib.sha1,
+    'HMAC-SHA256': hashlib.sha256,
+}
+SESSION_DIGESTS = {
+    'DH-SHA1': hashlib.sha1,
+    'DH-SHA256': hashlib.sha256,
+}
+
+ASSOCIATE_HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+
+def btwoc(value):
+    """Big-endian two's complement representation of a positive integer
+
+    Section 4.2
+    """
+    return value.to_bytes(value.bit_length() // 8 + 1, 'big')
+
+
+def unbtwoc(data):
+    return int.from_bytes(data, 'big')
+
+
+def xor(first, second):
+    return bytes(a ^ b for a, b in zip(first, second))
+
+
+def signature_message(fields, signed):
+    """Key-Value Form message of the signed fields (Section 6.1)"""
+    return ''.join('%s:%s\n' % (name, fields['openid.' + name])
+                   for name in signed).encode('utf-8')
+
+
+class Association:
+    """Shared secret with an OP
+
+    Args:
+        handle: openid.assoc_handle
+        secret: MAC key (bytes)
+        assoc_type: HMAC-SHA1 or HMAC-SHA256
+        expires_at: seconds since epoch
+    """
+    __slots__ = ('handle', 'secret', 'assoc_type', 'expires_at')
+
+    def __init__(self, handle, secret, assoc_type, expires_at):
+        self.handle = handle
+        self.secret = secret
+        self.assoc_type = assoc_type
+        self.expires_at = expires_at
+
+    def sign(self, fields, signed):
+        """openid.sig of the fields listed in signed"""
+        digest = hmac.new(self.secret, signature_message(fields, signed),
+                          DIGESTS[self.assoc_type])
+        return base64.b64encode(digest.digest()).decode('ascii')
+
+    def verify(self, fields):
+        """Check the signature of an assertion (Section 11.4.1)"""
+        signed = fields.get('openid.signed')
+        signature = fields.get('openid.sig')
+        if not signed or not signature:
+            return False
+
+        try:
+            expected = self.sign(fields, signed.split(','))
+        except KeyError:
+            return False
+
+        # bytes: compare_digest raises TypeError on non-ASCII str
+        return hmac.compare_digest(expected.encode(),
+                                   signature.encode('utf-8'))
+
+
+class DiffieHellman:
+    """Diffie-Hellman key exchange of the associate request (Section 8.4.2)
+
+    Args:
+        modulus
+        generator
+        private: private key (random by default)
+    """
+    def __init__(self, modulus=DEFAULT_MODULUS, generator=DEFAULT_GENERATOR,
+                 private=None):
+        self.modulus = modulus
+        self.generator = generator
+        self.private = private or secrets.randbelow(modulus - 2) + 1
+        self.public = pow(generator, self.private, modulus)
+
+    def shared_secret(self, other_public):
+        return pow(other_public, self.private, self.modulus)
+
+    def xor_secret(self, other_public, secret, digest):
+        """Encrypt or decrypt a MAC key with the shared secret"""
+        shared = btwoc(self.shared_secret(other_public))
+        return xor(digest(shared).digest(), secret)
+
+
+def mac_key(exchange, server_public, enc_mac_key, session_type):
+    """MAC key of a DH associate response (module level: picklable)"""
+    return exchange.xor_secret(server_public, enc_mac_key,
+                               SESSION_DIGESTS[session_type])
+
+
+def _run(executor, function, *args):
+    if executor is None:
+        return function(*args)
+    return executor.submit(function, *args).result()
+
+
+def associate(endpoint, transport=None, assoc_type='HMAC-SHA256',
+              session_type='DH-SHA256', clock=time.time, executor=None):
+    """Establish an association with the OP (Section 8)
+
+    Args:
+        endpoint: OP Endpoint URL
+        transport: Transport (module level requests.post when missing)
+        assoc_type: HMAC-SHA1 or HMAC-SHA256
+        session_type: DH-SHA1, DH-SHA256 or no-encryption (HTTPS only)
+        executor: concurrent.futures executor running the DH modular
+                  exponentiations (a ProcessPoolExecutor keeps them off
+                  the GIL). In the calling thread when missing.
+
+    Returns:
+        Association
+
+    Raises:
+        OpenIDAssociationFailed: the OP refused or the response is invalid
+    """
+    payload = {
+        'openid.ns': OPENID_NS,
+        'openid.mode': 'associate',
+        'openid.assoc_type': assoc_type,
+        'openid.session_type': session_type,
+    }
+
+    if session_type == 'no-encryption':
+        if urlparse(endpoint).scheme != 'https':
+            raise OpenIDAssociationFailed(
+                'no-encryption sessions require HTTPS', endpoint)
+        exchange = None
+    else:
+        exchange = _run(executor, DiffieHellman)
+        payload['openid.dh_consumer_public'] = base64.b64encode(
+            btwoc(exchange.public)).decode('ascii')
+
+    http_post = transport.post if transport else post
+    started = clock()
+    request = http_post(endpoint, urlencode(payload), allow_redirects=False,
+                        headers=ASSOCIATE_HEADERS)
+    response = decode(request.text, convert=False)
+
+    if 'error' in response or 'assoc_handle' not in response:
+        raise OpenIDAssociationFailed(
+            response.get('error', 'invalid associate response'), endpoint)
+
+    try:
+        if exchange is None:
+            secret = base64.b64decode(response['mac_key'])
+        else:
+            server_public = unbtwoc(
+                base64.b64decode(response['dh_server_public']))
+            secret = _run(executor, mac_key, exchange, server_public,
+                          base64.b64decode(response['enc_mac_key']),
+                          session_type)
+        expires_in = int(response['expires_in'])
+    except (KeyError, ValueError) as error:
+        raise OpenIDAssociationFailed('invalid associate response: %s'
+                                      % error, endpoint)
+
+    return Association(response['assoc_handle'], secret,
+                       response.get('assoc_type', assoc_type),
+                       started + expires_in)
+
+
+class AssociationStore:
+    """Associations cache, one current association per OP Endpoint.
+
+    Expired associations are forgotten, and the OP is not asked again for
+    retry_after seconds when an associate request fails (the library falls
+    back to direct verification meanwhile).
+
+    With an executor, associations are established off the request path:
+    handle starts a background associate request when the association is
+    missing (falling back to direct verification meanwhile) or less than
+    two margins away from expiring, and the DH key exchange runs on the
+    executor. prewarm associates at startup.
+
+    Args:
+        transport: Transport used on associate requests
+        assoc_type
+        session_type
+        margin: seconds of life an association needs to be used on a new
+                authentication request
+        retry_after: seconds to wait after a failed associate request
+        clock: function returning the current time in seconds
+        executor: concurrent.futures executor of the DH key exchange
+                  (ProcessPoolExecutor)
+    """
+    def __init__(self, transport=None, assoc_type='HMAC-SHA256',
+                 session_type='DH-SHA256', margin=300, retry_after=60,
+                 clock=time.time, executor=None):
+        self.transport = transport
+        self.assoc_type = assoc_type
+        self.session_type = session_type
+        self.margin = margin
+        self.retry_after = retry_after
+        self.clock = clock
+        self.executor = executor
+        self._lock = threading.Lock()
+        self._associations = {}
+        self._current = {}
+        self._failures = {}
+        self._renewing = set()
+        self._renewals = None
+
+    def handle(self, endpoint):
+        """Handle to send on a new authentication request.
+
+        Associates with the OP when there is no usable association (in
+        the background with an executor).
+
+        Returns:
+            openid.assoc_handle, or None when the OP can't associate
+        """
+        now = self.clock()
+        with self._lock:
+            association = self._current.get(endpoint)
+            usable = association is not None and \
+                association.expires_at - self.margin > now
+
+            renew = self.executor is not None and \
+                (not usable or
+                 association.expires_at - 2 * self.margin <= now) and \
+                endpoint not in self._renewing and \
+                self._failures.get(endpoint, 0) <= now
+            if renew:
+                self._renewing.add(endpoint)
+
+            blocking = not usable and self.executor is None and \
+                self._failures.get(endpoint, 0) <= now
+
+        if renew:
+            self._renewer().submit(self._renew, endpoint)
+        if usable:
+            return association.handle
+        if not blocking:
+            return None
+
+        association = self._associate(endpoint)
+        return association.handle if association is not None else None
+
+    def prewarm(self, endpoints):
+        """Associate with every endpoint at once, before the first login
+
+        Returns:
+            {endpoint: openid.assoc_handle or None}
+        """
+        endpoints = list(endpoints)
+        associations = list(self._renewer().map(self._associate, endpoints))
+        return {endpoint: association.handle if association else None
+                for endpoint, association in zip(endpoints, associations)}
+
+    def close(self):
+        """Stop the background associate requests"""
+        if self._renewals is not None:
+            self._renewals.shutdown(wait=True)
+            self._renewals = None
+
+    def _associate(self, endpoint):
+        """New association with endpoint (None when the request failed)"""
+        now = self.clock()
+        try:
+            association = associate(endpoint, self.transport,
+                                    self.assoc_type, self.session_type,
+                                    self.clock, self.executor)
+        except Exception:
+            with self._lock:
+                self._failures[endpoint] = now + self.retry_after
+            return None
+
+        self.add(endpoint, association)
+        return association
+
+    def _renew(self, endpoint):
+        try:
+            self._associate(endpoint)
+        finally:
+            with self._lock:
+                self._renewing.discard(endpoint)
+
+    def _renewer(self):
+        """Threads sending the background associate requests"""
+        with self._lock:
+            if self._renewals is None:
+                self._renewals = ThreadPoolExecutor(
+                    max_workers=4, thread_name_prefix='openid-associate')
+            return self._renewals
+
+    def add(self, endpoint, association):
+        with self._lock:
+            self._associations[endpoint, association.handle] = association
+            self._current[endpoint] = association
+
+    def get(self, endpoint, handle):
+        """Association of endpoint with that handle (None if unknown)"""
+        if not handle:
+            return None
+
+        with self._lock:
+            association = self._associations.get((endpoint, handle))
+            if association is None:
+                return None
+
+            if association.expires_at <= self.clock():
+                self._remove(endpoint, handle)
+                return None
+
+            return association
+
+    def invalidate(self, endpoint, handle):
+        """Forget an association the OP doesn't accept anymore"""
+        with self._lock:
+            self._remove(endpoint, handle)
+
+    def _remove(self, endpoint, handle):
+        association = self._associations.pop((endpoint, handle), None)
+        if association is not None and \
+           self._current.get(endpoint) is association:
+            del self._current[endpoint]
@@ -0,0 +1,120 @@
+"""OpenID 2.0 - Verifiying Assertions on asyncio
+
+Ref: https://openid.net/specs/openid-authentication-2_0.html#verification
+"""
+import inspect
+import time
+
+from .transport import AsyncTransport
+from .verification import Verification, CHECK_AUTHENTICATION_HEADERS
+from .verification import cost, NETWORK
+
+
+class AsyncVerification(Verification):
+    """OpenID data verification without blocking the event loop.
+
+    Same validator chain and exceptions than Verification, but the direct
+    verification request is sent through an async transport.
+
+    Args:
+        assertion_url
+        transport: object with a coroutine ``post(url, data, headers)``
+                   returning an object with a ``text`` attribute.
+                   AsyncTransport by default.
+        flights: AsyncSingleFlight (a SingleFlight would block the loop)
+        **kwargs: any other Verification argument
+    """
+    def __init__(self, assertion_url, transport=None, **kwargs):
+        transport = transport or AsyncTransport()
+        super().__init__(assertion_url, transport=transport, **kwargs)
+
+    @cost(NETWORK)
+    async def verify_discovered_information(self):
+        """Verification.verify_discovered_information off the event loop
+
+        Discovery requests are blocking: they run on the default executor.
+
+        Reference: https://openid.net/specs/openid-authentication-2_0.html#verification
+        Section: 11.2
+        """
+        if self.discovery is None:
+            return True
+
+        import asyncio
+
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.discovery.verify, self.parsed.fields)
+
+    @cost(NETWORK)
+    async def verify_signatures(self):
+        """OpenID Verifying Signatures (Wargaming uses Direct Verification).
+
+        Reference: https://openid.net/specs/openid-authentication-2_0.html#verification
+        Section: 11.4.1 and 11.4.2
+        """
+        is_valid = self.verify_signatures_with_association()
+        if is_valid is not None:
+            return is_valid
+
+        payload = self.check_authentication_payload()
+        if self.flights is None:
+            response = await self.send_check_authentication(payload)
+        else:
+            response = await self.flights.do((self.op_endopint, payload),
+                                             self.send_check_authentication,
+                                             payload)
+
+        return self.check_authentication_result(response)
+
+    async def send_check_authentication(self, payload):
+        """Text of the OP response to the direct verification request"""
+        started = time.perf_counter()
+        try:
+            request = await self.transport.post(
+                self.op_endopint, payload,
+                headers=CHECK_AUTHENTICATION_HEADERS)
+        except Exception as error:
+            if self.observer is not None:
+                self.observer.record('http', 'check_authentication',
+                                     time.perf_counter() - started, 'error',
+                                     type(error).__name__)
+            raise
+
+        if self.observer is not None:
+            status_code = getattr(request, 'status_code', 200)
+            self.observer.record('http', 'check_authentication',
+                                 time.perf_counter() - started,
+                                 'ok' if status_code < 400 else 'fail',
+                                 None if status_code < 400
+                                 else 'HTTP %d' % status_code)
+
+        return request.text
+
+    async def verify(self):
+        """Process to verify an OpenID assertion.
+
+        Returns:
+            Identification
+        """
+        cached = self.cached_result()
+        if cached is not None:
+            return cached
+
+        for validator in self.validators:
+            started = time.perf_counter()
+            try:
+                is_valid = validator()
+                if inspect.isawaitable(is_valid):
+                    is_valid = await is_valid
+            except Exception as error:
+                if self.observer is not None:
+                    self.observe(validator, started, error=error)
+                raise
+
+            if self.observer is not None:
+                self.observe(validator, started, is_valid)
+
+            if not is_valid:
+                raise self.failed(validator)
+
+        return self.cache_result(self.identify_the_end_user())
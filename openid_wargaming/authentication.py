@@ -2,13 +2,24 @@
 
 Ref: https://openid.net/specs/openid-authentication-2_0.html#requesting_authentication
 """
-from urllib.parse import urlencode
-from uuid import uuid4
+import os
+from urllib.parse import urlencode, urlparse, quote_plus
 from datetime import datetime, timezone
 
-from requests import get
+from .instrumentation import observed_request
+from .tokens import make_token
+from .transport import get
+from .utils import build_return_to, sign_state, RETURN_TO_BASE
 
-from .utils import create_return_to
+
+DEFAULT_MODE = 'checkid_setup'
+DEFAULT_NS = 'http://specs.openid.net/auth/2.0'
+IDENTIFIER_SELECT = 'http://specs.openid.net/auth/2.0/identifier_select'
+
+
+def new_request_id():
+    """Unguessable request id: 128 random bits (hex)"""
+    return os.urandom(16).hex()
 
 
 class Authentication:
@@ -23,8 +34,21 @@ class Authentication:
         ns
         identity
         claimed_id
-        return_to
+        return_to: full return url. Built locally from return_to_base
+                   and request_id when missing.
         request_id
+        transport: Transport used to reach the OP (module level requests
+                   functions when missing)
+        return_to_base: callback url of the application
+                        (default: RETURN_TO_BASE)
+        secret: sign the request_id on the return url (state parameter)
+        associations: AssociationStore. The OP is asked to sign the
+                      assertion with a shared association, so Verification
+                      can check it locally.
+        observer: instrumentation Observer timing the checkid_setup request
+        token_ttl: with a secret, carry the request_id on a signed token
+                   valid for token_ttl seconds instead (see tokens), so
+                   Verification(secret=...) checks it without any lookup
 
     Attributes:
         mode
@@ -33,28 +57,58 @@ class Authentication:
         claimed_id
         return_to
         request_id
+        transport
+        assoc_handle: association used on the last destination
     """
     def __init__(self, mode=None, ns=None, identity=None,
-                 claimed_id=None, return_to=None, request_id=None):
-
-        self.mode = mode or 'checkid_setup'
-        self.ns = ns or 'http://specs.openid.net/auth/2.0'
-        self.identity = identity or 'http://specs.openid.net/auth/2.0/' \
-                                    'identifier_select'
-        self.claimed_id = claimed_id or 'http://specs.openid.net/auth/2.0/' \
-                                        'identifier_select'
-
-        self.request_id = request_id or uuid4().hex
-        self.return_to = return_to or create_return_to(self.request_id)
-
-    def authenticate(self, where, request_id=None):
+                 claimed_id=None, return_to=None, request_id=None,
+                 transport=None, return_to_base=None, secret=None,
+                 associations=None, observer=None, token_ttl=None):
+
+        self.mode = mode or DEFAULT_MODE
+        self.ns = ns or DEFAULT_NS
+        self.identity = identity or IDENTIFIER_SELECT
+        self.claimed_id = claimed_id or IDENTIFIER_SELECT
+
+        self.transport = transport
+        self.associations = associations
+        self.observer = observer
+        self.assoc_handle = None
+        self.request_id = request_id or new_request_id()
+        self.return_to = return_to or build_return_to(
+            return_to_base or RETURN_TO_BASE, self.request_id, secret,
+            token_ttl)
+
+    def authenticate(self, where, request_id=None, offline=False):
         """Process to authenticate a request based on few data
 
         On this step, the most important information is the request_id.
         This parameter will allow us to recover this transaction on
         return url.
+
+        checkid_setup is an indirect request (Section 9): the user agent
+        is expected to reach the OP Endpoint with the request itself.
+        By default the OP is asked for the request and its Location is
+        returned. With offline=True the OP Endpoint request (destination)
+        is returned without any network call: the browser then follows
+        the OP redirect on its own and lands on the same sign-in page.
+
+        Both modes are equivalent as long as the OP answers checkid_setup
+        with a redirect. The online mode only adds an early failure when
+        the OP is down or rejects the request (errors are shown by the
+        OP to the user on offline mode).
         """
-        request = get(self.destination(where), allow_redirects=False)
+        if offline:
+            return self.destination(where)
+
+        http_get = self.transport.get if self.transport else get
+        if self.observer is None:
+            request = http_get(self.destination(where),
+                               allow_redirects=False)
+        else:
+            request = observed_request(self.observer, self.mode, http_get,
+                                       self.destination(where),
+                                       allow_redirects=False)
         location = request.headers['Location']
 
         return location
@@ -62,13 +116,16 @@ class Authentication:
     @property
     def payload(self):
         """Prepare the OpenID payload to authenticate this request"""
-        return {
+        payload = {
             'openid.mode': self.mode,
             'openid.ns': self.ns,
             'openid.identity': self.identity,
             'openid.claimed_id': self.claimed_id,
             'openid.return_to': self.return_to,
         }
+        if self.assoc_handle:
+            payload['openid.assoc_handle'] = self.assoc_handle
+        return payload
 
     def convert(self, payload):
         """Convert the OpenID payload on QueryString format"""
@@ -76,6 +133,8 @@ class Authentication:
 
     def destination(self, base):
         """Full destination URL to send the payload"""
+        if self.associations is not None:
+            self.assoc_handle = self.associations.handle(base)
         return base + '?' + self.convert(self.payload)
 
     @property
@@ -99,3 +158,83 @@ class Authentication:
         evidence.update({'request_id': self.request_id})
         evidence.update({'timestamp': datetime.now(timezone.utc)})
         return evidence
+
+
+class AuthenticationTemplate:
+    """Authentication requests of one OP Endpoint, built at high rate.
+
+    The constant part of the query (mode, ns, identity, claimed_id and the
+    return_to base) is encoded once. Every new request only appends its
+    request id (and state, or token) to the encoded return_to.
+
+    The destinations are the same as Authentication.destination ones,
+    the parameters order aside.
+
+    Args:
+        endpoint: OP Endpoint URL
+        return_to_base: callback url of the application
+                        (default: RETURN_TO_BASE)
+        mode
+        ns
+        identity
+        claimed_id
+        secret: sign the request_id on the return url (state parameter)
+        associations: AssociationStore (see Authentication)
+        token_ttl: see Authentication
+
+    Example:
+        template = AuthenticationTemplate('https://eu.wargaming.net/id/openid/')
+        request_id, url = template.start()
+    """
+    def __init__(self, endpoint, return_to_base=None, mode=None, ns=None,
+                 identity=None, claimed_id=None, secret=None,
+                 associations=None, token_ttl=None):
+        self.endpoint = endpoint
+        self.return_to_base = return_to_base or RETURN_TO_BASE
+        self.secret = secret
+        self.associations = associations
+        self.token_ttl = token_ttl if secret is not None else None
+
+        separator = '&' if urlparse(self.return_to_base).query else '?'
+        parameter = 'request_id=' if self.token_ttl is None else 'token='
+        self._prefix = '%s?%s&openid.return_to=%s' % (endpoint, urlencode({
+            'openid.mode': mode or DEFAULT_MODE,
+            'openid.ns': ns or DEFAULT_NS,
+            'openid.identity': identity or IDENTIFIER_SELECT,
+            'openid.claimed_id': claimed_id or IDENTIFIER_SELECT,
+        }), quote_plus(self.return_to_base + separator + parameter))
+
+    def destination(self, request_id):
+        """Full destination URL of the request_id"""
+        return self._destination(request_id, encode=True)
+
+    def start(self, request_id=None):
+        """New authentication request
+
+        Returns:
+            (request_id, destination)
+        """
+        if request_id is not None:
+            return request_id, self.destination(request_id)
+
+        # hex ids (and their tokens) don't need any encoding
+        request_id = new_request_id()
+        return request_id, self._destination(request_id, encode=False)
+
+    def _destination(self, request_id, encode):
+        if self.token_ttl is not None:
+            value = make_token(self.secret, request_id, self.token_ttl)
+        else:
+            value = request_id
+        if encode:
+            # encoded on return_to, then return_to on the query
+            value = quote_plus(quote_plus(value))
+
+        destination = self._prefix + value
+        if self.secret is not None and self.token_ttl is None:
+            destination += '%26state%3D' + sign_state(self.secret, request_id)
+        if self.associations is not None:
+            handle = self.associations.handle(self.endpoint)
+            if handle:
+                destination += '&openid.assoc_handle=' + quote_plus(handle)
+        return destination
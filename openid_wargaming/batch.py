@@ -0,0 +1,169 @@
+"""Batch verification of queued OpenID assertions
+
+Ref: https://openid.net/specs/openid-authentication-2_0.html#verification
+"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+
+from .transport import Transport
+from .verification import Verification, LOCAL, STORAGE, COMMIT
+
+
+def verify_many(urls, concurrency=8, chunk_size=1024, transport=None,
+                store=None, **kwargs):
+    """Verify many assertion URLs, yielding every result when it's ready.
+
+    urls is consumed by chunks of chunk_size. The local validators and the
+    nonce store reads (see Verification.validators costs) of a whole chunk
+    run first, the reads with one NonceStore.seen_many call, and only the
+    surviving assertions are sent to the OP (check_authentication),
+    concurrency requests at a time over one pooled Transport. Nonces are
+    saved once their signature is verified, with one NonceStore.add_many
+    call for the verifications completed together.
+
+    Memory is bounded by chunk_size, whatever the number of urls.
+
+    Args:
+        urls: iterable of assertion URLs
+        concurrency: simultaneous check_authentication requests
+        chunk_size: assertions checked locally at once
+        transport: Transport (a new one sized for concurrency by default)
+        store: NonceStore (Verification saver/reader otherwise)
+        **kwargs: any other Verification argument
+
+    Yields:
+        (url, result) in completion order. result is the identification
+        of the end user, or the exception raised by the verification.
+    """
+    own_transport = transport is None
+    if own_transport:
+        transport = Transport(pool_maxsize=concurrency)
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = {}
+            inflight = set()
+            try:
+                yield from _verify_chunks(urls, concurrency, chunk_size,
+                                          executor, pending, inflight, store,
+                                          transport=transport, **kwargs)
+
+                while pending:
+                    yield from _completed(pending, inflight, store)
+
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    finally:
+        if own_transport:
+            transport.close()
+
+
+def _verify_chunks(urls, concurrency, chunk_size, executor, pending,
+                   inflight, store, **kwargs):
+    """Local checks and nonce reads by chunk, then submit the OP requests
+
+    Nonces are only saved after the OP answers, so the nonces of the
+    pending verifications (inflight) reject the replays meanwhile.
+    """
+    urls = iter(urls)
+    while True:
+        chunk = list(islice(urls, chunk_size))
+        if not chunk:
+            break
+
+        verifications = []
+        for url in chunk:
+            verification = Verification(url, store=store, **kwargs)
+            try:
+                for validator in verification.validators:
+                    if validator.cost > LOCAL:
+                        break
+                    verification.validate(validator)
+            except Exception as error:
+                yield url, error
+                continue
+            verifications.append((url, verification))
+
+        if store is not None:
+            seen = store.seen_many(_nonce(verification)
+                                   for _, verification in verifications)
+        else:
+            seen = [False] * len(verifications)
+
+        for (url, verification), replayed in zip(verifications, seen):
+            key = _nonce(verification)
+            if replayed or key in inflight:
+                verification.reason = 'replayed nonce'
+                yield url, verification.failed(verification.check_nonce)
+                continue
+
+            try:
+                for validator in verification.validators:
+                    if validator.cost == STORAGE and \
+                       (store is None or
+                            validator.__name__ != 'check_nonce'):
+                        verification.validate(validator)
+            except Exception as error:
+                yield url, error
+                continue
+
+            while len(pending) >= concurrency * 2:
+                yield from _completed(pending, inflight, store)
+
+            future = executor.submit(_verify_remotely, verification)
+            pending[future] = url, key
+            inflight.add(key)
+
+
+def _nonce(verification):
+    fields = verification.parsed.fields
+    return (fields.get('openid.op_endpoint', ''),
+            fields['openid.response_nonce'])
+
+
+def _verify_remotely(verification):
+    """Network validators (the nonce is committed by _completed)"""
+    for validator in verification.validators:
+        if STORAGE < validator.cost < COMMIT:
+            verification.validate(validator)
+    return verification
+
+
+def _completed(pending, inflight, store):
+    """Wait for some pending futures, commit the nonces of the verified
+    assertions and yield their (url, result)
+    """
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    verified = []
+    for future in done:
+        url, key = pending.pop(future)
+        inflight.discard(key)
+        error = future.exception()
+        if error is not None:
+            yield url, error
+        else:
+            verified.append((url, key, future.result()))
+
+    if store is not None:
+        committed = store.add_many(key for _, key, _ in verified)
+    else:
+        committed = [None] * len(verified)
+
+    for (url, _, verification), added in zip(verified, committed):
+        try:
+            for validator in verification.validators:
+                if validator.cost < COMMIT:
+                    continue
+                if added is not None and \
+                   validator.__name__ == 'commit_nonce':
+                    if not added:
+                        verification.reason = 'replayed nonce'
+                        raise verification.failed(validator)
+                    continue
+                verification.validate(validator)
+        except Exception as error:
+            yield url, error
+            continue
+        yield url, verification.identify_the_end_user()
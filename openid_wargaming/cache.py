@@ -0,0 +1,133 @@
+"""TTL and LRU caches
+
+TTLCache keeps discovered services (discovery.DiscoveryCache). ResultCache
+keeps verified assertions for a few seconds: browsers double-submitting
+the callback and clients retrying it send the same assertion again a few
+seconds later. Its nonce is already spent, so without the cache the
+duplicate is rejected by check_nonce.
+
+Entries are keyed by (openid.op_endpoint, openid.response_nonce,
+openid.sig) and only returned for an exact duplicate: same scheme,
+authority, path and query parameters. Anything else with the same key
+goes through the whole validator chain again (and is rejected as a
+replay).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """TTL and LRU cache, shared by the threads of a server
+
+    Args:
+        maxsize: entries kept, least recently used are evicted first
+        ttl: seconds an entry is valid
+        clock: function returning the current time in seconds
+
+    Attributes:
+        hits: entries found
+        misses: entries not found (or expired)
+        evictions: entries dropped to stay under maxsize
+    """
+    def __init__(self, maxsize=1024, ttl=3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Cached value of key (None when missing or expired)"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self._hit(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _lookup(self, key):
+        """Value of key, None counted as a miss (lock held)"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self.clock():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        return entry[1]
+
+    def _hit(self, key):
+        """Count a hit on key, now the most recently used (lock held)"""
+        self._entries.move_to_end(key)
+        self.hits += 1
+
+    def _stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self):
+        with self._lock:
+            return self._stats()
+
+
+class ResultCache(TTLCache):
+    """TTL and LRU cache of verification results.
+
+    Args:
+        maxsize: entries kept, least recently used are evicted first
+        ttl: seconds a verified assertion is returned again
+        clock: function returning the current time in seconds
+
+    Attributes:
+        hits: exact duplicates answered from the cache
+        misses: assertions not found (or expired)
+        conflicts: assertions found with the key of a cached one but
+                   different fields
+        evictions: entries dropped to stay under maxsize
+    """
+    def __init__(self, maxsize=4096, ttl=5, clock=time.monotonic):
+        super().__init__(maxsize, ttl, clock)
+        self.conflicts = 0
+
+    def get(self, key, request):
+        """Cached result of key when request is the same, None otherwise
+
+        Args:
+            key: (op_endpoint, response_nonce, sig)
+            request: anything comparable identifying the whole assertion
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                return None
+
+            if entry[0] != request:
+                self.conflicts += 1
+                return None
+
+            self._hit(key)
+            return entry[1]
+
+    def set(self, key, request, result):
+        super().set(key, (request, result))
+
+    def _stats(self):
+        return dict(super()._stats(), conflicts=self.conflicts)
@@ -0,0 +1,186 @@
+"""OpenID 2.0 - Discovery and Verifying Discovered Information
+
+Ref: https://openid.net/specs/openid-authentication-2_0.html#discovery
+"""
+from html.parser import HTMLParser
+from urllib.parse import urldefrag
+from xml.etree import ElementTree
+
+from .cache import TTLCache
+from .transport import get
+
+
+XRDS_CONTENT_TYPE = 'application/xrds+xml'
+XRDS_NS = 'xri://$xrds'
+XRD_NS = 'xri://$xrd*($v*2.0)'
+
+OP_IDENTIFIER_TYPE = 'http://specs.openid.net/auth/2.0/server'
+CLAIMED_IDENTIFIER_TYPE = 'http://specs.openid.net/auth/2.0/signon'
+
+
+class Service:
+    """OpenID service element of a discovered identifier (Section 7.3.2)
+
+    Attributes:
+        op_endpoint: OP Endpoint URL
+        local_id: OP-Local Identifier (None if missing)
+        op_identifier: True for an OP Identifier Element, False for a
+                       Claimed Identifier Element
+    """
+    __slots__ = ('op_endpoint', 'local_id', 'op_identifier')
+
+    def __init__(self, op_endpoint, local_id=None, op_identifier=False):
+        self.op_endpoint = op_endpoint
+        self.local_id = local_id
+        self.op_identifier = op_identifier
+
+    def __repr__(self):
+        return 'Service(%r, %r, %r)' % (self.op_endpoint, self.local_id,
+                                        self.op_identifier)
+
+
+def parse_xrds(document):
+    """OpenID services of an XRDS document, by priority (Section 7.3.2)"""
+    root = ElementTree.fromstring(document)
+    xrds = root.findall('{%s}XRD' % XRD_NS)
+    if not xrds:
+        return []
+
+    services = []
+    for element in xrds[-1].findall('{%s}Service' % XRD_NS):
+        types = {item.text for item in element.findall('{%s}Type' % XRD_NS)}
+        if OP_IDENTIFIER_TYPE in types:
+            op_identifier = True
+        elif CLAIMED_IDENTIFIER_TYPE in types:
+            op_identifier = False
+        else:
+            continue
+
+        local_id = element.find('{%s}LocalID' % XRD_NS)
+        for uri in element.findall('{%s}URI' % XRD_NS):
+            priority = _priority(uri.get('priority'),
+                                 _priority(element.get('priority')))
+            services.append((priority, Service(
+                uri.text.strip(),
+                local_id.text.strip() if local_id is not None else None,
+                op_identifier)))
+
+    services.sort(key=lambda item: item[0])
+    return [service for _, service in services]
+
+
+def _priority(value, default=float('inf')):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class _LinkParser(HTMLParser):
+    """openid2.provider and openid2.local_id links (Section 7.3.3)"""
+    def __init__(self):
+        super().__init__()
+        self.links = {}
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'link':
+            return
+        attrs = dict(attrs)
+        for rel in (attrs.get('rel') or '').split():
+            if rel in ('openid2.provider', 'openid2.local_id'):
+                self.links.setdefault(rel, attrs.get('href'))
+
+
+def parse_html(document):
+    """OpenID services of an HTML document (HTML-Based discovery)"""
+    parser = _LinkParser()
+    parser.feed(document)
+    provider = parser.links.get('openid2.provider')
+    if not provider:
+        return []
+    return [Service(provider, parser.links.get('openid2.local_id'))]
+
+
+class DiscoveryCache(TTLCache):
+    """TTL and LRU cache of discovered services.
+
+    Args:
+        maxsize: entries kept, least recently used are evicted first
+        ttl: seconds an entry is valid
+        clock: function returning the current time in seconds
+    """
+
+
+class Discovery:
+    """Yadis discovery of identifiers with a cache.
+
+    Args:
+        transport: Transport (module level requests.get when missing)
+        cache: DiscoveryCache (a new one by default)
+    """
+    def __init__(self, transport=None, cache=None):
+        self.transport = transport
+        self.cache = cache if cache is not None else DiscoveryCache()
+
+    def discover(self, identifier):
+        """OpenID services of a URL identifier (Section 7.3)
+
+        Results are cached by identifier, fragment excluded. Failed
+        discoveries (error status, invalid document) are not: the next
+        login asks again.
+        """
+        identifier = urldefrag(identifier)[0]
+        services = self.cache.get(identifier)
+        if services is None:
+            services = self._discover(identifier)
+            if services is None:
+                return []
+            self.cache.set(identifier, services)
+        return services
+
+    def _discover(self, identifier):
+        """Services of identifier (None when the discovery failed)"""
+        http_get = self.transport.get if self.transport else get
+        headers = {'Accept': '%s, text/html' % XRDS_CONTENT_TYPE}
+
+        response = http_get(identifier, headers=headers)
+        content_type = response.headers.get('Content-Type', '')
+        location = response.headers.get('X-XRDS-Location')
+        if not content_type.startswith(XRDS_CONTENT_TYPE) and location:
+            response = http_get(location, headers=headers)
+            content_type = response.headers.get('Content-Type', '')
+
+        if response.status_code != 200:
+            return None
+
+        try:
+            if content_type.startswith(XRDS_CONTENT_TYPE):
+                return parse_xrds(response.content)
+            return parse_html(response.text)
+        except ElementTree.ParseError:
+            return None
+
+    def verify(self, fields):
+        """Verifying Discovered Information (Section 11.2)
+
+        The OP Endpoint of the assertion must be authorized by the Claimed
+        Identifier, with the same OP-Local Identifier.
+
+        Args:
+            fields: assertion fields (openid.*)
+        """
+        claimed_id = fields.get('openid.claimed_id')
+        if claimed_id is None:
+            # No identifier on the assertion, only extension data
+            return 'openid.identity' not in fields
+
+        op_endpoint = fields.get('openid.op_endpoint')
+        identity = fields.get('openid.identity')
+        for service in self.discover(claimed_id):
+            if service.op_identifier or service.op_endpoint != op_endpoint:
+                continue
+            if (service.local_id or urldefrag(claimed_id)[0]) == \
+               urldefrag(identity or '')[0]:
+                return True
+
+        return False
@@ -15,3 +15,27 @@ class OpenIDVerificationFailed(Exception):
     def __init__(self, message, validator):
         self.message = message
         self.validator = validator
+
+
+class OpenIDAssociationFailed(Exception):
+    def __init__(self, message, endpoint):
+        self.message = message
+        self.endpoint = endpoint
+
+
+class OpenIDCircuitOpen(Exception):
+    def __init__(self, message, endpoint):
+        self.message = message
+        self.endpoint = endpoint
+
+
+class OpenIDUnknownEndpoint(Exception):
+    def __init__(self, message, endpoint):
+        self.message = message
+        self.endpoint = endpoint
+
+
+class OpenIDInvalidToken(Exception):
+    def __init__(self, message, token):
+        self.message = message
+        self.token = token
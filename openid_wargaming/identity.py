@@ -0,0 +1,62 @@
+"""Wargaming identities
+
+Wargaming uses this kind of identity/claimed_id:
+
+    https://<realm>.wargaming.net/id/<account_id>-<nickname>/
+"""
+import re
+
+from .utils import REALMS
+
+
+IDENTITY_PATTERN = re.compile(
+    r'https://(%s)\.wargaming\.net/id/([0-9]+)-(\w+)/' %
+    '|'.join(re.escape(realm) for realm in REALMS))
+
+
+class WargamingIdentity:
+    """Player identified by the OP
+
+    Attributes:
+        account_id: numeric identifier (int)
+        nickname: player nickname used in the game
+        realm: eu, na, asia or ru
+    """
+    __slots__ = ('account_id', 'nickname', 'realm')
+
+    def __init__(self, account_id, nickname, realm):
+        self.account_id = account_id
+        self.nickname = nickname
+        self.realm = realm
+
+    @property
+    def url(self):
+        return 'https://%s.wargaming.net/id/%d-%s/' % (
+            self.realm, self.account_id, self.nickname)
+
+    def __eq__(self, other):
+        if not isinstance(other, WargamingIdentity):
+            return NotImplemented
+        return (self.account_id, self.nickname, self.realm) == \
+            (other.account_id, other.nickname, other.realm)
+
+    def __hash__(self):
+        return hash((self.account_id, self.nickname, self.realm))
+
+    def __repr__(self):
+        return 'WargamingIdentity(%r, %r, %r)' % (
+            self.account_id, self.nickname, self.realm)
+
+
+def parse_identity(url, _match=IDENTITY_PATTERN.fullmatch):
+    """WargamingIdentity of an identity URL (None if it isn't one)
+
+    Example:
+        parse_identity('https://eu.wargaming.net/id/1000000-JohnDoe/')
+        WargamingIdentity(1000000, 'JohnDoe', 'eu')
+    """
+    match = _match(url)
+    if match is None:
+        return None
+    realm, account_id, nickname = match.groups()
+    return WargamingIdentity(int(account_id), nickname, realm)
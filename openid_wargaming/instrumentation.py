@@ -0,0 +1,110 @@
+"""Latency instrumentation of the authentication and verification steps
+
+Observers receive one event per validator of the verification chain and
+per HTTP request sent to the OP:
+
+    kind: 'validator' or 'http'
+    name: validator name, or OpenID mode of the HTTP request
+    elapsed: wall time in seconds
+    outcome: 'ok', 'fail' (validator not passed, HTTP error status)
+             or 'error' (exception)
+    reason: failure reason (None when ok)
+
+Nothing is measured when no observer is given.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+
+class Observer:
+    """Observer interface, it ignores every event"""
+    def record(self, kind, name, elapsed, outcome, reason=None):
+        pass
+
+
+class CallbackObserver(Observer):
+    """Send every event to a function
+
+    Args:
+        callback: function(kind, name, elapsed, outcome, reason)
+    """
+    def __init__(self, callback):
+        self.callback = callback
+
+    def record(self, kind, name, elapsed, outcome, reason=None):
+        self.callback(kind, name, elapsed, outcome, reason)
+
+
+class PrometheusObserver(Observer):
+    """Latency histograms on Prometheus text exposition format.
+
+    No prometheus_client needed: render() returns the metrics text to
+    publish on a /metrics endpoint.
+
+    Args:
+        buckets: histogram upper bounds in seconds
+        prefix: metric names prefix
+    """
+    DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25,
+                       0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix='openid_wargaming'):
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def record(self, kind, name, elapsed, outcome, reason=None):
+        key = (kind, name, outcome)
+        index = bisect_left(self.buckets, elapsed)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = \
+                    [[0] * (len(self.buckets) + 1), 0.0]
+            histogram[0][index] += 1
+            histogram[1] += elapsed
+
+    def render(self):
+        """Metrics on Prometheus text exposition format"""
+        metric = '%s_duration_seconds' % self.prefix
+        lines = ['# HELP %s Duration of the OpenID steps.' % metric,
+                 '# TYPE %s histogram' % metric]
+
+        with self._lock:
+            histograms = sorted((key, (list(counts), total))
+                                for key, (counts, total)
+                                in self._histograms.items())
+
+        for (kind, name, outcome), (counts, total) in histograms:
+            labels = 'kind="%s",name="%s",outcome="%s"' % (kind, name,
+                                                            outcome)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append('%s_bucket{%s,le="%s"} %d' % (metric, labels,
+                                                           bound, cumulative))
+            lines.append('%s_sum{%s} %r' % (metric, labels, total))
+            lines.append('%s_count{%s} %d' % (metric, labels, cumulative))
+
+        return '\n'.join(lines) + '\n'
+
+
+def observed_request(observer, name, function, *args, **kwargs):
+    """Call an HTTP function (get/post) and report it to observer"""
+    started = time.perf_counter()
+    try:
+        response = function(*args, **kwargs)
+    except Exception as error:
+        observer.record('http', name, time.perf_counter() - started,
+                        'error', type(error).__name__)
+        raise
+
+    elapsed = time.perf_counter() - started
+    status_code = getattr(response, 'status_code', 200)
+    if isinstance(status_code, int) and status_code >= 400:
+        observer.record('http', name, elapsed, 'fail', 'HTTP %d' % status_code)
+    else:
+        observer.record('http', name, elapsed, 'ok')
+    return response
@@ -0,0 +1,64 @@
+"""OpenID 2.0 - Key-Value Form Encoding
+
+Ref: https://openid.net/specs/openid-authentication-2_0.html#kvform
+"""
+
+
+TYPES = {
+    'false': False,
+    'true': True
+}
+
+
+def iterdecode(lines, convert=True):
+    """Decode Key-Value Form lines one by one.
+
+    Keys and values are separated by the first colon only, a value may
+    contain colons (URLs). Surrounding whitespace is removed and lines
+    without a colon are ignored.
+
+    Args:
+        lines: iterable of str or bytes (UTF-8) lines
+        convert: 'true'/'false' values converted to booleans
+
+    Yields:
+        (key, value)
+    """
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+
+        key, separator, value = line.partition(':')
+        if not separator:
+            continue
+
+        value = value.strip()
+        if convert:
+            value = TYPES.get(value, value)
+        yield key.strip(), value
+
+
+def decode(data, convert=True):
+    """Decode a Key-Value Form message (str or bytes) into a dict
+
+    Example:
+
+    is_valid:false
+    ns:http://specs.openid.net/auth/2.0
+    """
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+
+    # Same as dict(iterdecode(...)), inlined: it's on every login
+    fields = {}
+    for line in data.split('\n'):
+        key, separator, value = line.partition(':')
+        if separator:
+            value = value.strip()
+            fields[key.strip()] = TYPES.get(value, value) if convert else value
+    return fields
+
+
+def encode(fields):
+    """Encode a dict as a Key-Value Form message"""
+    return ''.join('%s:%s\n' % item for item in fields.items())
@@ -0,0 +1,206 @@
+"""Load generator of full login flows against the local stand-in OP
+
+Every login runs Authentication.authenticate (checkid_setup), lets the
+stand-in OP issue the positive assertion of the user, and runs
+Verification.verify on it, concurrency logins at a time. It never
+touches Wargaming.
+
+Usage:
+    python -m openid_wargaming.loadtest --logins 2000 --concurrency 16
+    python -m openid_wargaming.loadtest --async --associations
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .association import AssociationStore
+from .asynchronous import AsyncVerification
+from .authentication import Authentication
+from .nonce import MemoryNonceStore
+from .testing import StandInOP
+from .transport import AsyncTransport, Transport
+from .verification import Verification
+
+
+RETURN_TO_BASE = 'https://example.com/openid/callback'
+
+
+class LoadResult:
+    """Latencies of a load test run
+
+    Args:
+        name
+        latencies: seconds of every successful login
+        errors: number of failed logins
+        elapsed: wall time of the run in seconds
+    """
+    def __init__(self, name, latencies, errors, elapsed):
+        self.name = name
+        self.latencies = sorted(latencies)
+        self.errors = errors
+        self.elapsed = elapsed
+
+    @property
+    def throughput(self):
+        """Successful logins per second"""
+        return len(self.latencies) / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, fraction):
+        """Latency below which fraction of the logins are (nearest rank)"""
+        if not self.latencies:
+            return None
+        index = max(int(round(fraction * len(self.latencies))) - 1, 0)
+        return self.latencies[index]
+
+    def summary(self):
+        return {
+            'logins': len(self.latencies),
+            'errors': self.errors,
+            'throughput': self.throughput,
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+        }
+
+    def __str__(self):
+        summary = self.summary()
+        if not self.latencies:
+            return '%-6s no successful login, %d errors' % (self.name,
+                                                            self.errors)
+        return ('%-6s %6d logins %4d errors %9.1f logins/s  '
+                'p50 %7.2f ms  p95 %7.2f ms  p99 %7.2f ms' % (
+                    self.name, summary['logins'], summary['errors'],
+                    summary['throughput'], summary['p50'] * 1000,
+                    summary['p95'] * 1000, summary['p99'] * 1000))
+
+
+def run_sync(op, logins=1000, concurrency=8, associations=False,
+             offline=False):
+    """Full login flows on threads over one pooled Transport
+
+    Args:
+        op: running StandInOP
+        logins
+        concurrency: simultaneous logins
+        associations: sign with shared associations (local signature
+                      verification) instead of direct verification
+        offline: skip the checkid_setup request (as the async path)
+
+    Returns:
+        LoadResult
+    """
+    transport = Transport(pool_maxsize=concurrency)
+    store = MemoryNonceStore()
+    association_store = None
+    if associations:
+        # established before the run, as on the async path
+        association_store = AssociationStore(transport)
+        association_store.handle(op.endpoint)
+
+    def login(_):
+        started = time.perf_counter()
+        auth = Authentication(return_to_base=RETURN_TO_BASE,
+                              transport=transport,
+                              associations=association_store)
+        auth.authenticate(op.endpoint, offline=offline)
+        url = op.assertion(auth.return_to, assoc_handle=auth.assoc_handle)
+        Verification(url, transport=transport, store=store,
+                     associations=association_store).verify()
+        return time.perf_counter() - started
+
+    try:
+        started = time.perf_counter()
+        latencies, errors = [], 0
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(login, index)
+                       for index in range(logins)]
+            for future in futures:
+                if future.exception() is None:
+                    latencies.append(future.result())
+                else:
+                    errors += 1
+        return LoadResult('sync', latencies, errors,
+                          time.perf_counter() - started)
+    finally:
+        transport.close()
+
+
+def run_async(op, logins=1000, concurrency=8, associations=False):
+    """Full login flows on asyncio (offline Authentication and
+    AsyncVerification)
+
+    Associations, when enabled, are established before the run: the
+    associate request is blocking.
+
+    Returns:
+        LoadResult
+    """
+    return asyncio.run(_run_async(op, logins, concurrency, associations))
+
+
+async def _run_async(op, logins, concurrency, associations):
+    transport = AsyncTransport(limit=concurrency)
+    store = MemoryNonceStore()
+    association_store = None
+    if associations:
+        sync_transport = Transport()
+        association_store = AssociationStore(sync_transport)
+        association_store.handle(op.endpoint)
+        sync_transport.close()
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            started = time.perf_counter()
+            auth = Authentication(return_to_base=RETURN_TO_BASE,
+                                  associations=association_store)
+            auth.authenticate(op.endpoint, offline=True)
+            url = op.assertion(auth.return_to,
+                               assoc_handle=auth.assoc_handle)
+            await AsyncVerification(url, transport=transport, store=store,
+                                    associations=association_store).verify()
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[login() for _ in range(logins)],
+                                   return_exceptions=True)
+    latencies = [result for result in results
+                 if not isinstance(result, BaseException)]
+    return LoadResult('async', latencies, len(results) - len(latencies),
+                      time.perf_counter() - started)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(
+        description='Full login flows against a local stand-in OP')
+    parser.add_argument('--logins', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds added by the OP to every response')
+    parser.add_argument('--associations', action='store_true',
+                        help='verify signatures locally')
+    parser.add_argument('--offline', action='store_true',
+                        help='threaded path without checkid_setup request')
+    parser.add_argument('--async', dest='asynchronous', action='store_true',
+                        help='only the asyncio path')
+    parser.add_argument('--sync', dest='synchronous', action='store_true',
+                        help='only the threaded path')
+    options = parser.parse_args(arguments)
+
+    results = []
+    with StandInOP(latency=options.latency) as op:
+        if not options.asynchronous:
+            results.append(run_sync(op, options.logins, options.concurrency,
+                                    options.associations, options.offline))
+            print(results[-1])
+        if not options.synchronous:
+            results.append(run_async(op, options.logins, options.concurrency,
+                                     options.associations))
+            print(results[-1])
+    return results
+
+
+if __name__ == '__main__':
+    main()
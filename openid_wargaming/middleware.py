@@ -0,0 +1,206 @@
+"""WSGI and ASGI middleware verifying the OpenID callback
+
+The assertion is built from the scheme, host, path and raw query string
+of the request as the server gives them, without rebuilding the current
+URL. Requests to other paths go straight to the application.
+
+After the callback request, the application finds:
+
+    * openid_wargaming.identity: WargamingIdentity, None when the
+      assertion was rejected
+    * openid_wargaming.error: exception rejecting the assertion, if any
+
+on the WSGI environ or the ASGI scope. Assertions of OP Endpoints other
+than the Wargaming ones (REALMS) are rejected before any verification.
+
+Example:
+
+    app = OpenIDMiddleware(app, '/openid/callback', store=store)
+
+    def callback(environ, start_response):
+        player = environ['openid_wargaming.identity']
+"""
+import inspect
+from itertools import chain
+from urllib.parse import quote
+
+from .asynchronous import AsyncVerification
+from .exceptions import BadOpenIDReturnTo, OpenIDFailReturnURLVerification
+from .exceptions import OpenIDInvalidToken, OpenIDUnknownEndpoint
+from .exceptions import OpenIDVerificationFailed
+from .transport import AsyncTransport
+from .utils import REALMS
+from .verification import Verification
+
+
+IDENTITY_KEY = 'openid_wargaming.identity'
+ERROR_KEY = 'openid_wargaming.error'
+
+# Assertions rejected by the verification. Any other exception (the OP
+# can't be reached, ...) is not a decision about the user and goes up to
+# the server.
+REJECTIONS = (BadOpenIDReturnTo, OpenIDFailReturnURLVerification,
+              OpenIDVerificationFailed, OpenIDInvalidToken,
+              OpenIDUnknownEndpoint)
+
+# Characters left as they are in the path of a URL (RFC 3986 pchar)
+PATH_SAFE = "/:@!$&'()*+,;=-._~"
+
+
+def wsgi_parts(environ):
+    """scheme, authority, path and raw query string of the WSGI request
+
+    Reference: https://www.python.org/dev/peps/pep-3333/#url-reconstruction
+    """
+    scheme = environ['wsgi.url_scheme']
+    host = environ.get('HTTP_HOST')
+    if host is None:
+        host = environ['SERVER_NAME']
+        port = environ['SERVER_PORT']
+        if port != ('443' if scheme == 'https' else '80'):
+            host = '%s:%s' % (host, port)
+
+    # PEP 3333 paths are decoded and carried as latin-1
+    path = (environ.get('SCRIPT_NAME', '') + environ.get('PATH_INFO', ''))
+    path = quote(path.encode('latin-1'), safe=PATH_SAFE)
+    return scheme, host, path, environ.get('QUERY_STRING', '')
+
+
+def asgi_parts(scope):
+    """scheme, authority, path and raw query string of the ASGI request
+
+    Reference: https://asgi.readthedocs.io/en/latest/specs/www.html
+    """
+    scheme = scope.get('scheme', 'http')
+    for name, value in scope['headers']:
+        if name == b'host':
+            host = value.decode('latin-1')
+            break
+    else:
+        host, port = scope['server']
+        if port != (443 if scheme == 'https' else 80):
+            host = '%s:%d' % (host, port)
+
+    raw_path = scope.get('raw_path')
+    if raw_path:
+        path = raw_path.decode('latin-1')
+    else:
+        path = quote(scope.get('root_path', '') + scope['path'],
+                     safe=PATH_SAFE)
+    return (scheme, host, path,
+            scope.get('query_string', b'').decode('latin-1'))
+
+
+def _endpoints(endpoints):
+    """Allowed OP Endpoints (every realm of REALMS when None)"""
+    if endpoints is None:
+        endpoints = chain.from_iterable(REALMS.values())
+    return frozenset(endpoints)
+
+
+def _check_endpoint(verification, endpoints):
+    """Raise OpenIDUnknownEndpoint when the assertion comes from another OP
+
+    Raises:
+        OpenIDUnknownEndpoint
+    """
+    op_endpoint = verification.parsed.fields.get('openid.op_endpoint')
+    if op_endpoint not in endpoints:
+        raise OpenIDUnknownEndpoint('unknown OP Endpoint', op_endpoint)
+
+
+class OpenIDMiddleware:
+    """WSGI middleware verifying the callback requests
+
+    Args:
+        app: WSGI application
+        path: callback path (PATH_INFO of the return_to url)
+        endpoints: OP Endpoints allowed to make assertions (default: the
+                   endpoints of every realm of REALMS)
+        verification: Verification class (synchronous verify)
+        **kwargs: Verification arguments shared by every request (store,
+                  transport, associations, secret, ...)
+
+    Raises:
+        TypeError: verification has a coroutine verify (use
+                   AsyncOpenIDMiddleware)
+    """
+    def __init__(self, app, path, endpoints=None, verification=Verification,
+                 **kwargs):
+        if inspect.iscoroutinefunction(verification.verify):
+            raise TypeError('%s verifies asynchronously, use '
+                            'AsyncOpenIDMiddleware' % verification.__name__)
+        self.app = app
+        self.path = path
+        self.endpoints = _endpoints(endpoints)
+        self.verification = verification
+        self.kwargs = kwargs
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO') == self.path:
+            identity, error = self.verify(environ)
+            environ[IDENTITY_KEY] = identity
+            environ[ERROR_KEY] = error
+        return self.app(environ, start_response)
+
+    def verify(self, environ):
+        """(identity, None) or (None, error) of the callback request"""
+        try:
+            verification = self.verification.from_parts(
+                *wsgi_parts(environ), **self.kwargs)
+            _check_endpoint(verification, self.endpoints)
+            verification.verify()
+        except REJECTIONS as error:
+            return None, error
+        return verification.identity, None
+
+
+class AsyncOpenIDMiddleware:
+    """ASGI middleware verifying the callback requests on the event loop
+
+    The check_authentication request doesn't block the server: it's sent
+    by AsyncVerification over one AsyncTransport shared by every request,
+    and discovery requests run on the default executor.
+
+    Args:
+        app: ASGI application
+        path: callback path (scope path of the return_to url)
+        endpoints: OP Endpoints allowed to make assertions (default: the
+                   endpoints of every realm of REALMS)
+        verification: AsyncVerification class (coroutine verify)
+        **kwargs: AsyncVerification arguments shared by every request
+
+    Raises:
+        TypeError: verification has a synchronous verify (use
+                   OpenIDMiddleware)
+    """
+    def __init__(self, app, path, endpoints=None,
+                 verification=AsyncVerification, **kwargs):
+        if not inspect.iscoroutinefunction(verification.verify):
+            raise TypeError('%s verifies synchronously, use '
+                            'OpenIDMiddleware' % verification.__name__)
+        self.app = app
+        self.path = path
+        self.endpoints = _endpoints(endpoints)
+        self.verification = verification
+        kwargs.setdefault('transport', AsyncTransport())
+        self.kwargs = kwargs
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == self.path:
+            identity, error = await self.verify(scope)
+            scope = dict(scope)
+            scope[IDENTITY_KEY] = identity
+            scope[ERROR_KEY] = error
+        await self.app(scope, receive, send)
+
+    async def verify(self, scope):
+        """(identity, None) or (None, error) of the callback request"""
+        try:
+            verification = self.verification.from_parts(
+                *asgi_parts(scope), **self.kwargs)
+            _check_endpoint(verification, self.endpoints)
+            await verification.verify()
+        except REJECTIONS as error:
+            return None, error
+        return verification.identity, None
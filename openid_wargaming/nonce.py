@@ -0,0 +1,356 @@
+"""OpenID 2.0 - Nonce stores to prevent replay attacks
+
+Ref: https://openid.net/specs/openid-authentication-2_0.html#verify_nonce
+"""
+import os
+import struct
+import threading
+import time
+from calendar import timegm
+from hashlib import blake2b
+
+
+# Default seconds a nonce is accepted after its timestamp, and allowed to be
+# in the future
+MAX_AGE = 300
+SKEW = 60
+
+def nonce_timestamp(nonce):
+    """Seconds since epoch embedded in an openid.response_nonce
+
+    Format: 2005-05-15T17:11:51ZUNIQUE (Section 10.1)
+
+    Raises:
+        ValueError: malformed nonce
+    """
+    if len(nonce) < 20 or nonce[4] != '-' or nonce[7] != '-' or \
+       nonce[10] != 'T' or nonce[13] != ':' or nonce[16] != ':' or \
+       nonce[19] != 'Z':
+        raise ValueError('malformed nonce: %r' % nonce)
+
+    return timegm((int(nonce[0:4]), int(nonce[5:7]), int(nonce[8:10]),
+                   int(nonce[11:13]), int(nonce[14:16]), int(nonce[17:19])))
+
+
+class NonceStore:
+    """Nonce store interface used by Verification.check_nonce
+
+    A nonce must never be accepted more than once for the same OP Endpoint
+    URL. Stores only need to remember nonces for max_age seconds: older
+    nonces are rejected by their timestamp.
+    """
+    def add(self, op_endpoint, nonce):
+        """Atomic check-and-insert.
+
+        Returns:
+            True if the nonce is fresh and was not seen before
+            (it is saved), False otherwise.
+        """
+        raise NotImplementedError
+
+    def seen(self, op_endpoint, nonce):
+        """Read-only check: True if the nonce was already added.
+
+        Lets Verification reject replays before verifying the signature,
+        and add the nonce only once the signature is valid. Stores that
+        can't tell return False (add still rejects the replay).
+        """
+        return False
+
+    def seen_many(self, items):
+        """seen for every (op_endpoint, nonce) pair of items.
+
+        Returns:
+            list of seen results, in the same order
+        """
+        return [self.seen(op_endpoint, nonce) for op_endpoint, nonce in items]
+
+    def add_many(self, items):
+        """add for every (op_endpoint, nonce) pair of items.
+
+        Returns:
+            list of add results, in the same order
+        """
+        return [self.add(op_endpoint, nonce) for op_endpoint, nonce in items]
+
+
+class MemoryNonceStore(NonceStore):
+    """Thread-safe in-memory nonce store.
+
+    Nonces are grouped on buckets by the timestamp they carry, so expiring
+    old nonces drops whole buckets (O(1) amortised per insert) and a
+    lookup only touches the bucket of the nonce.
+
+    Args:
+        max_age: seconds a nonce is accepted after its timestamp
+        skew: seconds a nonce timestamp is allowed to be in the future
+        granularity: seconds covered by every bucket
+        clock: function returning the current time in seconds
+    """
+    def __init__(self, max_age=MAX_AGE, skew=SKEW, granularity=10,
+                 clock=time.time):
+        self.max_age = max_age
+        self.skew = skew
+        self.granularity = granularity
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._oldest = None
+
+    def add(self, op_endpoint, nonce):
+        try:
+            timestamp = nonce_timestamp(nonce)
+        except ValueError:
+            return False
+
+        now = self.clock()
+        if timestamp < now - self.max_age or timestamp > now + self.skew:
+            return False
+
+        with self._lock:
+            self._expire(now)
+            return self._insert(timestamp, op_endpoint, nonce)
+
+    def seen(self, op_endpoint, nonce):
+        try:
+            timestamp = nonce_timestamp(nonce)
+        except ValueError:
+            return False
+
+        with self._lock:
+            bucket = self._buckets.get(timestamp // self.granularity)
+            return bucket is not None and (op_endpoint, nonce) in bucket
+
+    def seen_many(self, items):
+        """seen for every (op_endpoint, nonce) pair, taking the lock once"""
+        keys = []
+        for op_endpoint, nonce in items:
+            try:
+                timestamp = nonce_timestamp(nonce)
+            except ValueError:
+                timestamp = None
+            keys.append((timestamp, (op_endpoint, nonce)))
+
+        with self._lock:
+            buckets = self._buckets
+            granularity = self.granularity
+            return [timestamp is not None and
+                    entry in buckets.get(timestamp // granularity, ())
+                    for timestamp, entry in keys]
+
+    def add_many(self, items):
+        """add for every (op_endpoint, nonce) pair, taking the lock once"""
+        now = self.clock()
+        fresh = []
+        for op_endpoint, nonce in items:
+            try:
+                timestamp = nonce_timestamp(nonce)
+            except ValueError:
+                timestamp = None
+            if timestamp is not None and \
+               not now - self.max_age <= timestamp <= now + self.skew:
+                timestamp = None
+            fresh.append((timestamp, op_endpoint, nonce))
+
+        with self._lock:
+            self._expire(now)
+            return [timestamp is not None and
+                    self._insert(timestamp, op_endpoint, nonce)
+                    for timestamp, op_endpoint, nonce in fresh]
+
+    def _insert(self, timestamp, op_endpoint, nonce):
+        """Check-and-insert. Must be called with the lock"""
+        key = timestamp // self.granularity
+        entry = (op_endpoint, nonce)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = set()
+        elif entry in bucket:
+            return False
+
+        bucket.add(entry)
+        return True
+
+    def _expire(self, now):
+        """Drop buckets older than max_age. Must be called with the lock"""
+        limit = int(now - self.max_age) // self.granularity
+        oldest = self._oldest
+
+        if oldest is None:
+            oldest = limit
+
+        elif limit - oldest > len(self._buckets):
+            # Long idle period: cheaper to look at the existing buckets
+            for key in [key for key in self._buckets if key < limit]:
+                del self._buckets[key]
+            oldest = limit
+
+        else:
+            while oldest < limit:
+                self._buckets.pop(oldest, None)
+                oldest += 1
+
+        self._oldest = oldest
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(bucket) for bucket in self._buckets.values())
+
+
+class MmapNonceStore(NonceStore):
+    """Nonce store shared by every process of one host.
+
+    Fixed-size hash table on a memory-mapped file. Workers of a
+    multi-process server (gunicorn, uwsgi, ...) opening the same path share
+    the replay protection without any network hop.
+
+    A nonce lives on one of the PROBE slots following its hash. Those slots
+    are locked (fcntl record lock plus a thread lock) during the
+    check-and-insert, and slots holding nonces older than max_age are
+    reused. When the PROBE slots all hold live nonces the new nonce is
+    rejected (fail closed), so keep the table at most half full: twice the
+    peak of logins received during max_age.
+
+        memory = HEADER_SIZE + (capacity + PROBE - 1) * SLOT_SIZE
+
+    Args:
+        path: file backing the table (created if missing)
+        capacity: number of slots
+        max_age: seconds a nonce is accepted after its timestamp
+        skew: seconds a nonce timestamp is allowed to be in the future
+        clock: function returning the current time in seconds
+
+    Attributes:
+        overflows: nonces rejected because their slots were full
+    """
+    MAGIC = b'OWNONCE2'
+    HEADER = struct.Struct('<8sII')
+    HEADER_SIZE = HEADER.size
+    SLOT = struct.Struct('<q16s')
+    SLOT_SIZE = SLOT.size
+    PROBE = 32
+    WINDOW = struct.Struct('<' + 'q16s' * PROBE)
+    WINDOW_SIZE = WINDOW.size
+
+    def __init__(self, path, capacity=1 << 20, max_age=MAX_AGE, skew=SKEW,
+                 clock=time.time):
+        import mmap  # not needed by the core (nonce_timestamp, ...)
+        if capacity <= 0:
+            raise ValueError('capacity must be positive')
+
+        self.capacity = capacity
+        self.max_age = max_age
+        self.skew = skew
+        self.clock = clock
+        self.overflows = 0
+        self._lock = threading.Lock()
+
+        size = self.HEADER_SIZE + \
+            (capacity + self.PROBE - 1) * self.SLOT_SIZE
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self._initialize(size)
+            self._map = mmap.mmap(self._fd, size)
+        except Exception:
+            os.close(self._fd)
+            raise
+
+    @classmethod
+    def for_memory(cls, path, budget, **kwargs):
+        """Store with as many slots as fit in budget bytes"""
+        capacity = (budget - cls.HEADER_SIZE) // cls.SLOT_SIZE - cls.PROBE + 1
+        if capacity <= 0:
+            raise ValueError('memory budget too small: %d bytes' % budget)
+        return cls(path, capacity=capacity, **kwargs)
+
+    def _initialize(self, size):
+        """Create the table or check the existing one is compatible"""
+        import fcntl  # POSIX only, as MmapNonceStore
+        header = self.HEADER.pack(self.MAGIC, self.capacity, self.PROBE)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self.HEADER_SIZE, 0)
+        try:
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, header, 0)
+
+            elif os.pread(self._fd, self.HEADER_SIZE, 0) != header:
+                raise ValueError('nonce table has another layout')
+
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.HEADER_SIZE, 0)
+
+    def add(self, op_endpoint, nonce):
+        try:
+            timestamp = nonce_timestamp(nonce)
+        except ValueError:
+            return False
+
+        now = self.clock()
+        expired = now - self.max_age
+        if timestamp < expired or timestamp > now + self.skew:
+            return False
+
+        digest, offset = self._locate(op_endpoint, nonce)
+
+        import fcntl
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self.WINDOW_SIZE, offset)
+            try:
+                window = self.WINDOW.unpack_from(self._map, offset)
+                stamps, digests = window[0::2], window[1::2]
+
+                if digest in digests and \
+                   stamps[digests.index(digest)] >= expired:
+                    return False
+
+                oldest = min(stamps)
+                if oldest >= expired:
+                    self.overflows += 1
+                    return False
+
+                free = offset + stamps.index(oldest) * self.SLOT_SIZE
+                self.SLOT.pack_into(self._map, free, timestamp, digest)
+                return True
+
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self.WINDOW_SIZE, offset)
+
+    def seen(self, op_endpoint, nonce):
+        try:
+            nonce_timestamp(nonce)
+        except ValueError:
+            return False
+
+        expired = self.clock() - self.max_age
+        digest, offset = self._locate(op_endpoint, nonce)
+
+        import fcntl
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_SH, self.WINDOW_SIZE, offset)
+            try:
+                window = self.WINDOW.unpack_from(self._map, offset)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self.WINDOW_SIZE, offset)
+
+        stamps, digests = window[0::2], window[1::2]
+        return digest in digests and \
+            stamps[digests.index(digest)] >= expired
+
+    def _locate(self, op_endpoint, nonce):
+        """Digest of the nonce and offset of its first slot"""
+        key = '%s\n%s' % (op_endpoint, nonce)
+        digest = blake2b(key.encode('utf-8'), digest_size=16).digest()
+        slot = int.from_bytes(digest[:8], 'little') % self.capacity
+        return digest, self.HEADER_SIZE + slot * self.SLOT_SIZE
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    def __len__(self):
+        """Live nonces (scans the whole table)"""
+        expired = self.clock() - self.max_age
+        return sum(1 for slot in range(self.HEADER_SIZE, len(self._map),
+                                       self.SLOT_SIZE)
+                   if self.SLOT.unpack_from(self._map, slot)[0] >= expired)
@@ -0,0 +1,296 @@
+"""Resilience layer for the requests sent to the OP
+
+ResilientTransport wraps a Transport with, for every OP Endpoint:
+
+    * a circuit breaker, failing fast while the OP is down
+    * a deadline: every call (retries included) ends on time
+    * bounded retries with exponential backoff and full jitter
+    * hedged requests: a duplicate request is sent when the first one is
+      slower than the recent p95 latency, the first response wins
+
+Note: the OP must not answer positively twice the same check_authentication
+request (Section 11.4.2.1), so by default POST requests are neither hedged
+nor retried once sent (only connection failures are retried).
+"""
+import random
+import threading
+import time
+from bisect import insort
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlsplit
+
+from requests.exceptions import ConnectionError, ConnectTimeout, Timeout
+from urllib3.exceptions import NewConnectionError
+
+from .exceptions import OpenIDCircuitOpen
+
+
+class CircuitBreaker:
+    """Circuit breaker of one OP Endpoint.
+
+    closed: requests go through. failure_threshold consecutive failures
+            open the circuit.
+    open: requests fail at once for reset_timeout seconds.
+    half-open: one trial request goes through, its result closes or opens
+               the circuit again.
+
+    Args:
+        failure_threshold
+        reset_timeout: seconds
+        clock: function returning the current time in seconds
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if self.clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """True if a request can be sent now"""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self._opened_at = self.clock()
+            self._trial = False
+
+
+class LatencyTracker:
+    """Percentiles of the last window latencies"""
+    def __init__(self, window=200):
+        self._window = deque(maxlen=window)
+        self._sorted = []
+        self._lock = threading.Lock()
+
+    def add(self, latency):
+        with self._lock:
+            if len(self._window) == self._window.maxlen:
+                self._sorted.remove(self._window[0])
+            self._window.append(latency)
+            insort(self._sorted, latency)
+
+    def percentile(self, fraction):
+        """Latency below which fraction of the samples are (None if empty)"""
+        with self._lock:
+            if not self._sorted:
+                return None
+            index = min(int(len(self._sorted) * fraction),
+                        len(self._sorted) - 1)
+            return self._sorted[index]
+
+    def __len__(self):
+        return len(self._window)
+
+
+class ResilientTransport:
+    """Transport wrapper with circuit breaking, deadlines, retries and
+    hedged requests.
+
+    Args:
+        transport: wrapped Transport (or any object with get/post accepting
+                   a timeout argument, as requests)
+        deadline: seconds to complete a call, retries included
+        retries: attempts after the first one
+        backoff: base of the exponential backoff in seconds (full jitter)
+        retry_statuses: HTTP statuses meaning the OP didn't process the
+                        request
+        hedge_after: 'p95' to hedge after the recent p95 latency of the
+                     endpoint, seconds for a fixed delay, None to disable
+        hedge_methods: methods that are hedged and retried after a read
+                       failure (idempotent ones)
+        min_samples: latencies needed before hedging after 'p95'
+        failure_threshold: circuit breaker (CircuitBreaker)
+        reset_timeout: circuit breaker (CircuitBreaker)
+        max_workers: threads running hedged requests
+    """
+    def __init__(self, transport, deadline=5, retries=2, backoff=0.05,
+                 retry_statuses=(502, 503), hedge_after='p95',
+                 hedge_methods=('GET',), min_samples=20,
+                 failure_threshold=5, reset_timeout=30, max_workers=32):
+        self.transport = transport
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_statuses = frozenset(retry_statuses)
+        self.hedge_after = hedge_after
+        self.hedge_methods = frozenset(hedge_methods)
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_workers = max_workers
+        self.hedged = 0
+        self._breakers = {}
+        self._latencies = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, **kwargs):
+        return self.request('GET', url, params=params, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request('POST', url, data=data, **kwargs)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        if hasattr(self.transport, 'close'):
+            self.transport.close()
+
+    @property
+    def state(self):
+        """Circuit state and p95 latency of every endpoint"""
+        with self._lock:
+            endpoints = list(self._breakers)
+        return {endpoint: {
+                    'circuit': self._breakers[endpoint].state,
+                    'failures': self._breakers[endpoint].failures,
+                    'p95': self._latencies[endpoint].percentile(0.95),
+                } for endpoint in endpoints}
+
+    def _endpoint(self, url):
+        parts = urlsplit(url)
+        endpoint = '%s://%s%s' % (parts.scheme, parts.netloc, parts.path)
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(
+                    self.failure_threshold, self.reset_timeout)
+                self._latencies[endpoint] = LatencyTracker()
+        return endpoint
+
+    def request(self, method, url, **kwargs):
+        """Send a request within the deadline
+
+        Raises:
+            OpenIDCircuitOpen: the circuit of the endpoint is open
+            requests.exceptions.Timeout: the deadline was reached
+        """
+        endpoint = self._endpoint(url)
+        breaker = self._breakers[endpoint]
+        expires = time.monotonic() + self.deadline
+        idempotent = method in self.hedge_methods
+
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise OpenIDCircuitOpen('circuit open', endpoint)
+
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                raise Timeout('deadline reached on %s' % endpoint)
+
+            try:
+                response = self._attempt(method, url, endpoint, remaining,
+                                         idempotent, kwargs)
+            except (ConnectionError, Timeout) as error:
+                breaker.failure()
+                retry = idempotent or isinstance(error, ConnectTimeout) or \
+                    _connect_failed(error)
+                if not retry or attempt >= self.retries:
+                    raise
+            except BaseException:
+                # any other error ends a half-open trial too
+                breaker.failure()
+                raise
+            else:
+                if response.status_code not in self.retry_statuses:
+                    breaker.success()
+                    return response
+                breaker.failure()
+                if attempt >= self.retries:
+                    return response
+
+            attempt += 1
+            sleep = random.uniform(0, self.backoff * 2 ** attempt)
+            time.sleep(max(min(sleep, expires - time.monotonic()), 0))
+
+    def _attempt(self, method, url, endpoint, timeout, idempotent, kwargs):
+        """One attempt, hedged when it's slower than the hedge delay"""
+        latencies = self._latencies[endpoint]
+        delay = self._hedge_delay(latencies) if idempotent else None
+
+        if delay is None or delay >= timeout:
+            return self._send(method, url, latencies, timeout, kwargs)
+
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_workers)
+
+        started = time.monotonic()
+        pending = {self._executor.submit(self._send, method, url, latencies,
+                                         timeout, kwargs)}
+        done, pending = wait(pending, timeout=delay)
+        if not done:
+            with self._lock:
+                self.hedged += 1
+            remaining = timeout - (time.monotonic() - started)
+            pending.add(self._executor.submit(self._send, method, url,
+                                              latencies, remaining, kwargs))
+
+        error = None
+        while True:
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+            if not pending:
+                raise error
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    def _hedge_delay(self, latencies):
+        if self.hedge_after is None:
+            return None
+        if self.hedge_after != 'p95':
+            return self.hedge_after
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies.percentile(0.95)
+
+    def _send(self, method, url, latencies, timeout, kwargs):
+        started = time.monotonic()
+        http_call = getattr(self.transport, method.lower())
+        response = http_call(url, timeout=timeout, **kwargs)
+        latencies.add(time.monotonic() - started)
+        return response
+
+
+def _connect_failed(error):
+    """True when the connection failed before sending the request"""
+    reason = getattr(error.args[0] if error.args else None, 'reason', None)
+    return isinstance(reason, NewConnectionError)
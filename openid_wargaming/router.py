@@ -0,0 +1,182 @@
+"""Wargaming realms routing
+
+Every realm (eu, na, asia, ru) has its own OP. RealmRouter sends the
+authentication requests to the OP of the player realm, keeps one warm
+connection pool per realm, and rejects assertions from an unknown OP
+Endpoint before any network call.
+"""
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .authentication import Authentication
+from .exceptions import OpenIDUnknownEndpoint
+from .transport import Transport
+from .utils import REALMS
+from .verification import Verification
+
+
+class LatencyAverage:
+    """Exponentially weighted moving average of latencies
+
+    Args:
+        alpha: weight of the last latency (0 < alpha <= 1)
+    """
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.value = None
+
+    def add(self, latency):
+        if self.value is None:
+            self.value = latency
+        else:
+            self.value += self.alpha * (latency - self.value)
+
+
+class RealmRouter:
+    """Realm aware entry point of Authentication and Verification.
+
+    Realms with several OP Endpoints use the one with the lowest latency
+    average. Endpoints never measured are tried first.
+
+    Args:
+        realms: OP Endpoints by realm (default: REALMS)
+        transport_factory: function returning the Transport of a realm
+        alpha: LatencyAverage weight
+        penalty: latency recorded when a request fails (seconds)
+        associations, observer, secret: Authentication and Verification
+            arguments
+        return_to_base, token_ttl: Authentication arguments
+        store, discovery, cache, flights: Verification arguments
+
+    Attributes:
+        transports: Transport by realm
+    """
+    def __init__(self, realms=None, transport_factory=Transport, alpha=0.2,
+                 penalty=10, associations=None, observer=None, secret=None,
+                 return_to_base=None, token_ttl=None, store=None,
+                 discovery=None, cache=None, flights=None):
+        self.realms = {realm: tuple(endpoints) for realm, endpoints
+                       in (realms or REALMS).items()}
+        self.penalty = penalty
+        shared = {'associations': associations, 'observer': observer,
+                  'secret': secret}
+        self.authentication_kwargs = dict(shared,
+                                          return_to_base=return_to_base,
+                                          token_ttl=token_ttl)
+        self.verification_kwargs = dict(shared, store=store,
+                                        discovery=discovery, cache=cache,
+                                        flights=flights)
+        self.transports = {realm: _TimedTransport(self, transport_factory())
+                           for realm in self.realms}
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._realms = {}
+        for realm, endpoints in self.realms.items():
+            for endpoint in endpoints:
+                self._latencies[endpoint] = LatencyAverage(alpha)
+                self._realms[endpoint] = realm
+
+    def realm(self, op_endpoint):
+        """Realm of an OP Endpoint (None if unknown)"""
+        return self._realms.get(op_endpoint)
+
+    def endpoint(self, realm):
+        """OP Endpoint of a realm with the lowest latency average"""
+        with self._lock:
+            return min(self.realms[realm],
+                       key=lambda endpoint:
+                       self._latencies[endpoint].value or 0)
+
+    def authenticate(self, realm, offline=False, **kwargs):
+        """Authentication.authenticate on the OP of realm
+
+        Args:
+            realm
+            offline: see Authentication.authenticate
+            **kwargs: Authentication arguments
+
+        Returns:
+            Location (or OP Endpoint request on offline mode)
+        """
+        auth = Authentication(transport=self.transports[realm],
+                              **dict(self.authentication_kwargs, **kwargs))
+        return auth.authenticate(self.endpoint(realm), offline=offline)
+
+    def verification(self, assertion_url, **kwargs):
+        """Verification of an assertion sent by a known OP Endpoint
+
+        Raises:
+            OpenIDUnknownEndpoint: openid.op_endpoint is not on any realm
+        """
+        verification = Verification(
+            assertion_url, **dict(self.verification_kwargs, **kwargs))
+        op_endpoint = verification.parsed.fields.get('openid.op_endpoint')
+        realm = self.realm(op_endpoint)
+        if realm is None:
+            raise OpenIDUnknownEndpoint('unknown OP Endpoint', op_endpoint)
+
+        verification.transport = self.transports[realm]
+        return verification
+
+    def verify(self, assertion_url, **kwargs):
+        """Verification.verify through the pool of the assertion realm"""
+        return self.verification(assertion_url, **kwargs).verify()
+
+    def warm(self):
+        """Open a connection to every OP Endpoint and measure its latency
+
+        Unreachable endpoints are ignored.
+        """
+        for realm, endpoints in self.realms.items():
+            for endpoint in endpoints:
+                try:
+                    self.transports[realm].get(endpoint,
+                                               allow_redirects=False)
+                except Exception:
+                    pass
+
+    def close(self):
+        for transport in self.transports.values():
+            transport.close()
+
+    @property
+    def stats(self):
+        """Latency average of every OP Endpoint"""
+        with self._lock:
+            return {endpoint: latency.value for endpoint, latency
+                    in self._latencies.items()}
+
+    def _record(self, url, latency):
+        parts = urlsplit(url)
+        endpoint = '%s://%s%s' % (parts.scheme, parts.netloc, parts.path)
+        with self._lock:
+            average = self._latencies.get(endpoint)
+            if average is not None:
+                average.add(latency)
+
+
+class _TimedTransport:
+    """Transport reporting its latencies to the router"""
+    def __init__(self, router, transport):
+        self.router = router
+        self.transport = transport
+
+    def get(self, url, params=None, **kwargs):
+        return self._timed(self.transport.get, url, params=params, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self._timed(self.transport.post, url, data=data, **kwargs)
+
+    def close(self):
+        self.transport.close()
+
+    def _timed(self, function, url, **kwargs):
+        started = time.monotonic()
+        try:
+            response = function(url, **kwargs)
+        except Exception:
+            self.router._record(url, self.router.penalty)
+            raise
+        self.router._record(url, time.monotonic() - started)
+        return response
@@ -0,0 +1,116 @@
+"""Coalescing of identical calls running at the same time
+
+The same assertion verified at once on several threads or tasks (proxy
+retries, double clicks) needs only one check_authentication request:
+the first caller sends it, the others wait and share its response (or
+its exception). Calls are only shared while in flight, nothing is kept
+after the first caller gets its answer.
+
+The nonce is still committed by every verification, so with a
+NonceStore only one of the coalesced verifications passes.
+"""
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread-safe single-flight group
+
+    Attributes:
+        calls: calls executed
+        shared: calls answered with the result of another one
+    """
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, function, *args, **kwargs):
+        """Result of function(*args, **kwargs), shared by the calls with
+        the same key running at the same time
+        """
+        with self._lock:
+            call = self._flights.get(key)
+            leader = call is None
+            if leader:
+                call = self._flights[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args, **kwargs)
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            call.done.set()
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {'calls': self.calls, 'shared': self.shared,
+                    'in_flight': len(self._flights)}
+
+
+class AsyncSingleFlight:
+    """Single-flight group of coroutines, for one event loop
+
+    The shared call runs on its own task: a caller cancelled (client
+    gone) stops waiting for it without cancelling the others.
+
+    Attributes:
+        calls: calls executed
+        shared: calls answered with the result of another one
+    """
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._flights = {}
+
+    async def do(self, key, function, *args, **kwargs):
+        """Result of await function(*args, **kwargs), shared by the calls
+        with the same key running at the same time
+        """
+        import asyncio
+
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.shared += 1
+        else:
+            flight = self._flights[key] = asyncio.ensure_future(
+                function(*args, **kwargs))
+            self.calls += 1
+            flight.add_done_callback(
+                lambda flight: self._done(key, flight))
+
+        return await asyncio.shield(flight)
+
+    def _done(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            flight.exception()  # retrieved, even when every caller is gone
+
+    @property
+    def stats(self):
+        return {'calls': self.calls, 'shared': self.shared,
+                'in_flight': len(self._flights)}
@@ -0,0 +1,279 @@
+"""Local stand-in Wargaming OpenID Provider for tests and benchmarks
+
+It never touches Wargaming. It runs on a background thread and
+understands enough of OpenID 2.0 to drive full login flows:
+
+    * checkid_setup: redirects to a fake sign-in page
+    * associate: DH-SHA1/DH-SHA256 shared associations
+    * check_authentication: verifies its own private signatures
+
+Faults (latency, error statuses) can be injected to test resilience.
+
+Example:
+
+    with StandInOP() as op:
+        url = op.assertion('https://example.com/callback?request_id=ID1')
+        Verification(url).verify()
+"""
+import base64
+import hashlib
+import hmac
+import secrets
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+from uuid import uuid4
+
+from .association import btwoc, unbtwoc, signature_message
+from .association import DiffieHellman, SESSION_DIGESTS
+from .kvform import encode
+
+
+OPENID_NS = 'http://specs.openid.net/auth/2.0'
+SIGNED_FIELDS = ('op_endpoint', 'claimed_id', 'identity', 'return_to',
+                 'response_nonce', 'assoc_handle')
+
+
+def sign(secret, fields, signed):
+    """HMAC-SHA256 signature of the fields listed in signed (Section 6.1)"""
+    digest = hmac.new(secret, signature_message(fields, signed),
+                      hashlib.sha256)
+    return base64.b64encode(digest.digest()).decode('ascii')
+
+
+class StandInOP:
+    """Local OpenID Provider running on 127.0.0.1
+
+    Args:
+        host
+        port: 0 picks a free port
+        expires_in: lifetime of the shared associations
+        latency: seconds added to every response
+
+    Attributes:
+        endpoint: OP Endpoint URL
+        calls: Counter of requests received by openid.mode
+        associations: shared association secrets by handle
+    """
+    def __init__(self, host='127.0.0.1', port=0, expires_in=3600,
+                 latency=0):
+        self.secret = secrets.token_bytes(32)
+        self.handle = '{HMAC-SHA256}{private}{%s}' % uuid4().hex
+        self.expires_in = expires_in
+        self.latency = latency
+        self._faults = deque()
+        self.associations = {}
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.op = self
+        self._thread = None
+
+    @property
+    def endpoint(self):
+        host, port = self._server.server_address[:2]
+        return 'http://%s:%d/id/openid/' % (host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count(self, mode):
+        with self._lock:
+            self.calls[mode] += 1
+
+    def inject(self, delay=0, status=None, times=1):
+        """Next times requests are delayed and/or answered with status"""
+        with self._lock:
+            self._faults.extend([(delay, status)] * times)
+
+    def fault(self):
+        """Delay and error status of the next request"""
+        with self._lock:
+            delay, status = self._faults.popleft() if self._faults \
+                else (0, None)
+        return delay + self.latency, status
+
+    def assertion(self, return_to, account_id=1000000, nickname='JohnDoe',
+                  nonce=None, assoc_handle=None):
+        """Positive assertion URL as received by the return_to endpoint
+
+        Signed with the shared association assoc_handle when the OP knows
+        it, otherwise with the private association (and the unknown
+        assoc_handle is sent back on openid.invalidate_handle).
+        """
+        identity = 'https://eu.wargaming.net/id/%d-%s/' % (account_id,
+                                                          nickname)
+        nonce = nonce or datetime.now(timezone.utc).strftime(
+            '%Y-%m-%dT%H:%M:%SZ') + uuid4().hex
+
+        fields = {
+            'openid.ns': OPENID_NS,
+            'openid.mode': 'id_res',
+            'openid.op_endpoint': self.endpoint,
+            'openid.claimed_id': identity,
+            'openid.identity': identity,
+            'openid.return_to': return_to,
+            'openid.response_nonce': nonce,
+            'openid.signed': ','.join(SIGNED_FIELDS),
+        }
+
+        if assoc_handle in self.associations:
+            fields['openid.assoc_handle'] = assoc_handle
+            secret = self.associations[assoc_handle]
+        else:
+            fields['openid.assoc_handle'] = self.handle
+            secret = self.secret
+            if assoc_handle is not None:
+                fields['openid.invalidate_handle'] = assoc_handle
+
+        fields['openid.sig'] = sign(secret, fields, SIGNED_FIELDS)
+
+        separator = '&' if urlparse(return_to).query else '?'
+        return return_to + separator + urlencode(fields)
+
+    def check_authentication(self, fields):
+        """Direct verification of a private association signature"""
+        signed = fields.get('openid.signed', '').split(',')
+        try:
+            expected = sign(self.secret, fields, signed)
+        except KeyError:
+            return False
+
+        return fields.get('openid.assoc_handle') == self.handle and \
+            hmac.compare_digest(expected.encode(),
+                                fields.get('openid.sig', '').encode('utf-8'))
+
+    def associate(self, fields):
+        """Shared association response (Section 8.2)"""
+        session_type = fields.get('openid.session_type')
+        if fields.get('openid.assoc_type') != 'HMAC-SHA256' or \
+           session_type not in SESSION_DIGESTS:
+            return {'error': 'unsupported association',
+                    'error_code': 'unsupported-type',
+                    'session_type': 'DH-SHA256',
+                    'assoc_type': 'HMAC-SHA256'}
+
+        consumer_public = unbtwoc(
+            base64.b64decode(fields['openid.dh_consumer_public']))
+        exchange = DiffieHellman()
+        mac_key = secrets.token_bytes(32)
+        handle = '{HMAC-SHA256}{shared}{%s}' % uuid4().hex
+        with self._lock:
+            self.associations[handle] = mac_key
+
+        enc_mac_key = exchange.xor_secret(consumer_public, mac_key,
+                                          SESSION_DIGESTS[session_type])
+        return {
+            'assoc_handle': handle,
+            'session_type': session_type,
+            'assoc_type': 'HMAC-SHA256',
+            'expires_in': str(self.expires_in),
+            'dh_server_public': base64.b64encode(
+                btwoc(exchange.public)).decode('ascii'),
+            'enc_mac_key': base64.b64encode(enc_mac_key).decode('ascii'),
+        }
+
+    def invalidate(self, handle):
+        """Forget a shared association"""
+        with self._lock:
+            self.associations.pop(handle, None)
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients give up on injected delays, that's expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _faulty(self):
+        """Apply the next injected fault. True if the request failed"""
+        delay, status = self.server.op.fault()
+        if delay:
+            time.sleep(delay)
+        if status is not None:
+            self._send(status)
+            return True
+        return False
+
+    def do_GET(self):
+        op = self.server.op
+        query = parse_qs(urlparse(self.path).query)
+        mode = query.get('openid.mode', [''])[0]
+        op.count(mode)
+        if self._faulty():
+            return
+
+        if mode == 'checkid_setup':
+            location = '/id/signin/?next=/id/openid/%s/' % uuid4().int
+            self._send(302, headers={'Location': location})
+        else:
+            self._send(404)
+
+    def do_POST(self):
+        op = self.server.op
+        length = int(self.headers.get('Content-Length', 0))
+        fields = {key: value[0] for key, value
+                  in parse_qs(self.rfile.read(length).decode()).items()}
+        mode = fields.get('openid.mode', '')
+        op.count(mode)
+        if self._faulty():
+            return
+
+        if mode == 'check_authentication':
+            response = {
+                'is_valid': 'true' if op.check_authentication(fields)
+                            else 'false'
+            }
+            invalidate_handle = fields.get('openid.invalidate_handle')
+            if invalidate_handle and \
+               invalidate_handle not in op.associations:
+                response['invalidate_handle'] = invalidate_handle
+            self._send_kv(200, response)
+
+        elif mode == 'associate':
+            response = op.associate(fields)
+            self._send_kv(400 if 'error' in response else 200, response)
+
+        else:
+            self._send_kv(400, {'error': 'unsupported mode'})
+
+    def _send_kv(self, status, response):
+        """Key-Value Form response (Section 5.1.2)"""
+        body = encode(dict(ns=OPENID_NS, **response))
+        self._send(status, body.encode('utf-8'),
+                   {'Content-Type': 'text/plain'})
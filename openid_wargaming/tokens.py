@@ -0,0 +1,62 @@
+"""Stateless request tokens
+
+The request id, its issue time and expiry travel on the return_to url
+signed with a secret of the application:
+
+    <request_id>.<issued_at>.<expires_at>.<signature>
+
+so the callback is checked locally, without any session lookup.
+"""
+import base64
+import hashlib
+import hmac
+import time
+
+from .exceptions import OpenIDInvalidToken
+
+
+def _signature(secret, message):
+    if isinstance(secret, str):
+        secret = secret.encode('utf-8')
+    digest = hmac.new(secret, message.encode('utf-8'), hashlib.sha256)
+    return base64.urlsafe_b64encode(digest.digest()).rstrip(b'=').decode()
+
+
+def make_token(secret, request_id, ttl=600, clock=time.time):
+    """Signed token of request_id, valid for ttl seconds"""
+    issued_at = int(clock())
+    message = '%s.%d.%d' % (request_id, issued_at, issued_at + ttl)
+    return '%s.%s' % (message, _signature(secret, message))
+
+
+def read_token(secret, token, skew=60, clock=time.time):
+    """request_id of a valid token
+
+    Args:
+        secret
+        token
+        skew: seconds of clock difference allowed between servers
+        clock: function returning the current time in seconds
+
+    Raises:
+        OpenIDInvalidToken: malformed, forged, expired or future token
+    """
+    try:
+        message, signature = token.rsplit('.', 1)
+        request_id, issued_at, expires_at = message.rsplit('.', 2)
+        issued_at, expires_at = int(issued_at), int(expires_at)
+    except (AttributeError, ValueError):
+        raise OpenIDInvalidToken('malformed token', token)
+
+    # bytes: compare_digest raises TypeError on non-ASCII str
+    if not hmac.compare_digest(_signature(secret, message).encode(),
+                               signature.encode('utf-8')):
+        raise OpenIDInvalidToken('forged token', token)
+
+    now = clock()
+    if expires_at < now:
+        raise OpenIDInvalidToken('expired token', token)
+    if issued_at > now + skew:
+        raise OpenIDInvalidToken('token issued in the future', token)
+
+    return request_id
@@ -0,0 +1,253 @@
+"""HTTP transports used to talk with the OpenID Provider
+
+requests (and urllib3) are imported on the first request or Transport,
+never at import time: assertions rejected by the local checks don't pay
+for them. asyncio and ssl are only imported by AsyncTransport requests.
+"""
+import threading
+import weakref
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+
+def get(url, params=None, **kwargs):
+    """requests.get, imported on the first call"""
+    import requests
+    return requests.get(url, params=params, **kwargs)
+
+
+def post(url, data=None, **kwargs):
+    """requests.post, imported on the first call"""
+    import requests
+    return requests.post(url, data=data, **kwargs)
+
+
+class Transport:
+    """Pooled keep-alive HTTP client shared by Authentication and
+    Verification.
+
+    All the OP traffic goes through one requests.Session, so connections
+    to the OP are kept warm and reused between logins.
+
+    Args:
+        pool_connections: number of hosts to keep a pool for
+        pool_maxsize: max connections kept per host
+        timeout: seconds, or (connect, read) tuple, for every request
+        retries: connection retries (int or urllib3 Retry). Read errors
+                 are never retried, check_authentication is not idempotent
+                 on the OP side.
+        backoff_factor: sleep between retries (urllib3 Retry)
+        session: requests.Session to use instead of a new one
+
+    Attributes:
+        session
+        timeout
+    """
+    def __init__(self, pool_connections=10, pool_maxsize=10, timeout=10,
+                 retries=0, backoff_factor=0, session=None):
+        from requests import Session
+        from urllib3.util.retry import Retry
+
+        if not isinstance(retries, Retry):
+            retries = Retry(total=retries, read=False,
+                            backoff_factor=backoff_factor)
+
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._connections = 0
+
+        adapter = _counting_adapter()(self._connection_opened,
+                                      pool_connections=pool_connections,
+                                      pool_maxsize=pool_maxsize,
+                                      max_retries=retries)
+        self.session = session or Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        with self._lock:
+            self._requests += 1
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, params=None, **kwargs):
+        return self.request('GET', url, params=params, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request('POST', url, data=data, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def _connection_opened(self):
+        with self._lock:
+            self._connections += 1
+
+    @property
+    def stats(self):
+        """Requests sent, connections opened and connections reused"""
+        with self._lock:
+            requests, connections = self._requests, self._connections
+        return {
+            'requests': requests,
+            'connections': connections,
+            'reused': max(requests - connections, 0),
+        }
+
+
+@lru_cache(maxsize=None)
+def _counting_adapter():
+    """HTTPAdapter whose connection pools report every new connection"""
+    from requests.adapters import HTTPAdapter
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class CountingAdapter(HTTPAdapter):
+        def __init__(self, on_connection, **kwargs):
+            self._on_connection = on_connection
+            super().__init__(**kwargs)
+
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                'http': _counting(HTTPConnectionPool, self._on_connection),
+                'https': _counting(HTTPSConnectionPool,
+                                   self._on_connection),
+            }
+
+    return CountingAdapter
+
+
+def _counting(pool_class, on_connection):
+    class CountingConnectionPool(pool_class):
+        def _new_conn(self):
+            on_connection()
+            return super()._new_conn()
+
+    return CountingConnectionPool
+
+
+class AsyncResponse:
+    """Minimal HTTP response returned by AsyncTransport
+
+    Attributes:
+        status_code
+        headers: dict with lowercase header names
+        content: body as bytes
+    """
+    __slots__ = ('status_code', 'headers', 'content')
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+
+class AsyncTransport:
+    """Non-blocking HTTP/1.1 transport built on asyncio streams.
+
+    Any object with a compatible ``post`` coroutine could be used instead
+    (aiohttp, httpx, ...) by AsyncVerification.
+
+    Args:
+        timeout: seconds to wait for the whole request
+        limit: max number of simultaneous connections of an event loop
+               (None: unbounded)
+        ssl_context: context used on https URLs
+    """
+    def __init__(self, timeout=10, limit=None, ssl_context=None):
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self._limit = limit
+        # a semaphore is bound to its event loop: one per loop using it
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    async def post(self, url, data, headers=None):
+        """Send a POST request and return an AsyncResponse"""
+        import asyncio
+
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        if self._limit is None:
+            return await asyncio.wait_for(
+                self._request('POST', url, data, headers), self.timeout)
+
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = \
+                asyncio.Semaphore(self._limit)
+
+        async with semaphore:
+            return await asyncio.wait_for(
+                self._request('POST', url, data, headers), self.timeout)
+
+    async def _request(self, method, url, data, headers):
+        import asyncio
+        import ssl
+
+        parts = urlsplit(url)
+        secure = parts.scheme == 'https'
+        port = parts.port or (443 if secure else 80)
+        context = None
+        if secure:
+            context = self.ssl_context or ssl.create_default_context()
+
+        reader, writer = await asyncio.open_connection(parts.hostname, port,
+                                                       ssl=context)
+        try:
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+
+            lines = ['%s %s HTTP/1.1' % (method, path),
+                     'Host: %s' % parts.netloc,
+                     'Content-Length: %d' % len(data),
+                     'Connection: close']
+            lines.extend('%s: %s' % item for item in (headers or {}).items())
+            head = '\r\n'.join(lines) + '\r\n\r\n'
+            writer.write(head.encode('latin-1') + data)
+
+            return await self._read_response(reader)
+
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass  # the response (or the original error) matters
+
+    async def _read_response(self, reader):
+        status_line = await reader.readline()
+        status_code = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if not size:
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            content = b''.join(chunks)
+
+        elif 'content-length' in headers:
+            content = await reader.readexactly(int(headers['content-length']))
+
+        else:
+            content = await reader.read()
+
+        return AsyncResponse(status_code, headers, content)
@@ -1,20 +1,66 @@
 """Some general utilities"""
-from uuid import uuid4
-from requests import get
+import hashlib
+import hmac
+import os
+from urllib.parse import urlencode, urlparse
+
+from .tokens import make_token
+from .transport import get
 
 
 HTTPBIN='https://httpbin.org/get'
+RETURN_TO_BASE = 'http://localhost:8000/'
+
+# OP Endpoints of every Wargaming realm
+REALMS = {
+    'eu': ('https://eu.wargaming.net/id/openid/',),
+    'na': ('https://na.wargaming.net/id/openid/',),
+    'asia': ('https://asia.wargaming.net/id/openid/',),
+    'ru': ('https://ru.wargaming.net/id/openid/',),
+}
+
+
+def build_return_to(base_url, request_id, secret=None, token_ttl=None):
+    """Create the return url locally, without any network call.
+
+    The request_id is added to the query string of base_url. When a secret
+    is given, a "state" parameter signs the request_id, so the callback
+    can check it was generated here. With a secret and token_ttl, a signed
+    "token" carrying the request_id and its expiry is added instead.
+
+    Example:
+        build_return_to('https://example.com/callback', 'ID1')
+        'https://example.com/callback?request_id=ID1'
+    """
+    if secret is not None and token_ttl is not None:
+        parameters = {'token': make_token(secret, request_id, token_ttl)}
+    else:
+        parameters = {'request_id': request_id}
+        if secret is not None:
+            parameters['state'] = sign_state(secret, request_id)
+
+    separator = '&' if urlparse(base_url).query else '?'
+    return base_url + separator + urlencode(parameters)
+
+
+def sign_state(secret, value):
+    """HMAC-SHA256 (hex) of value"""
+    if isinstance(secret, str):
+        secret = secret.encode('utf-8')
+    return hmac.new(secret, value.encode('utf-8'), hashlib.sha256).hexdigest()
 
 
-def create_return_to(request_id):
+def create_return_to(request_id, transport=None):
     """Create a return url to do tests and analyze information
 
     This function prevents you from create a website for testing.
-    It allows you to develop quickly.
+    It allows you to develop quickly. It sends a request to httpbin.org,
+    so it's never called by the library: use build_return_to instead.
 
     Reference: httpbin.org
     """
-    r = get(HTTPBIN, {"uuid": uuid4().hex})
+    http_get = transport.get if transport else get
+    r = http_get(HTTPBIN, {"uuid": os.urandom(16).hex()})
     url = r.json()['url']
     return url
 
@@ -2,13 +2,79 @@
 
 Ref: https://openid.net/specs/openid-authentication-2_0.html#verification
 """
-from urllib.parse import urlparse, parse_qs, urlencode
-
-from requests import post
+import hmac
+import time
+from operator import attrgetter
+from urllib.parse import urlparse, parse_qs, urlencode, ParseResult
 
 from .exceptions import BadOpenIDReturnTo, OpenIDFailReturnURLVerification
-from .exceptions import OpenIDVerificationFailed
-from .utils import nonce_saver, nonce_reader
+from .exceptions import OpenIDVerificationFailed, OpenIDInvalidToken
+from .exceptions import OpenIDUnknownEndpoint
+from .identity import parse_identity
+from .instrumentation import observed_request
+from .kvform import decode, TYPES
+from .nonce import nonce_timestamp, MAX_AGE, SKEW
+from .tokens import read_token
+from .transport import post
+from .utils import nonce_saver, nonce_reader, sign_state, REALMS
+
+
+# Note: This header is very important to allow this application works
+CHECK_AUTHENTICATION_HEADERS = {
+    'Content-Type': 'application/x-www-form-urlencoded'
+}
+
+# Fields openid.signed must list (Section 10.1), claimed_id and identity
+# only when present
+REQUIRED_SIGNED_FIELDS = ('op_endpoint', 'return_to', 'response_nonce',
+                          'assoc_handle')
+
+# Validator costs, verify runs the cheapest first
+LOCAL = 0    # the assertion only
+STORAGE = 1  # nonce store reads
+NETWORK = 2  # requests to the OP or discovery
+COMMIT = 3   # side effects, once everything else passed
+
+_UNPARSED = object()
+
+
+def cost(value):
+    """Declare the cost of a validator"""
+    def decorator(validator):
+        validator.cost = value
+        return validator
+    return decorator
+
+
+class ParsedAssertion:
+    """Assertion URL parsed only once.
+
+    Every validator reads the OpenID fields from this object instead of
+    parsing the query string again. Only the first value of every
+    parameter is kept, which is the only one used by the validators.
+
+    Args:
+        assertion: urlparse result of the assertion URL
+
+    Attributes:
+        fields: query parameters of the assertion URL
+        return_to: urlparse result of openid.return_to (None if missing)
+        return_to_fields: query parameters of openid.return_to
+    """
+    __slots__ = ('fields', 'return_to', 'return_to_fields')
+
+    def __init__(self, assertion):
+        self.fields = {key: value[0] for key, value
+                       in parse_qs(assertion.query).items()}
+
+        return_to = self.fields.get('openid.return_to')
+        if return_to is not None:
+            self.return_to = urlparse(return_to)
+            self.return_to_fields = {key: value[0] for key, value
+                                     in parse_qs(self.return_to.query).items()}
+        else:
+            self.return_to = None
+            self.return_to_fields = {}
 
 
 class Verification:
@@ -28,28 +94,79 @@ class Verification:
             assertion
 
     Args:
-        assertion_url
+        assertion_url: URL, or its urlparse result
         saver: function reference which accepts one argument (data/payload)
                and returns True if was saved.
         reader: function reference which accepts one argument
                 (openid.response_nonce) and check if exists on reader
                 backend. Returns True if exists.
+        transport: Transport used to reach the OP (module level requests
+                   functions when missing)
+        store: NonceStore. When present, saver and reader are not used.
+        associations: AssociationStore to check signatures locally. Needs
+                      a store: the OP doesn't check the nonce of a
+                      locally verified assertion.
+        discovery: Discovery used to verify the discovered information
+                   (the check is skipped when missing)
+        observer: instrumentation Observer, timing every validator and
+                  the check_authentication request
+        secret: check the signed request token of the return url
+                (Authentication token_ttl), or the signed request_id
+                (state) without token_ttl. The check is skipped when
+                missing.
+        cache: ResultCache answering exact duplicates of an assertion
+               verified a few seconds before (its nonce is spent)
+        flights: SingleFlight sharing one check_authentication request
+                 between identical assertions verified at the same time
+
+    Attributes:
+        request_id: request id of a valid token or state
+
+    Raises:
+        TypeError: associations without store
     """
-    def __init__(self, assertion_url, evidence=None, saver=None, reader=None):
-        self.assertion = urlparse(assertion_url)
+    # Validator chain run by verify (see validators)
+    VALIDATORS = ('is_positive_assertion', 'verify_return_url',
+                  'verify_request_token', 'verify_signed_fields',
+                  'check_nonce_timestamp', 'verify_discovered_information',
+                  'check_nonce', 'verify_signatures', 'commit_nonce')
+
+    def __init__(self, assertion_url, evidence=None, saver=None, reader=None,
+                 transport=None, store=None, associations=None,
+                 discovery=None, observer=None, secret=None, cache=None,
+                 flights=None):
+        _check_associations(associations, store)
+        if isinstance(assertion_url, ParseResult):
+            self.assertion = assertion_url
+        else:
+            self.assertion = urlparse(assertion_url)
+        self.parsed = ParsedAssertion(self.assertion)
         self.saver = saver or nonce_saver
         self.reader = reader or nonce_reader
+        self.transport = transport
+        self.store = store
+        self.associations = associations
+        self.discovery = discovery
+        self.observer = observer
+        self.secret = secret
+        self.cache = cache
+        self.flights = flights
+        self.request_id = None
+        self._identity = _UNPARSED
+
+    @classmethod
+    def from_parts(cls, scheme, netloc, path, query, **kwargs):
+        """Verification of the request URL parts, without building the URL
+
+        Web frameworks give them apart (WSGI environ, ASGI scope).
+        """
+        return cls(ParseResult(scheme, netloc, path, '', query, ''), **kwargs)
 
     @property
     def return_to(self):
-        key = 'openid.return_to'
-        query = parse_qs(self.assertion.query)
-        if key in query:
-            return urlparse(query[key][0])
-
-        else:
-            return None
+        return self.parsed.return_to
 
+    @cost(LOCAL)
     def is_positive_assertion(self):
         """Positive Assertions
 
@@ -61,14 +178,13 @@ class Verification:
         Returns:
             reason - When negative assertion
         """
-        key = 'openid.mode'
-        query = parse_qs(self.assertion.query)
+        fields = self.parsed.fields
 
-        if key in query:
-            mode = query[key][0]
+        if 'openid.mode' in fields:
+            mode = fields['openid.mode']
         else:
             raise BadOpenIDReturnTo("return_to url doesn't look to OpenID url",
-                                    query)
+                                    fields)
 
         if mode == 'id_res':
             return True
@@ -77,6 +193,7 @@ class Verification:
             self.reason = mode
             return False
 
+    @cost(LOCAL)
     def verify_return_url(self):
         """OpenID Verifying the Return URL
 
@@ -92,19 +209,20 @@ class Verification:
             URL MUST also be present with the same values in the URL of the
             HTTP request the RP received.
         """
+        return_to = self.parsed.return_to
 
-        if self.assertion.scheme != self.return_to.scheme or \
-           self.assertion.netloc != self.return_to.netloc or \
-           self.assertion.path != self.return_to.path:
+        if return_to is None or \
+           self.assertion.scheme != return_to.scheme or \
+           self.assertion.netloc != return_to.netloc or \
+           self.assertion.path != return_to.path:
             reason = 'scheme/authority/path are not the same'
             raise OpenIDFailReturnURLVerification(reason)
 
-        query_parameters = parse_qs(self.return_to.query)
-        assertion_parameters = parse_qs(self.assertion.query)
+        assertion_parameters = self.parsed.fields
 
-        for parameter, value in query_parameters.items():
+        for parameter, value in self.parsed.return_to_fields.items():
             if parameter in assertion_parameters:
-                if value[0] != assertion_parameters[parameter][0]:
+                if value != assertion_parameters[parameter]:
                     reason = 'parameter %s has not the same value' % parameter
                     raise OpenIDFailReturnURLVerification(reason)
 
@@ -114,14 +232,126 @@ class Verification:
 
         return True
 
+    @cost(LOCAL)
+    def verify_request_token(self):
+        """Check the signed request token of the return url
+
+        Stale or forged callbacks are rejected before the nonce store and
+        the OP are involved. openid.return_to is signed by the OP, so the
+        token can't be replaced on the way. Return urls built without
+        token_ttl carry the request_id and its signature (state) instead,
+        checked the same way but without expiry.
+
+        Returns:
+            True when valid (request_id is set), or when there is no secret
+        """
+        if self.secret is None:
+            return True
+
+        fields = self.parsed.return_to_fields
+        token = fields.get('token')
+        if token is None:
+            return self.verify_request_state(fields)
+
+        try:
+            self.request_id = read_token(self.secret, token)
+        except OpenIDInvalidToken as error:
+            self.reason = error.message
+            return False
+
+        return True
+
+    def verify_request_state(self, fields):
+        """Check the state (signed request_id) of the return url fields"""
+        request_id, state = fields.get('request_id'), fields.get('state')
+        if request_id is None or state is None:
+            self.reason = 'missing token'
+            return False
+
+        # bytes: compare_digest raises TypeError on non-ASCII str
+        if not hmac.compare_digest(
+                sign_state(self.secret, request_id).encode(),
+                state.encode('utf-8')):
+            self.reason = 'forged state'
+            return False
+
+        self.request_id = request_id
+        return True
+
+    @cost(NETWORK)
     def verify_discovered_information(self):
-        """OpenID Verifying Discovered Information **NOT IMPLEMENTED**
+        """OpenID Verifying Discovered Information
+
+        The Claimed Identifier of the assertion is discovered (results are
+        cached by the Discovery object) to check the OP is authorized to
+        make assertions about it. Skipped without discovery.
 
         Reference: https://openid.net/specs/openid-authentication-2_0.html#verification
         Section: 11.2
         """
+        if self.discovery is None:
+            return True
+
+        return self.discovery.verify(self.parsed.fields)
+
+    @cost(LOCAL)
+    def verify_signed_fields(self):
+        """The fields protected by the signature are the required ones
+
+        Reference: https://openid.net/specs/openid-authentication-2_0.html#positive_assertions
+        Section: 10.1
+
+        openid.signed MUST list op_endpoint, return_to, response_nonce,
+        assoc_handle, and claimed_id and identity when present. The
+        required fields must be present too: later validators read them.
+        """
+        fields = self.parsed.fields
+        if not fields.get('openid.sig'):
+            self.reason = 'missing signature'
+            return False
+
+        signed = fields.get('openid.signed', '').split(',')
+        for name in REQUIRED_SIGNED_FIELDS:
+            if 'openid.' + name not in fields:
+                self.reason = 'missing field %s' % name
+                return False
+            if name not in signed:
+                self.reason = 'field %s is not signed' % name
+                return False
+        for name in ('claimed_id', 'identity'):
+            if 'openid.' + name in fields and name not in signed:
+                self.reason = 'field %s is not signed' % name
+                return False
+
+        return True
+
+    @cost(LOCAL)
+    def check_nonce_timestamp(self):
+        """The nonce is well formed and recent (Section 10.1 and 11.3)
+
+        Old nonces are rejected without any nonce store access. The
+        accepted window is the one of the store (max_age/skew).
+        """
+        nonce = self.parsed.fields.get('openid.response_nonce')
+        if not nonce:
+            self.reason = 'missing nonce'
+            return False
+
+        try:
+            timestamp = nonce_timestamp(nonce)
+        except ValueError:
+            self.reason = 'malformed nonce'
+            return False
+
+        now = getattr(self.store, 'clock', time.time)()
+        if timestamp < now - getattr(self.store, 'max_age', MAX_AGE) or \
+           timestamp > now + getattr(self.store, 'skew', SKEW):
+            self.reason = 'stale nonce'
+            return False
+
         return True
 
+    @cost(STORAGE)
     def check_nonce(self):
         """OpenID Checking the None.
 
@@ -131,15 +361,43 @@ class Verification:
 
         Reference: https://openid.net/specs/openid-authentication-2_0.html#verification
         Section: 11.3
+
+        This is a read-only check rejecting replays before the signature
+        verification. The nonce is saved by commit_nonce, once the
+        signature is valid, so forged assertions never fill the store.
         """
-        nonce = parse_qs(self.assertion.query)['openid.response_nonce'][0]
+        nonce = self.parsed.fields['openid.response_nonce']
 
-        if not self.reader(nonce):
-            self.saver(nonce)
-            return True
+        if self.store is not None:
+            op_endpoint = self.parsed.fields.get('openid.op_endpoint', '')
+            is_valid = not self.store.seen(op_endpoint, nonce)
         else:
-            return False
+            is_valid = not self.reader(nonce)
+
+        if not is_valid:
+            self.reason = 'replayed nonce'
+        return is_valid
 
+    @cost(COMMIT)
+    def commit_nonce(self):
+        """Save the nonce of a verified assertion (Section 11.3)
+
+        The store check-and-insert is atomic: when the same assertion is
+        verified twice at the same time, only one of them passes.
+        """
+        nonce = self.parsed.fields['openid.response_nonce']
+
+        if self.store is not None:
+            op_endpoint = self.parsed.fields.get('openid.op_endpoint', '')
+            if not self.store.add(op_endpoint, nonce):
+                self.reason = 'replayed nonce'
+                return False
+            return True
+
+        self.saver(nonce)
+        return True
+
+    @cost(NETWORK)
     def verify_signatures(self):
         """OpenID Verifying Signatures (Wargaming uses Direct Verification).
 
@@ -148,30 +406,91 @@ class Verification:
         To verify the signature, the OP uses a private association that
          was generated when it issued the positive assertion.
 
+        When the assertion is signed with an association of the
+        associations store, the signature is checked locally instead.
+
         Reference: https://openid.net/specs/openid-authentication-2_0.html#verification
-        Section: 11.4.2
+        Section: 11.4.1 and 11.4.2
         """
-        # Note: This header is very important to allow this application works
-        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        query = parse_qs(self.assertion.query)
-
-        # Change openid.mode to check the signature
-        query['openid.mode'][0] = 'check_authentication'
+        is_valid = self.verify_signatures_with_association()
+        if is_valid is not None:
+            return is_valid
 
-        # Flatten query object. Remove list and get the [0] element
-        query = {key: value[0] for key, value in query.items()}
-        to_sign = urlencode(query)
+        to_sign = self.check_authentication_payload()
 
         # Verification Request
-        request = post(self.op_endopint, to_sign, allow_redirects=False,
-                       headers=headers)
+        if self.flights is None:
+            response = self.send_check_authentication(to_sign)
+        else:
+            response = self.flights.do((self.op_endopint, to_sign),
+                                       self.send_check_authentication,
+                                       to_sign)
 
         # Verification parsing
-        verification = self.parse_l2l(request.text)
+        return self.check_authentication_result(response)
+
+    def send_check_authentication(self, payload):
+        """Text of the OP response to the direct verification request"""
+        http_post = self.transport.post if self.transport else post
+        if self.observer is None:
+            request = http_post(self.op_endopint, payload,
+                                allow_redirects=False,
+                                headers=CHECK_AUTHENTICATION_HEADERS)
+        else:
+            request = observed_request(self.observer, 'check_authentication',
+                                       http_post, self.op_endopint, payload,
+                                       allow_redirects=False,
+                                       headers=CHECK_AUTHENTICATION_HEADERS)
+        return request.text
+
+    def verify_signatures_with_association(self):
+        """Verifying Signatures with an association (Section 11.4.1)
+
+        Returns:
+            None when there is no known association for openid.assoc_handle
+            (direct verification is needed), otherwise if the signature
+            is valid.
+        """
+        if self.associations is None:
+            return None
+
+        association = self.associations.get(
+            self.parsed.fields.get('openid.op_endpoint'),
+            self.parsed.fields.get('openid.assoc_handle'))
+        if association is None:
+            return None
+
+        return association.verify(self.parsed.fields)
+
+    def check_authentication_result(self, response):
+        """is_valid of a direct verification response (Section 11.4.2.2)
+
+        The association named by invalidate_handle is forgotten.
+        """
+        verification = self.parse_l2l(response)
+
+        invalidate_handle = verification.get('invalidate_handle')
+        if invalidate_handle and self.associations is not None:
+            self.associations.invalidate(self.op_endopint, invalidate_handle)
 
         return verification.get('is_valid', False)
 
-    def identify_the_end_user(self):
+    def check_authentication_payload(self):
+        """Body of the direct verification request.
+
+        Exact copies of all fields from the authentication response,
+        except for "openid.mode".
+
+        Reference: https://openid.net/specs/openid-authentication-2_0.html#verification
+        Section: 11.4.2.1
+        """
+        # Change openid.mode on a copy, the parsed fields are shared by
+        # every validator
+        query = dict(self.parsed.fields)
+        query['openid.mode'] = 'check_authentication'
+        return urlencode(query)
+
+    def identify_the_end_user(self, as_identity=False):
         """OpenID Identifying the end user.
 
         The Claimed Identifier in a successful authentication
@@ -184,33 +503,62 @@ class Verification:
         Section: 11.5
 
         Field: openid.identity and openid.claimed_id
+
+        Args:
+            as_identity: return the WargamingIdentity (see identity)
         """
-        query = parse_qs(self.assertion.query)
+        if as_identity:
+            return self.identity
+
+        fields = self.parsed.fields
         return {
-                'identity': query['openid.identity'][0],
-                'claimed_id': query['openid.claimed_id'][0],
+                'identity': fields['openid.identity'],
+                'claimed_id': fields['openid.claimed_id'],
                 }
 
+    @property
+    def identity(self):
+        """WargamingIdentity of openid.identity, parsed once
+
+        None when it isn't a Wargaming identity, or when openid.op_endpoint
+        is not an OP Endpoint of its realm (REALMS): the realm only means
+        something when that realm's OP made the assertion.
+        """
+        if self._identity is _UNPARSED:
+            fields = self.parsed.fields
+            identity = fields.get('openid.identity')
+            identity = parse_identity(identity) if identity else None
+            if identity is not None and fields.get('openid.op_endpoint') \
+               not in REALMS[identity.realm]:
+                identity = None
+            self._identity = identity
+        return self._identity
+
     def parse_l2l(self, response):
-        """Parse line by line OpenID response.
+        """Parse line by line OpenID response (Key-Value Form).
 
         Example:
 
         is_valid:false
         ns:http://specs.openid.net/auth/2.0
         """
-        cleaned = response.strip().split('\n')
-        return {fields.split(':')[0].strip():
-                self.convert_type(''.join(fields.split(':')[1:]).strip())
-                for fields in cleaned}
+        return decode(response)
 
     def convert_type(self, value):
-        TYPES = {
-            'false': False,
-            'true': True
-        }
         return TYPES.get(value, value)
 
+    @property
+    def validators(self):
+        """Validator chain run by verify, cheapest first (see cost)
+
+        Garbage and replayed assertions are rejected by the local checks
+        and the nonce store read, without any request to the OP, and
+        nothing is written to the nonce store until the signature is
+        verified.
+        """
+        return sorted([getattr(self, name) for name in self.VALIDATORS],
+                      key=attrgetter('cost'))
+
     def verify(self):
         """Process to verify an OpenID assertion.
 
@@ -220,23 +568,215 @@ class Verification:
         Returns:
             Identification
         """
-        validators = [self.is_positive_assertion,
-                      self.verify_return_url,
-                      self.verify_discovered_information,
-                      self.check_nonce,
-                      self.verify_signatures]
+        cached = self.cached_result()
+        if cached is not None:
+            return cached
+
+        for validator in self.validators:
+            self.validate(validator)
+
+        return self.cache_result(self.identify_the_end_user())
+
+    def result_key(self):
+        """Key of the assertion on the result cache (None if unsigned)"""
+        fields = self.parsed.fields
+        key = (fields.get('openid.op_endpoint'),
+               fields.get('openid.response_nonce'),
+               fields.get('openid.sig'))
+        return None if None in key else key
+
+    def result_request(self):
+        """Whole assertion, compared on a result cache hit"""
+        assertion = self.assertion
+        return (assertion.scheme, assertion.netloc, assertion.path,
+                self.parsed.fields)
+
+    def cached_result(self):
+        """Identification of an exact duplicate already verified (or None)"""
+        if self.cache is None:
+            return None
 
-        for validator in validators:
-            is_valid = validator()
+        key = self.result_key()
+        if key is None:
+            return None
+
+        entry = self.cache.get(key, self.result_request())
+        if entry is None:
+            return None
 
-            if not is_valid:
-                name = validator.__name__
-                reason = 'Validation fail on %s' % name
-                raise OpenIDVerificationFailed(reason, name)
+        identities, self._identity, self.request_id = entry
+        return dict(identities)
+
+    def cache_result(self, identities):
+        """Keep the Identification of the verified assertion on the cache"""
+        if self.cache is not None:
+            key = self.result_key()
+            if key is not None:
+                self.cache.set(key, self.result_request(),
+                               (dict(identities), self.identity,
+                                self.request_id))
+        return identities
+
+    @staticmethod
+    def failed(validator):
+        """Exception raised when validator doesn't pass"""
+        name = validator.__name__
+        reason = 'Validation fail on %s' % name
+        return OpenIDVerificationFailed(reason, name)
+
+    def validate(self, validator):
+        """Run one validator of the chain
+
+        Raises:
+            OpenIDVerificationFailed: when the validator doesn't pass
+        """
+        if self.observer is None:
+            if not validator():
+                raise self.failed(validator)
+            return
 
-        return self.identify_the_end_user()
+        started = time.perf_counter()
+        try:
+            is_valid = validator()
+        except Exception as error:
+            self.observe(validator, started, error=error)
+            raise
+
+        self.observe(validator, started, is_valid)
+        if not is_valid:
+            raise self.failed(validator)
+
+    def observe(self, validator, started, is_valid=False, error=None):
+        """Report a validator run to the observer"""
+        elapsed = time.perf_counter() - started
+        name = validator.__name__
+        if error is not None:
+            self.observer.record('validator', name, elapsed, 'error',
+                                 type(error).__name__)
+        elif not is_valid:
+            self.observer.record('validator', name, elapsed, 'fail',
+                                 getattr(self, 'reason', None))
+        else:
+            self.observer.record('validator', name, elapsed, 'ok')
 
     @property
     def op_endopint(self):
-        query = parse_qs(self.assertion.query)
-        return query['openid.op_endpoint'][0]
+        return self.parsed.fields['openid.op_endpoint']
+
+
+class Verifier:
+    """Verification service configured once and shared by every request
+
+    Verification keeps its configuration (transport, stores, observer,
+    ...) on every instance and sorts its validator chain on every verify.
+    A Verifier does it once: verify only creates a light context with the
+    state of one assertion (parsed fields, request_id, identity), so one
+    instance can be shared by the threads of a server without locking.
+
+    Args:
+        endpoints: OP Endpoints allowed to make assertions (any when None)
+        verification: Verification class running the validators. Its
+                      validators must be synchronous (not
+                      AsyncVerification).
+        saver, reader, transport, store, associations, discovery,
+        observer, secret, cache, flights: Verification arguments shared
+            by every assertion
+
+    Raises:
+        TypeError: verification has coroutine validators, or associations
+                   without store
+
+    Example:
+        verifier = Verifier(REALMS['eu'], store=store, transport=transport)
+        identities = verifier.verify(current_url)
+    """
+    def __init__(self, endpoints=None, verification=Verification,
+                 saver=None, reader=None, transport=None, store=None,
+                 associations=None, discovery=None, observer=None,
+                 secret=None, cache=None, flights=None):
+        import inspect  # not needed by the Verification core
+
+        validators = [getattr(verification, name)
+                      for name in verification.VALIDATORS]
+        if any(inspect.iscoroutinefunction(function) for function
+               in validators + [verification.verify]):
+            # an unawaited coroutine is truthy: it would pass the chain
+            raise TypeError('%s has coroutine validators, Verifier only '
+                            'runs synchronous ones' % verification.__name__)
+        _check_associations(associations, store)
+
+        self.endpoints = frozenset(endpoints) if endpoints is not None \
+            else None
+        self.observer = observer
+
+        # configuration of the context, as class attributes (staticmethod:
+        # saver and reader functions are not methods of it)
+        self.context = type(verification.__name__ + 'Context',
+                            (verification,), {
+                                '__init__': _context_init,
+                                'saver': staticmethod(saver or nonce_saver),
+                                'reader': staticmethod(reader or nonce_reader),
+                                'transport': transport,
+                                'store': store,
+                                'associations': associations,
+                                'discovery': discovery,
+                                'observer': observer,
+                                'secret': secret,
+                                'cache': cache,
+                                'flights': flights,
+                            })
+        self.validators = tuple(sorted(validators, key=attrgetter('cost')))
+
+    def verify(self, assertion_url, as_identity=False):
+        """Process to verify an OpenID assertion (see Verification.verify)
+
+        Args:
+            assertion_url: URL, or its urlparse result
+            as_identity: return the WargamingIdentity
+
+        Raises:
+            OpenIDUnknownEndpoint: openid.op_endpoint is not allowed
+        """
+        if not isinstance(assertion_url, ParseResult):
+            assertion_url = urlparse(assertion_url)
+        context = self.context(assertion_url)
+
+        if self.endpoints is not None:
+            op_endpoint = context.parsed.fields.get('openid.op_endpoint')
+            if op_endpoint not in self.endpoints:
+                raise OpenIDUnknownEndpoint('unknown OP Endpoint',
+                                            op_endpoint)
+
+        identities = context.cached_result()
+        if identities is None:
+            if self.observer is None:
+                for validator in self.validators:
+                    if not validator(context):
+                        raise context.failed(validator)
+            else:
+                for validator in self.validators:
+                    context.validate(validator.__get__(context))
+            identities = context.cache_result(
+                context.identify_the_end_user())
+
+        return context.identity if as_identity else identities
+
+
+def _check_associations(associations, store):
+    """Locally verified assertions are only protected against replays by
+    the store: direct verification is the OP one-time check of the nonce,
+    the default nonce_reader/nonce_saver don't remember anything.
+
+    Raises:
+        TypeError: associations without store
+    """
+    if associations is not None and store is None:
+        raise TypeError('associations need a nonce store (store)')
+
+
+def _context_init(self, assertion):
+    """State of one assertion verified by a Verifier"""
+    self.assertion = assertion
+    self.parsed = ParsedAssertion(assertion)
+    self.request_id = None
+    self._identity = _UNPARSED
@@ -8,6 +8,7 @@ setup(
     description=Path('README.md').read_text(),
     author='Miguel Angel Curiel',
     setup_requires=['setuptools>=17.1'],
+    python_requires='>=3.7',
     install_requires=['requests>=2.18.3'],
     packages=['openid_wargaming'],
 )
@@ -0,0 +1,17 @@
+import pytest
+
+from openid_wargaming.testing import StandInOP
+from openid_wargaming.utils import REALMS
+
+
+@pytest.fixture
+def op():
+    """Stand-in OP for the test"""
+    with StandInOP() as server:
+        yield server
+
+
+@pytest.fixture
+def trusted_op(op, monkeypatch):
+    """Stand-in OP trusted as an OP Endpoint of the eu realm (REALMS)"""
+    monkeypatch.setitem(REALMS, 'eu', REALMS['eu'] + (op.endpoint,))
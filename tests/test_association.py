@@ -0,0 +1,222 @@
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+import pytest
+
+from openid_wargaming.association import Association, AssociationStore
+from openid_wargaming.association import DiffieHellman, associate
+from openid_wargaming.association import btwoc, unbtwoc
+from openid_wargaming.authentication import Authentication
+from openid_wargaming.exceptions import OpenIDAssociationFailed
+from openid_wargaming.exceptions import OpenIDVerificationFailed
+from openid_wargaming.nonce import MemoryNonceStore
+from openid_wargaming.testing import StandInOP
+from openid_wargaming.transport import Transport
+from openid_wargaming.verification import Verification
+
+
+RETURN_TO = 'https://somewhere.com/?request_id=ID1'
+
+
+@pytest.fixture
+def associations():
+    transport = Transport()
+    yield AssociationStore(transport)
+    transport.close()
+
+
+@pytest.mark.parametrize('value, expected', [
+    (0, b'\x00'),
+    (127, b'\x7f'),
+    (128, b'\x00\x80'),
+    (255, b'\x00\xff'),
+    (32768, b'\x00\x80\x00'),
+])
+def test_btwoc(value, expected):
+    assert btwoc(value) == expected
+    assert unbtwoc(expected) == value
+
+
+def test_diffie_hellman_exchange():
+    consumer, server = DiffieHellman(), DiffieHellman()
+    assert consumer.shared_secret(server.public) == \
+        server.shared_secret(consumer.public)
+
+
+def test_association_verify():
+    association = Association('handle', b'secret', 'HMAC-SHA256', 0)
+    fields = {'openid.mode': 'id_res', 'openid.signed': 'mode'}
+    fields['openid.sig'] = association.sign(fields, ['mode'])
+
+    assert association.verify(fields)
+    assert not association.verify(dict(fields, **{'openid.mode': 'cancel'}))
+    assert not association.verify(dict(fields, **{'openid.signed': 'other'}))
+    assert not association.verify({'openid.mode': 'id_res'})
+    assert not association.verify(dict(fields, **{'openid.sig': '\xe9'}))
+
+
+def test_associate(op):
+    association = associate(op.endpoint)
+
+    assert association.handle in op.associations
+    assert association.secret == op.associations[association.handle]
+    assert op.calls['associate'] == 1
+
+
+def test_associate_no_encryption_requires_https(op):
+    with pytest.raises(OpenIDAssociationFailed):
+        associate(op.endpoint, session_type='no-encryption')
+    assert op.calls['associate'] == 0
+
+
+def test_associate_unsupported_type(op):
+    with pytest.raises(OpenIDAssociationFailed):
+        associate(op.endpoint, assoc_type='HMAC-SHA1')
+
+
+def test_store_reuses_association(op, associations):
+    handle = associations.handle(op.endpoint)
+
+    assert handle == associations.handle(op.endpoint)
+    assert associations.get(op.endpoint, handle).handle == handle
+    assert associations.get('https://other.op/', handle) is None
+    assert op.calls['associate'] == 1
+
+
+def test_store_expired_association(op):
+    clock = mock.Mock(return_value=1000)
+    associations = AssociationStore(margin=300, clock=clock)
+    handle = associations.handle(op.endpoint)
+
+    clock.return_value = 1000 + op.expires_in - 299
+    assert associations.get(op.endpoint, handle)
+    assert associations.handle(op.endpoint) != handle
+
+    clock.return_value = 1000 + op.expires_in
+    assert associations.get(op.endpoint, handle) is None
+
+
+def test_store_failed_association_is_not_retried_at_once():
+    clock = mock.Mock(return_value=1000)
+    associations = AssociationStore(retry_after=60, clock=clock)
+    with StandInOP() as op:
+        endpoint = op.endpoint
+
+    assert associations.handle(endpoint) is None
+    with mock.patch('openid_wargaming.association.associate') as associate:
+        assert associations.handle(endpoint) is None
+        clock.return_value = 1061
+        associations.handle(endpoint)
+
+    assert associate.call_count == 1
+
+
+@pytest.fixture(scope='module')
+def pool():
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        yield executor
+
+
+def test_associate_on_process_pool(op, pool):
+    association = associate(op.endpoint, executor=pool)
+
+    assert association.secret == op.associations[association.handle]
+
+
+def test_store_associates_off_the_request_path(op, pool):
+    associations = AssociationStore(executor=pool)
+
+    assert associations.handle(op.endpoint) is None  # direct verification
+    associations.close()  # waits for the background association
+
+    handle = associations.handle(op.endpoint)
+    assert handle in op.associations
+    assert op.calls['associate'] == 1
+
+
+def test_store_renews_before_expiring(op, pool):
+    clock = mock.Mock(return_value=1000)
+    associations = AssociationStore(margin=300, clock=clock, executor=pool)
+    handle = associations.prewarm([op.endpoint])[op.endpoint]
+
+    clock.return_value = 1000 + op.expires_in - 599
+    assert associations.handle(op.endpoint) == handle
+    associations.close()
+
+    assert associations.handle(op.endpoint) != handle
+    assert associations.get(op.endpoint, handle)
+    assert op.calls['associate'] == 2
+
+
+def test_store_prewarm(op, pool):
+    with StandInOP() as down:
+        unreachable = down.endpoint
+    associations = AssociationStore(executor=pool)
+
+    handles = associations.prewarm([op.endpoint, unreachable])
+    associations.close()
+
+    assert handles[op.endpoint] in op.associations
+    assert handles[unreachable] is None
+    assert associations.handle(unreachable) is None  # retry_after
+
+
+def test_store_prewarm_iterator(op, pool):
+    associations = AssociationStore(executor=pool)
+
+    handles = associations.prewarm(iter([op.endpoint]))
+    associations.close()
+
+    assert handles[op.endpoint] in op.associations
+
+
+def test_verification_with_association_is_local(op, associations):
+    auth = Authentication(return_to=RETURN_TO, associations=associations)
+    destination = auth.destination(op.endpoint)
+    url = op.assertion(RETURN_TO, assoc_handle=auth.assoc_handle)
+
+    identities = Verification(url, associations=associations,
+                              store=MemoryNonceStore()).verify()
+
+    assert 'openid.assoc_handle=' in destination
+    assert identities['claimed_id']
+    assert op.calls['check_authentication'] == 0
+
+
+def test_verification_with_association_forged(op, associations):
+    handle = associations.handle(op.endpoint)
+    url = op.assertion(RETURN_TO, assoc_handle=handle)
+    url = url.replace('JohnDoe', 'Mallory')
+
+    with pytest.raises(OpenIDVerificationFailed):
+        Verification(url, associations=associations,
+                     store=MemoryNonceStore()).verify()
+    assert op.calls['check_authentication'] == 0
+
+
+def test_verification_with_association_rejects_replays(op, associations):
+    url = op.assertion(RETURN_TO,
+                       assoc_handle=associations.handle(op.endpoint))
+    store = MemoryNonceStore()
+    Verification(url, associations=associations, store=store).verify()
+
+    with pytest.raises(OpenIDVerificationFailed) as error:
+        Verification(url, associations=associations, store=store).verify()
+    with pytest.raises(TypeError):
+        Verification(url, associations=associations)
+
+    assert error.value.validator == 'check_nonce'
+    assert op.calls['check_authentication'] == 0
+
+
+def test_verification_falls_back_on_unknown_handle(op, associations):
+    handle = associations.handle(op.endpoint)
+    op.invalidate(handle)
+    url = op.assertion(RETURN_TO, assoc_handle=handle)
+
+    Verification(url, associations=associations,
+                 store=MemoryNonceStore()).verify()
+
+    assert op.calls['check_authentication'] == 1
+    # the OP confirmed the invalidation
+    assert associations.get(op.endpoint, handle) is None
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from openid_wargaming.asynchronous import AsyncVerification
+from openid_wargaming.exceptions import OpenIDFailReturnURLVerification
+from openid_wargaming.exceptions import OpenIDVerificationFailed
+from openid_wargaming.nonce import MemoryNonceStore
+from openid_wargaming.transport import AsyncTransport
+
+
+RETURN_TO = 'https://somewhere.com/?request_id=ID1'
+
+
+def test_async_verify_success(op):
+    verify = AsyncVerification(op.assertion(RETURN_TO))
+    identities = asyncio.run(verify.verify())
+
+    assert identities['claimed_id'].startswith('https://eu.wargaming.net/id/')
+    assert op.calls['check_authentication'] == 1
+
+
+def test_async_verify_signatures_failed(op):
+    url = op.assertion(RETURN_TO).replace('JohnDoe', 'Mallory')
+    verify = AsyncVerification(url)
+
+    with pytest.raises(OpenIDVerificationFailed) as error:
+        asyncio.run(verify.verify())
+
+    assert error.value.validator == 'verify_signatures'
+
+
+def test_async_verify_local_failure_does_not_call_op(op):
+    url = op.assertion(RETURN_TO).replace('request_id=ID1', 'request_id=ID2', 1)
+    verify = AsyncVerification(url)
+
+    with pytest.raises(OpenIDFailReturnURLVerification):
+        asyncio.run(verify.verify())
+
+    assert op.calls['check_authentication'] == 0
+
+
+def test_async_verify_custom_transport(op):
+    class Response:
+        text = 'is_valid:true\n'
+
+    class Transport:
+        def __init__(self):
+            self.requests = []
+
+        async def post(self, url, data, headers=None):
+            self.requests.append((url, data))
+            return Response()
+
+    transport = Transport()
+    url = op.assertion(RETURN_TO)
+    asyncio.run(AsyncVerification(url, transport=transport).verify())
+
+    endpoint, data = transport.requests[0]
+    assert endpoint == op.endpoint
+    assert 'openid.mode=check_authentication' in data
+    assert op.calls['check_authentication'] == 0
+
+
+def test_async_verify_many_logins_in_flight(op):
+    transport = AsyncTransport(limit=128)
+    urls = [op.assertion(RETURN_TO, account_id=account_id)
+            for account_id in range(512)]
+
+    async def logins():
+        verifications = [AsyncVerification(url, transport=transport).verify()
+                         for url in urls]
+        return await asyncio.gather(*verifications)
+
+    identities = asyncio.run(logins())
+
+    assert len(identities) == 512
+    assert op.calls['check_authentication'] == 512
+
+
+def test_async_verify_with_association(op):
+    from openid_wargaming.association import AssociationStore
+
+    associations = AssociationStore()
+    handle = associations.handle(op.endpoint)
+    verify = AsyncVerification(op.assertion(RETURN_TO, assoc_handle=handle),
+                               associations=associations,
+                               store=MemoryNonceStore())
+
+    assert asyncio.run(verify.verify())
+    assert op.calls['check_authentication'] == 0
+
+
+def test_async_transport_reused_across_event_loops(op):
+    transport = AsyncTransport(limit=1)
+
+    async def logins():
+        return await asyncio.gather(*[
+            AsyncVerification(op.assertion(RETURN_TO),
+                              transport=transport).verify()
+            for _ in range(4)])
+
+    for _ in range(2):
+        assert all(asyncio.run(logins()))
+
+    assert op.calls['check_authentication'] == 8
@@ -1,21 +1,26 @@
 """Unit Test with pytest"""
 from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
 import pytest
 
 from openid_wargaming.authentication import Authentication
+from openid_wargaming.authentication import AuthenticationTemplate
+
+
+ENDPOINT = 'https://eu.wargaming.net/id/openid/'
+
+
+def query(url):
+    return parse_qs(urlparse(url).query)
 
 
 @pytest.fixture
-@mock.patch('openid_wargaming.authentication.create_return_to')
-def auth(mock_requests):
-    mock_requests.return_value = 'http://somewhere'
+def auth():
     return Authentication()
 
 
-@mock.patch('openid_wargaming.authentication.create_return_to')
-def test_authentication_object(mock_requests, auth):
-    mock_requests.return_value = 'http://somewhere'
+def test_authentication_object(auth):
     assert auth
     assert auth.mode == 'checkid_setup'
     assert auth.ns == 'http://specs.openid.net/auth/2.0'
@@ -27,6 +32,22 @@ def test_authentication_object(mock_requests, auth):
     assert auth.return_to
 
 
+@mock.patch('openid_wargaming.utils.get')
+def test_authentication_without_network(mock_requests):
+    auth = Authentication(return_to_base='https://example.com/callback',
+                          request_id='ID1')
+    assert auth.return_to == 'https://example.com/callback?request_id=ID1'
+    assert not mock_requests.called
+
+
+def test_authentication_signed_return_to():
+    from openid_wargaming.utils import sign_state
+    auth = Authentication(return_to_base='https://example.com/callback',
+                          request_id='ID1', secret='s3cr3t')
+    assert auth.return_to == 'https://example.com/callback?request_id=ID1' \
+                             '&state=' + sign_state('s3cr3t', 'ID1')
+
+
 @mock.patch('openid_wargaming.authentication.get')
 def test_authenticate(mock_requests, auth):
     from urllib.parse import urlparse
@@ -42,6 +63,15 @@ def test_authenticate(mock_requests, auth):
     assert True if [parsed.scheme, parsed.netloc, parsed.path] else False
 
 
+@mock.patch('openid_wargaming.authentication.get')
+def test_authenticate_offline(mock_requests, auth):
+    endpoint = 'https://eu.wargaming.net/id/openid/'
+    location = auth.authenticate(endpoint, offline=True)
+
+    assert location == auth.destination(endpoint)
+    assert not mock_requests.called
+
+
 def test_fields_present_in_payload(auth):
     assert 'openid.mode' in auth.payload
     assert 'openid.ns' in auth.payload
@@ -75,3 +105,45 @@ def test_evidence_is_good(auth):
     from datetime import datetime
     assert isinstance(auth.evidence['timestamp'], datetime)
     assert 'request_id' in auth.evidence
+
+
+def test_request_id_is_random_hex(auth):
+    assert len(auth.request_id) == 32
+    int(auth.request_id, 16)
+    assert Authentication().request_id != auth.request_id
+
+
+@pytest.mark.parametrize('request_id', ['ID1', 'id with spaces&=?'])
+@pytest.mark.parametrize('return_to_base', ['https://example.com/callback',
+                                            'https://example.com/?a=1'])
+@pytest.mark.parametrize('secret', [None, 'secret'])
+def test_template_same_destination(request_id, return_to_base, secret):
+    auth = Authentication(request_id=request_id,
+                          return_to_base=return_to_base, secret=secret)
+    template = AuthenticationTemplate(ENDPOINT, return_to_base,
+                                      secret=secret)
+
+    url = template.destination(request_id)
+    assert url.startswith(ENDPOINT + '?')
+    assert query(url) == query(auth.destination(ENDPOINT))
+
+
+def test_template_start():
+    template = AuthenticationTemplate(ENDPOINT, 'https://example.com/cb')
+    request_id, url = template.start()
+    other_id, _ = template.start()
+
+    assert len(request_id) == 32 and request_id != other_id
+    return_to = query(url)['openid.return_to'][0]
+    assert return_to == 'https://example.com/cb?request_id=' + request_id
+
+
+def test_template_association_handle():
+    associations = mock.Mock()
+    associations.handle.return_value = '{HMAC-SHA256}{1}{a+b=}'
+    template = AuthenticationTemplate(ENDPOINT, associations=associations)
+
+    _, url = template.start()
+
+    associations.handle.assert_called_once_with(ENDPOINT)
+    assert query(url)['openid.assoc_handle'] == ['{HMAC-SHA256}{1}{a+b=}']
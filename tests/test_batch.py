@@ -0,0 +1,88 @@
+from openid_wargaming.batch import verify_many
+from openid_wargaming.exceptions import OpenIDFailReturnURLVerification
+from openid_wargaming.exceptions import OpenIDVerificationFailed
+from openid_wargaming.nonce import MemoryNonceStore
+
+
+RETURN_TO = 'https://somewhere.com/?request_id=ID1'
+
+
+def test_verify_many(op):
+    urls = [op.assertion(RETURN_TO, account_id=account_id)
+            for account_id in range(50)]
+    results = dict(verify_many(urls, concurrency=4, chunk_size=8,
+                               store=MemoryNonceStore()))
+
+    assert set(results) == set(urls)
+    assert all(isinstance(result, dict) for result in results.values())
+    assert op.calls['check_authentication'] == 50
+
+
+def test_verify_many_rejects_locally_before_the_op(op):
+    valid = op.assertion(RETURN_TO)
+    forged = op.assertion(RETURN_TO).replace('JohnDoe', 'Mallory')
+    wrong_return_to = op.assertion(RETURN_TO).replace('request_id=ID1',
+                                                      'request_id=ID2', 1)
+    urls = [valid, forged, wrong_return_to, valid]
+
+    results = list(verify_many(urls, store=MemoryNonceStore()))
+    errors = [result for _, result in results
+              if isinstance(result, Exception)]
+    failed = sorted(error.validator for error in errors
+                    if isinstance(error, OpenIDVerificationFailed))
+
+    assert len(results) == 4
+    assert len(errors) == 3
+    assert failed == ['check_nonce', 'verify_signatures']
+    assert any(isinstance(error, OpenIDFailReturnURLVerification)
+               for error in errors)
+    # replayed and wrong return_to assertions never reach the OP
+    assert op.calls['check_authentication'] == 2
+
+
+def test_verify_many_nonces_in_bulk(op):
+    class Store(MemoryNonceStore):
+        calls = {'seen': 0, 'add': 0, 'seen_many': 0, 'add_many': 0}
+
+        def seen(self, *args):
+            self.calls['seen'] += 1
+            return super().seen(*args)
+
+        def add(self, *args):
+            self.calls['add'] += 1
+            return super().add(*args)
+
+        def seen_many(self, items):
+            self.calls['seen_many'] += 1
+            return super().seen_many(items)
+
+        def add_many(self, items):
+            self.calls['add_many'] += 1
+            return super().add_many(items)
+
+    store = Store()
+    urls = [op.assertion(RETURN_TO, account_id=account_id)
+            for account_id in range(8)]
+
+    results = list(verify_many(urls, concurrency=8, chunk_size=8,
+                               store=store))
+    replayed = list(verify_many(urls[:1], store=store))
+
+    assert all(isinstance(result, dict) for _, result in results)
+    assert replayed[0][1].validator == 'check_nonce'
+    assert store.calls['seen'] == store.calls['add'] == 0
+    assert store.calls['seen_many'] == 2
+    assert 1 <= store.calls['add_many'] <= 8
+    assert len(store) == 8
+
+
+def test_verify_many_is_lazy(op):
+    def urls():
+        for account_id in range(20):
+            yield op.assertion(RETURN_TO, account_id=account_id)
+
+    results = verify_many(urls(), concurrency=2, chunk_size=4)
+    url, identities = next(results)
+
+    assert 'claimed_id' in identities
+    results.close()
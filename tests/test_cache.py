@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from openid_wargaming.asynchronous import AsyncVerification
+from openid_wargaming.cache import ResultCache
+from openid_wargaming.exceptions import OpenIDVerificationFailed
+from openid_wargaming.identity import WargamingIdentity
+from openid_wargaming.nonce import MemoryNonceStore
+from openid_wargaming.verification import Verification
+
+
+RETURN_TO = 'https://somewhere.com/?request_id=ID1'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_result_cache_hit_and_conflict():
+    cache = ResultCache()
+    cache.set('key', 'request', 'result')
+
+    assert cache.get('key', 'request') == 'result'
+    assert cache.get('key', 'other request') is None
+    assert cache.get('other key', 'request') is None
+    assert cache.stats == {'hits': 1, 'misses': 1, 'conflicts': 1,
+                           'evictions': 0, 'size': 1}
+
+
+def test_result_cache_ttl():
+    clock = Clock()
+    cache = ResultCache(ttl=5, clock=clock)
+    cache.set('key', 'request', 'result')
+
+    clock.now += 5
+    assert cache.get('key', 'request') is None
+    assert len(cache) == 0
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = ResultCache(maxsize=2)
+    cache.set('a', 'request', 1)
+    cache.set('b', 'request', 2)
+    cache.get('a', 'request')
+    cache.set('c', 'request', 3)
+
+    assert cache.get('b', 'request') is None
+    assert cache.get('a', 'request') == 1
+    assert cache.stats['evictions'] == 1
+
+
+@pytest.mark.usefixtures('trusted_op')
+def test_duplicate_answered_from_cache(op):
+    store, cache = MemoryNonceStore(), ResultCache()
+    url = op.assertion(RETURN_TO)
+    first = Verification(url, store=store, cache=cache)
+    identities = first.verify()
+
+    duplicate = Verification(url, store=store, cache=cache)
+
+    assert duplicate.verify() == identities
+    assert duplicate.identity == WargamingIdentity(1000000, 'JohnDoe', 'eu')
+    assert op.calls['check_authentication'] == 1
+    assert cache.stats['hits'] == 1
+
+
+def test_duplicate_without_cache_rejected(op):
+    store = MemoryNonceStore()
+    url = op.assertion(RETURN_TO)
+    Verification(url, store=store).verify()
+
+    with pytest.raises(OpenIDVerificationFailed) as error:
+        Verification(url, store=store).verify()
+
+    assert error.value.validator == 'check_nonce'
+
+
+def test_replay_with_changed_fields_rejected(op):
+    store, cache = MemoryNonceStore(), ResultCache()
+    url = op.assertion(RETURN_TO)
+    Verification(url, store=store, cache=cache).verify()
+
+    for replay in (url.replace('JohnDoe', 'Mallory'), url + '&extra=1'):
+        with pytest.raises(OpenIDVerificationFailed) as error:
+            Verification(replay, store=store, cache=cache).verify()
+        assert error.value.validator == 'check_nonce'
+
+    assert cache.stats['conflicts'] == 2
+    assert op.calls['check_authentication'] == 1
+
+
+def test_expired_duplicate_rejected(op):
+    clock = Clock()
+    store, cache = MemoryNonceStore(), ResultCache(ttl=5, clock=clock)
+    url = op.assertion(RETURN_TO)
+    Verification(url, store=store, cache=cache).verify()
+
+    clock.now += 10
+    with pytest.raises(OpenIDVerificationFailed):
+        Verification(url, store=store, cache=cache).verify()
+
+
+def test_failed_assertion_not_cached(op):
+    cache = ResultCache()
+    url = op.assertion(RETURN_TO).replace('JohnDoe', 'Mallory')
+
+    for _ in range(2):
+        with pytest.raises(OpenIDVerificationFailed):
+            Verification(url, cache=cache).verify()
+
+    assert len(cache) == 0
+    assert op.calls['check_authentication'] == 2
+
+
+def test_async_duplicate_answered_from_cache(op):
+    store, cache = MemoryNonceStore(), ResultCache()
+    url = op.assertion(RETURN_TO)
+
+    async def twice():
+        first = await AsyncVerification(url, store=store, cache=cache).verify()
+        second = await AsyncVerification(url, store=store,
+                                         cache=cache).verify()
+        return first, second
+
+    first, second = asyncio.run(twice())
+
+    assert first == second
+    assert op.calls['check_authentication'] == 1
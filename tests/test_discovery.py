@@ -0,0 +1,156 @@
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from openid_wargaming.discovery import Discovery, DiscoveryCache
+from openid_wargaming.discovery import parse_html, parse_xrds
+from openid_wargaming.verification import Verification
+
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+CLAIMED_ID = 'https://eu.wargaming.net/id/1000000-JohnDoe/'
+ENDPOINT = 'https://eu.wargaming.net/id/openid/'
+
+
+def response(content, content_type='application/xrds+xml', headers=None,
+             status_code=200):
+    headers = dict(headers or {}, **{'Content-Type': content_type})
+    return mock.Mock(content=content, text=content.decode(),
+                     headers=headers, status_code=status_code)
+
+
+@pytest.fixture
+def transport():
+    transport = mock.Mock()
+    transport.get.return_value = response(
+        (FIXTURES / 'claimed_id.xrds').read_bytes())
+    return transport
+
+
+@pytest.fixture
+def discovery(transport):
+    return Discovery(transport)
+
+
+def assertion(**fields):
+    values = {
+        'openid.mode': 'id_res',
+        'openid.op_endpoint': ENDPOINT,
+        'openid.claimed_id': CLAIMED_ID,
+        'openid.identity': CLAIMED_ID,
+    }
+    values.update(fields)
+    return values
+
+
+def test_parse_xrds_claimed_identifier():
+    services = parse_xrds((FIXTURES / 'claimed_id.xrds').read_bytes())
+
+    assert [service.op_endpoint for service in services] == [
+        'https://mirror.wargaming.net/id/openid/', ENDPOINT]
+    assert services[0].local_id == 'https://mirror.wargaming.net/id/1000000/'
+    assert services[1].local_id is None
+    assert not any(service.op_identifier for service in services)
+
+
+def test_parse_xrds_op_identifier():
+    services = parse_xrds((FIXTURES / 'op_identifier.xrds').read_bytes())
+
+    assert len(services) == 1
+    assert services[0].op_identifier
+    assert services[0].op_endpoint == ENDPOINT
+
+
+def test_parse_html():
+    services = parse_html('<html><head>'
+                          '<link rel="openid2.provider" href="%s">'
+                          '</head></html>' % ENDPOINT)
+    assert services[0].op_endpoint == ENDPOINT
+    assert parse_html('<html></html>') == []
+
+
+def test_discovery_follows_xrds_location(transport, discovery):
+    transport.get.side_effect = [
+        response(b'<html></html>', 'text/html',
+                 {'X-XRDS-Location': 'https://eu.wargaming.net/xrds'}),
+        response((FIXTURES / 'claimed_id.xrds').read_bytes()),
+    ]
+
+    assert len(discovery.discover(CLAIMED_ID)) == 2
+    assert transport.get.call_args[0][0] == 'https://eu.wargaming.net/xrds'
+
+
+def test_discovery_is_cached(transport, discovery):
+    assert discovery.verify(assertion())
+    assert discovery.verify(assertion())
+    assert discovery.verify(assertion(**{
+        'openid.claimed_id': CLAIMED_ID + '#fragment'}))
+
+    assert transport.get.call_count == 1
+    assert discovery.cache.stats == {'hits': 2, 'misses': 1, 'evictions': 0,
+                                     'size': 1}
+
+
+def test_failed_discovery_is_not_cached(transport, discovery):
+    good = transport.get.return_value
+    transport.get.return_value = response(b'unavailable', 'text/plain',
+                                          status_code=503)
+    assert not discovery.verify(assertion())
+
+    transport.get.return_value = response(b'<XRDS', status_code=200)
+    assert not discovery.verify(assertion())  # invalid document
+
+    transport.get.return_value = good
+    assert discovery.verify(assertion())
+    assert transport.get.call_count == 3
+    assert discovery.cache.stats['size'] == 1
+
+
+def test_discovery_rejects_unauthorized_op_endpoint(discovery):
+    assert not discovery.verify(assertion(**{
+        'openid.op_endpoint': 'https://evil.example.com/'}))
+
+
+def test_discovery_checks_local_identifier(discovery):
+    mirror = 'https://mirror.wargaming.net/id/openid/'
+    assert discovery.verify(assertion(**{
+        'openid.op_endpoint': mirror,
+        'openid.identity': 'https://mirror.wargaming.net/id/1000000/'}))
+    assert not discovery.verify(assertion(**{'openid.op_endpoint': mirror}))
+
+
+def test_discovery_op_identifier_is_not_a_claimed_identifier(transport,
+                                                              discovery):
+    transport.get.return_value = response(
+        (FIXTURES / 'op_identifier.xrds').read_bytes())
+    assert not discovery.verify(assertion())
+
+
+def test_discovery_without_claimed_identifier(discovery, transport):
+    assert discovery.verify({'openid.mode': 'id_res'})
+    assert not transport.get.called
+
+
+def test_cache_lru_and_ttl():
+    clock = mock.Mock(return_value=0)
+    cache = DiscoveryCache(maxsize=2, ttl=10, clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    clock.return_value = 10
+    assert cache.get('a') is None
+    assert cache.stats == {'hits': 2, 'misses': 2, 'evictions': 1, 'size': 1}
+
+
+def test_verification_uses_discovery(discovery):
+    url = 'https://somewhere.com/?openid.mode=id_res&' \
+          'openid.op_endpoint=https://evil.example.com/&' \
+          'openid.claimed_id=%s&openid.identity=%s' % (CLAIMED_ID, CLAIMED_ID)
+
+    assert not Verification(url, discovery=discovery) \
+        .verify_discovered_information()
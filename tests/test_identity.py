@@ -0,0 +1,41 @@
+import pytest
+
+from openid_wargaming.identity import parse_identity, WargamingIdentity
+
+
+@pytest.mark.parametrize('realm', ['eu', 'na', 'asia', 'ru'])
+def test_parse_identity_realms(realm):
+    url = 'https://%s.wargaming.net/id/507197901-Some_Player/' % realm
+    identity = parse_identity(url)
+
+    assert identity.account_id == 507197901
+    assert identity.nickname == 'Some_Player'
+    assert identity.realm == realm
+    assert identity.url == url
+
+
+@pytest.mark.parametrize('url', [
+    'https://xx.wargaming.net/id/1000000-JohnDoe/',
+    'http://eu.wargaming.net/id/1000000-JohnDoe/',
+    'https://eu.wargaming.net/id/JohnDoe/',
+    'https://eu.wargaming.net/id/1000000-JohnDoe/extra',
+    'https://evil.com/?https://eu.wargaming.net/id/1000000-JohnDoe/',
+    'JohnDoe',
+])
+def test_parse_identity_rejects(url):
+    assert parse_identity(url) is None
+
+
+def test_identity_is_slotted():
+    identity = WargamingIdentity(1, 'JohnDoe', 'eu')
+    with pytest.raises(AttributeError):
+        identity.other = True
+
+
+def test_identity_equality():
+    assert WargamingIdentity(1, 'JohnDoe', 'eu') == \
+        WargamingIdentity(1, 'JohnDoe', 'eu')
+    assert WargamingIdentity(1, 'JohnDoe', 'eu') != \
+        WargamingIdentity(1, 'JohnDoe', 'na')
+    assert len({WargamingIdentity(1, 'JohnDoe', 'eu'),
+                WargamingIdentity(1, 'JohnDoe', 'eu')}) == 1
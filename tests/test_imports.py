@@ -0,0 +1,63 @@
+import subprocess
+import sys
+
+import pytest
+
+
+NETWORK_MODULES = {'requests', 'urllib3', 'chardet', 'charset_normalizer',
+                   'idna', 'certifi'}
+
+
+def imported(code):
+    """Top-level packages imported by code (python -X importtime)
+
+    Modules imported by the interpreter start up (site) are included.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            stderr=subprocess.PIPE, universal_newlines=True,
+                            check=True)
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            name = line.rsplit('|', 1)[1].strip()
+            modules.add(name.split('.')[0])
+    return modules
+
+
+STARTUP = imported('pass')
+
+
+@pytest.mark.parametrize('module', ['verification', 'authentication',
+                                    'asynchronous', 'batch', 'router',
+                                    'utils', 'identity', 'tokens'])
+def test_no_network_modules_at_import(module):
+    modules = imported('import openid_wargaming.%s' % module)
+    assert 'openid_wargaming' in modules
+    assert not (modules - STARTUP) & NETWORK_MODULES
+
+
+def test_rejected_assertion_without_network_modules():
+    modules = imported(
+        'from openid_wargaming.verification import Verification\n'
+        'try:\n'
+        '    Verification("https://example.com/?openid.mode=id_res").verify()\n'
+        'except Exception:\n'
+        '    pass\n')
+    assert not (modules - STARTUP) & NETWORK_MODULES
+
+
+def test_network_modules_on_first_transport():
+    modules = imported('from openid_wargaming.transport import Transport\n'
+                       'Transport().close()')
+    assert {'requests', 'urllib3'} <= modules
+
+
+def test_core_without_asyncio():
+    modules = imported('import openid_wargaming.verification')
+    assert not (modules - STARTUP) & {'asyncio', 'inspect'}
+
+
+def test_core_without_posix_modules():
+    # verification imports nonce: it must import on Windows too
+    modules = imported('import openid_wargaming.verification')
+    assert not (modules - STARTUP) & {'fcntl', 'mmap'}
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from openid_wargaming.asynchronous import AsyncVerification
+from openid_wargaming.authentication import Authentication
+from openid_wargaming.exceptions import BadOpenIDReturnTo
+from openid_wargaming.exceptions import OpenIDVerificationFailed
+from openid_wargaming.instrumentation import CallbackObserver, Observer
+from openid_wargaming.instrumentation import PrometheusObserver
+from openid_wargaming.transport import Transport
+from openid_wargaming.verification import Verification
+
+
+RETURN_TO = 'https://somewhere.com/?request_id=ID1'
+
+
+@pytest.fixture
+def events():
+    return []
+
+
+@pytest.fixture
+def observer(events):
+    return CallbackObserver(lambda *event: events.append(event))
+
+
+def test_observer_ignores_events():
+    assert Observer().record('http', 'checkid_setup', 0.1, 'ok') is None
+
+
+def test_verification_events(op, events, observer):
+    Verification(op.assertion(RETURN_TO), observer=observer).verify()
+
+    assert [(kind, name, outcome) for kind, name, _, outcome, _ in events] == [
+        ('validator', 'is_positive_assertion', 'ok'),
+        ('validator', 'verify_return_url', 'ok'),
+        ('validator', 'verify_request_token', 'ok'),
+        ('validator', 'verify_signed_fields', 'ok'),
+        ('validator', 'check_nonce_timestamp', 'ok'),
+        ('validator', 'check_nonce', 'ok'),
+        ('validator', 'verify_discovered_information', 'ok'),
+        ('http', 'check_authentication', 'ok'),
+        ('validator', 'verify_signatures', 'ok'),
+        ('validator', 'commit_nonce', 'ok'),
+    ]
+    assert all(elapsed >= 0 for _, _, elapsed, _, _ in events)
+
+
+def test_verification_failure_reason(events, observer):
+    verify = Verification('https://somewhere.com/?openid.mode=cancel',
+                          observer=observer)
+
+    with pytest.raises(OpenIDVerificationFailed):
+        verify.verify()
+    assert events[-1][3:] == ('fail', 'cancel')
+
+
+def test_verification_error_reason(events, observer):
+    verify = Verification('https://somewhere.com/?nothing', observer=observer)
+
+    with pytest.raises(BadOpenIDReturnTo):
+        verify.verify()
+    assert events[-1][3:] == ('error', 'BadOpenIDReturnTo')
+
+
+def test_async_verification_events(op, events, observer):
+    verify = AsyncVerification(op.assertion(RETURN_TO), observer=observer)
+    asyncio.run(verify.verify())
+
+    assert ('http', 'check_authentication') in [event[:2] for event in events]
+    assert [event[3] for event in events] == ['ok'] * 10
+
+
+def test_authentication_events(op, events, observer):
+    transport = Transport()
+    auth = Authentication(return_to=RETURN_TO, transport=transport,
+                          observer=observer)
+    auth.authenticate(op.endpoint)
+    transport.close()
+
+    assert [event[:2] + event[3:] for event in events] == [
+        ('http', 'checkid_setup', 'ok', None)]
+
+
+def test_authentication_http_error(op, events, observer):
+    auth = Authentication(return_to=RETURN_TO, mode='checkid_immediate',
+                          observer=observer)
+
+    with pytest.raises(KeyError):
+        auth.authenticate(op.endpoint)
+    assert events[0][3:] == ('fail', 'HTTP 404')
+
+
+def test_prometheus_observer():
+    observer = PrometheusObserver(buckets=(0.01, 0.1))
+    observer.record('http', 'check_authentication', 0.005, 'ok')
+    observer.record('http', 'check_authentication', 0.05, 'ok')
+    observer.record('http', 'check_authentication', 1, 'ok')
+    observer.record('validator', 'check_nonce', 0.001, 'fail')
+
+    metrics = observer.render()
+    labels = 'kind="http",name="check_authentication",outcome="ok"'
+
+    assert '# TYPE openid_wargaming_duration_seconds histogram' in metrics
+    assert 'openid_wargaming_duration_seconds_bucket{%s,le="0.01"} 1' \
+        % labels in metrics
+    assert 'openid_wargaming_duration_seconds_bucket{%s,le="0.1"} 2' \
+        % labels in metrics
+    assert 'openid_wargaming_duration_seconds_bucket{%s,le="+Inf"} 3' \
+        % labels in metrics
+    assert 'openid_wargaming_duration_seconds_count{%s} 3' % labels \
+        in metrics
+    assert 'outcome="fail"} 1' in metrics
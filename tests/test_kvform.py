@@ -0,0 +1,43 @@
+import pytest
+
+from openid_wargaming.kvform import decode, encode, iterdecode
+
+
+def test_decode_keeps_colons_in_values():
+    message = 'ns:http://specs.openid.net/auth/2.0\nis_valid:true\n'
+    assert decode(message) == {'ns': 'http://specs.openid.net/auth/2.0',
+                               'is_valid': True}
+
+
+def test_decode_bytes():
+    message = b'assoc_handle:{HMAC-SHA256}{1}{2}\nexpires_in:3600\n'
+    assert decode(message) == {'assoc_handle': '{HMAC-SHA256}{1}{2}',
+                               'expires_in': '3600'}
+
+
+def test_decode_without_conversion():
+    assert decode('is_valid:false\n', convert=False) == {'is_valid': 'false'}
+
+
+@pytest.mark.parametrize('message', ['', '\n', 'no colon here\n'])
+def test_decode_ignores_lines_without_colon(message):
+    assert decode(message) == {}
+
+
+def test_decode_strips_whitespace():
+    assert decode('\n    is_valid: true\n    field1: value1\n    ') == {
+        'is_valid': True, 'field1': 'value1'}
+
+
+def test_iterdecode_streams_lines():
+    lines = iter([b'ns:http://specs.openid.net/auth/2.0\n',
+                  b'is_valid:false\n'])
+    assert next(iterdecode(lines)) == ('ns',
+                                       'http://specs.openid.net/auth/2.0')
+    assert list(iterdecode(lines)) == [('is_valid', False)]
+
+
+def test_encode_decode_round_trip():
+    fields = {'mode': 'error', 'error': 'some: message'}
+    assert encode(fields) == 'mode:error\nerror:some: message\n'
+    assert decode(encode(fields)) == fields
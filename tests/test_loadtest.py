@@ -0,0 +1,54 @@
+from openid_wargaming.loadtest import LoadResult, main, run_async, run_sync
+
+
+def test_load_result_percentiles():
+    result = LoadResult('sync', [index / 100 for index in range(100, 0, -1)],
+                        errors=2, elapsed=2)
+
+    assert result.percentile(0.50) == 0.5
+    assert result.percentile(0.95) == 0.95
+    assert result.percentile(0.99) == 0.99
+    assert result.summary() == {'logins': 100, 'errors': 2,
+                                'throughput': 50.0, 'p50': 0.5,
+                                'p95': 0.95, 'p99': 0.99}
+    assert 'p99  990.00 ms' in str(result)
+
+
+def test_load_result_without_logins():
+    result = LoadResult('async', [], errors=3, elapsed=1)
+    assert result.percentile(0.5) is None
+    assert 'no successful login' in str(result)
+
+
+def test_run_sync(op):
+    result = run_sync(op, logins=20, concurrency=4)
+
+    assert result.errors == 0
+    assert len(result.latencies) == 20
+    assert op.calls['checkid_setup'] == 20
+    assert op.calls['check_authentication'] == 20
+
+
+def test_run_sync_with_associations(op):
+    result = run_sync(op, logins=20, concurrency=4, associations=True,
+                      offline=True)
+
+    assert result.errors == 0
+    assert op.calls['associate'] == 1
+    assert op.calls['check_authentication'] == 0
+
+
+def test_run_async(op):
+    result = run_async(op, logins=20, concurrency=4)
+
+    assert result.errors == 0
+    assert len(result.latencies) == 20
+    assert op.calls['check_authentication'] == 20
+
+
+def test_main(capsys):
+    results = main(['--logins', '10', '--concurrency', '2'])
+
+    assert [result.name for result in results] == ['sync', 'async']
+    assert all(result.errors == 0 for result in results)
+    assert 'logins/s' in capsys.readouterr().out
@@ -0,0 +1,213 @@
+import asyncio
+import threading
+from urllib.parse import urlsplit, unquote
+from wsgiref.util import setup_testing_defaults
+
+import pytest
+
+from openid_wargaming.asynchronous import AsyncVerification
+from openid_wargaming.exceptions import OpenIDFailReturnURLVerification
+from openid_wargaming.exceptions import OpenIDUnknownEndpoint
+from openid_wargaming.exceptions import OpenIDVerificationFailed
+from openid_wargaming.identity import WargamingIdentity
+from openid_wargaming.middleware import AsyncOpenIDMiddleware
+from openid_wargaming.middleware import OpenIDMiddleware
+from openid_wargaming.middleware import asgi_parts, wsgi_parts
+from openid_wargaming.nonce import MemoryNonceStore
+from openid_wargaming.verification import Verification
+
+
+RETURN_TO = 'https://somewhere.com:8443/openid/callback?request_id=ID1'
+PLAYER = WargamingIdentity(1000000, 'JohnDoe', 'eu')
+
+
+def echo(environ, start_response):
+    """WSGI application answering the identity it finds"""
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [repr(environ.get('openid_wargaming.identity')).encode()]
+
+
+def wsgi_get(app, url):
+    """In-process WSGI client: environ of url, as a server builds it"""
+    parts = urlsplit(url)
+    environ = {'wsgi.url_scheme': parts.scheme, 'HTTP_HOST': parts.netloc,
+               'PATH_INFO': unquote(parts.path).encode().decode('latin-1'),
+               'QUERY_STRING': parts.query}
+    setup_testing_defaults(environ)
+    statuses = []
+    body = b''.join(app(environ,
+                        lambda status, headers: statuses.append(status)))
+    return environ, statuses[0], body
+
+
+def asgi_get(app, url):
+    """In-process ASGI client: scope of url, as a server builds it"""
+    parts = urlsplit(url)
+    scopes = []
+
+    async def application(scope, receive, send):
+        scopes.append(scope)
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'scheme': parts.scheme,
+             'path': unquote(parts.path), 'raw_path': parts.path.encode(),
+             'query_string': parts.query.encode(),
+             'headers': [(b'host', parts.netloc.encode())],
+             'server': (parts.hostname, parts.port)}
+    asyncio.run(app(application)(scope, receive, send))
+    return scopes[0], messages
+
+
+def test_wsgi_parts_without_host_header():
+    environ = {'wsgi.url_scheme': 'https', 'SERVER_NAME': 'somewhere.com',
+               'SERVER_PORT': '8443', 'SCRIPT_NAME': '/openid',
+               'PATH_INFO': '/caf\xc3\xa9', 'QUERY_STRING': 'a=1'}
+
+    assert wsgi_parts(environ) == ('https', 'somewhere.com:8443',
+                                   '/openid/caf%C3%A9', 'a=1')
+
+
+def test_asgi_parts_default_port():
+    scope = {'type': 'http', 'scheme': 'https', 'path': '/callback',
+             'query_string': b'a=1', 'headers': [],
+             'server': ('somewhere.com', 443)}
+
+    assert asgi_parts(scope) == ('https', 'somewhere.com', '/callback',
+                                 'a=1')
+
+
+@pytest.mark.usefixtures('trusted_op')
+def test_wsgi_callback_identity(op):
+    app = OpenIDMiddleware(echo, '/openid/callback', [op.endpoint])
+
+    environ, status, body = wsgi_get(app, op.assertion(RETURN_TO))
+
+    assert status == '200 OK'
+    assert environ['openid_wargaming.identity'] == PLAYER
+    assert environ['openid_wargaming.error'] is None
+    assert body == repr(PLAYER).encode()
+    assert op.calls['check_authentication'] == 1
+
+
+def test_wsgi_replayed_callback_rejected(op):
+    app = OpenIDMiddleware(echo, '/openid/callback', [op.endpoint],
+                           store=MemoryNonceStore())
+    url = op.assertion(RETURN_TO)
+    wsgi_get(app, url)
+
+    environ, _, _ = wsgi_get(app, url)
+
+    assert environ['openid_wargaming.identity'] is None
+    error = environ['openid_wargaming.error']
+    assert isinstance(error, OpenIDVerificationFailed)
+    assert error.validator == 'check_nonce'
+    assert op.calls['check_authentication'] == 1
+
+
+def test_wsgi_wrong_host_rejected_locally(op):
+    app = OpenIDMiddleware(echo, '/openid/callback', [op.endpoint])
+    url = op.assertion(RETURN_TO).replace('somewhere.com:8443',
+                                          'elsewhere.com:8443', 1)
+
+    environ, _, _ = wsgi_get(app, url)
+
+    assert isinstance(environ['openid_wargaming.error'],
+                      OpenIDFailReturnURLVerification)
+    assert op.calls['check_authentication'] == 0
+
+
+def test_wsgi_other_paths_untouched(op):
+    app = OpenIDMiddleware(echo, '/openid/callback', [op.endpoint])
+
+    environ, _, body = wsgi_get(app, 'https://somewhere.com:8443/?x=1')
+
+    assert 'openid_wargaming.identity' not in environ
+    assert body == b'None'
+
+
+@pytest.mark.usefixtures('trusted_op')
+def test_asgi_callback_identity(op):
+    scope, messages = asgi_get(
+        lambda app: AsyncOpenIDMiddleware(app, '/openid/callback',
+                                          [op.endpoint]),
+        op.assertion(RETURN_TO))
+
+    assert scope['openid_wargaming.identity'] == PLAYER
+    assert scope['openid_wargaming.error'] is None
+    assert messages[0]['status'] == 200
+    assert op.calls['check_authentication'] == 1
+
+
+def test_asgi_forged_callback_rejected(op):
+    url = op.assertion(RETURN_TO).replace('JohnDoe', 'Mallory')
+
+    scope, _ = asgi_get(
+        lambda app: AsyncOpenIDMiddleware(app, '/openid/callback',
+                                          [op.endpoint]), url)
+
+    assert scope['openid_wargaming.identity'] is None
+    assert scope['openid_wargaming.error'].validator == 'verify_signatures'
+
+
+def test_asgi_other_paths_untouched(op):
+    scope, _ = asgi_get(
+        lambda app: AsyncOpenIDMiddleware(app, '/openid/callback',
+                                          [op.endpoint]),
+        'https://somewhere.com:8443/')
+
+    assert 'openid_wargaming.identity' not in scope
+    assert op.calls['check_authentication'] == 0
+
+
+def test_verification_class_matches_middleware():
+    with pytest.raises(TypeError):
+        OpenIDMiddleware(echo, '/openid/callback',
+                         verification=AsyncVerification)
+    with pytest.raises(TypeError):
+        AsyncOpenIDMiddleware(echo, '/openid/callback',
+                              verification=Verification)
+
+
+@pytest.mark.usefixtures('trusted_op')
+def test_asgi_discovery_off_the_event_loop(op):
+    threads = []
+
+    class Discovery:
+        def verify(self, fields):
+            threads.append(threading.current_thread())
+            return True
+
+    scope, _ = asgi_get(
+        lambda app: AsyncOpenIDMiddleware(app, '/openid/callback',
+                                          [op.endpoint],
+                                          discovery=Discovery()),
+        op.assertion(RETURN_TO))
+
+    assert scope['openid_wargaming.identity'] == PLAYER
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_unknown_op_rejected_before_verification(op):
+    app = OpenIDMiddleware(echo, '/openid/callback')
+    url = op.assertion(RETURN_TO)
+
+    environ, _, _ = wsgi_get(app, url)
+    scope, _ = asgi_get(
+        lambda app: AsyncOpenIDMiddleware(app, '/openid/callback'), url)
+
+    for error in (environ['openid_wargaming.error'],
+                  scope['openid_wargaming.error']):
+        assert isinstance(error, OpenIDUnknownEndpoint)
+        assert error.endpoint == op.endpoint
+    assert environ['openid_wargaming.identity'] is None
+    assert op.calls['check_authentication'] == 0
@@ -0,0 +1,244 @@
+import multiprocessing
+import threading
+import time
+from calendar import timegm
+
+import pytest
+
+from openid_wargaming.nonce import MemoryNonceStore, MmapNonceStore
+from openid_wargaming.nonce import NonceStore
+from openid_wargaming.nonce import nonce_timestamp
+from openid_wargaming.verification import Verification
+
+
+ENDPOINT = 'https://eu.wargaming.net/id/openid/'
+NOW = timegm((2017, 8, 10, 12, 0, 0))
+
+
+def nonce(offset=0, unique='abc'):
+    year, month, day, hour, minute, second = time.gmtime(NOW + offset)[:6]
+    return '%04d-%02d-%02dT%02d:%02d:%02dZ%s' % (year, month, day, hour,
+                                                 minute, second, unique)
+
+
+@pytest.fixture
+def clock():
+    class Clock:
+        now = NOW
+
+        def __call__(self):
+            return self.now
+
+    return Clock()
+
+
+@pytest.fixture
+def store(clock):
+    return MemoryNonceStore(max_age=300, skew=60, clock=clock)
+
+
+def test_nonce_timestamp():
+    assert nonce_timestamp('2017-08-10T12:00:00Zabc') == NOW
+
+
+@pytest.mark.parametrize('value', ['', 'somevalue', '2017-08-10 12:00:00Z',
+                                   '2017-08-10T12:00:00+0000'])
+def test_nonce_timestamp_malformed(value):
+    with pytest.raises(ValueError):
+        nonce_timestamp(value)
+
+
+def test_interface_is_abstract():
+    with pytest.raises(NotImplementedError):
+        NonceStore().add(ENDPOINT, nonce())
+
+
+def test_store_rejects_replays(store):
+    assert store.add(ENDPOINT, nonce())
+    assert not store.add(ENDPOINT, nonce())
+    assert store.add(ENDPOINT, nonce(unique='other'))
+    assert store.add('https://na.wargaming.net/id/openid/', nonce())
+    assert len(store) == 3
+
+
+def test_store_add_many(store):
+    items = [(ENDPOINT, nonce()), (ENDPOINT, nonce(-301)),
+             (ENDPOINT, nonce()), (ENDPOINT, 'somevalue'),
+             (ENDPOINT, nonce(unique='other'))]
+
+    assert store.add_many(items) == [True, False, False, False, True]
+    assert NonceStore.add_many(store, [(ENDPOINT, nonce())]) == [False]
+
+
+def test_store_seen_many(store):
+    store.add(ENDPOINT, nonce())
+    items = [(ENDPOINT, nonce()), (ENDPOINT, nonce(unique='other')),
+             (ENDPOINT, 'somevalue')]
+
+    assert store.seen_many(items) == [True, False, False]
+    assert NonceStore.seen_many(store, items) == [True, False, False]
+
+
+def test_store_rejects_stale_future_and_malformed_nonces(store):
+    assert not store.add(ENDPOINT, nonce(-301))
+    assert not store.add(ENDPOINT, nonce(61))
+    assert not store.add(ENDPOINT, 'somevalue')
+    assert len(store) == 0
+
+
+def test_store_expires_old_buckets(store, clock):
+    assert store.add(ENDPOINT, nonce())
+    clock.now += 200
+    assert store.add(ENDPOINT, nonce(unique='other'))
+    assert len(store) == 2
+
+    clock.now += 200
+    assert store.add(ENDPOINT, nonce(400, unique='new'))
+    assert len(store) == 1
+
+    clock.now += 86400
+    assert store.add(ENDPOINT, nonce(86800))
+    assert len(store) == 1
+
+
+def test_store_check_and_insert_is_atomic(store):
+    results = []
+    barrier = threading.Barrier(16)
+
+    def add():
+        barrier.wait()
+        results.append(store.add(ENDPOINT, nonce()))
+
+    threads = [threading.Thread(target=add) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 1
+
+
+def test_verification_uses_store(store):
+    assertion_url = 'https://somewhere.com/?openid.mode=id_res&' \
+                    'openid.op_endpoint=%s&openid.response_nonce=%s' % (
+                        ENDPOINT, nonce())
+
+    first = Verification(assertion_url, store=store)
+    assert first.check_nonce_timestamp()
+    assert first.check_nonce()
+    assert first.commit_nonce()
+
+    replay = Verification(assertion_url, store=store)
+    assert not replay.check_nonce()
+    assert not replay.commit_nonce()
+
+
+def test_verification_uses_store_window(store, clock):
+    assertion_url = 'https://somewhere.com/?openid.response_nonce=%s' % (
+        nonce(-301))
+    assert not Verification(assertion_url, store=store).check_nonce_timestamp()
+
+    clock.now -= 1
+    assert Verification(assertion_url, store=store).check_nonce_timestamp()
+
+
+def test_memory_store_seen(store):
+    assert not store.seen(ENDPOINT, nonce())
+    store.add(ENDPOINT, nonce())
+    assert store.seen(ENDPOINT, nonce())
+    assert not store.seen(ENDPOINT, nonce(unique='other'))
+    assert not store.seen(ENDPOINT, 'malformed')
+
+
+@pytest.fixture
+def table(tmp_path, clock):
+    store = MmapNonceStore(str(tmp_path / 'nonces'), capacity=1024,
+                           clock=clock)
+    yield store
+    store.close()
+
+
+def test_mmap_store_rejects_replays(table):
+    assert table.add(ENDPOINT, nonce())
+    assert not table.add(ENDPOINT, nonce())
+    assert table.add(ENDPOINT, nonce(unique='other'))
+    assert not table.add(ENDPOINT, nonce(-301, unique='stale'))
+    assert not table.add(ENDPOINT, 'somevalue')
+    assert len(table) == 2
+
+
+def test_mmap_store_seen(table, clock):
+    assert not table.seen(ENDPOINT, nonce())
+    table.add(ENDPOINT, nonce())
+    assert table.seen(ENDPOINT, nonce())
+    assert not table.seen(ENDPOINT, nonce(unique='other'))
+
+    clock.now += 301
+    assert not table.seen(ENDPOINT, nonce())
+
+
+def test_mmap_store_is_shared_by_path(tmp_path, table, clock):
+    other = MmapNonceStore(str(tmp_path / 'nonces'), capacity=1024,
+                           clock=clock)
+    try:
+        assert table.add(ENDPOINT, nonce())
+        assert not other.add(ENDPOINT, nonce())
+    finally:
+        other.close()
+
+
+def test_mmap_store_layout_mismatch(tmp_path, table):
+    with pytest.raises(ValueError):
+        MmapNonceStore(str(tmp_path / 'nonces'), capacity=2048)
+
+
+def test_mmap_store_full_table_fails_closed_until_expiry(tmp_path, clock):
+    store = MmapNonceStore(str(tmp_path / 'small'), capacity=1, clock=clock)
+    try:
+        for index in range(MmapNonceStore.PROBE):
+            assert store.add(ENDPOINT, nonce(unique=str(index)))
+        assert not store.add(ENDPOINT, nonce(unique='full'))
+        assert store.overflows == 1
+
+        clock.now += 301
+        assert store.add(ENDPOINT, nonce(301, unique='full'))
+        assert len(store) == 1
+    finally:
+        store.close()
+
+
+def test_mmap_store_for_memory(tmp_path):
+    budget = 1 << 16
+    store = MmapNonceStore.for_memory(str(tmp_path / 'budget'), budget)
+    try:
+        used = MmapNonceStore.HEADER_SIZE + \
+            (store.capacity + MmapNonceStore.PROBE - 1) * \
+            MmapNonceStore.SLOT_SIZE
+        assert budget - MmapNonceStore.SLOT_SIZE < used <= budget
+    finally:
+        store.close()
+
+
+def _add_nonces(path, nonces, results):
+    store = MmapNonceStore(path, capacity=1024)
+    results.put(sum(store.add(ENDPOINT, value) for value in nonces))
+    store.close()
+
+
+def test_mmap_store_across_processes(tmp_path):
+    path = str(tmp_path / 'shared')
+    stamp = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    nonces = [stamp + str(index) for index in range(200)]
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [context.Process(target=_add_nonces,
+                               args=(path, nonces, results))
+               for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    accepted = sum(results.get(timeout=30) for _ in workers)
+    for worker in workers:
+        worker.join()
+
+    assert accepted == len(nonces)
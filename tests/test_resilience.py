@@ -0,0 +1,197 @@
+import time
+
+import pytest
+from requests import exceptions
+
+from openid_wargaming.exceptions import OpenIDCircuitOpen
+from openid_wargaming.resilience import (CircuitBreaker, LatencyTracker,
+                                         ResilientTransport)
+from openid_wargaming.testing import StandInOP
+from openid_wargaming.transport import Transport
+from openid_wargaming.verification import Verification
+
+
+RETURN_TO = 'https://somewhere.com/?request_id=ID1'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def transport():
+    transport = Transport(pool_maxsize=8)
+    yield transport
+    transport.close()
+
+
+def test_circuit_breaker_opens_after_failures():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30,
+                             clock=clock)
+    breaker.failure()
+    assert breaker.state == 'closed'
+    breaker.failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+
+def test_circuit_breaker_half_open_trial():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30,
+                             clock=clock)
+    breaker.failure()
+    clock.now = 30
+
+    assert breaker.state == 'half-open'
+    assert breaker.allow()
+    assert not breaker.allow()  # one trial at a time
+
+    breaker.failure()
+    assert breaker.state == 'open'
+
+    clock.now = 60
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == 'closed'
+    assert breaker.failures == 0
+
+
+def test_half_open_trial_ended_by_any_error():
+    class Response:
+        status_code = 200
+
+    class Flaky:
+        def __init__(self, errors):
+            self.errors = list(errors)
+
+        def post(self, url, **kwargs):
+            if self.errors:
+                raise self.errors.pop(0)
+            return Response()
+
+    resilient = ResilientTransport(
+        Flaky([exceptions.ConnectionError('down'),
+               exceptions.ChunkedEncodingError('truncated')]),
+        retries=0, failure_threshold=1, reset_timeout=0.05)
+    url = 'https://eu.wargaming.net/id/openid/'
+
+    with pytest.raises(exceptions.ConnectionError):
+        resilient.post(url, 'payload')
+    time.sleep(0.06)
+    with pytest.raises(exceptions.ChunkedEncodingError):
+        resilient.post(url, 'payload')  # half-open trial
+    assert resilient.state[url]['circuit'] == 'open'
+
+    time.sleep(0.06)
+    assert resilient.post(url, 'payload').status_code == 200
+    assert resilient.state[url]['circuit'] == 'closed'
+
+
+def test_latency_tracker_window():
+    tracker = LatencyTracker(window=10)
+    assert tracker.percentile(0.95) is None
+    for latency in range(100):
+        tracker.add(latency)
+    assert len(tracker) == 10
+    assert tracker.percentile(0) == 90
+    assert tracker.percentile(0.95) == 99
+
+
+def test_retries_unavailable_op(op, transport):
+    op.inject(status=503, times=2)
+    resilient = ResilientTransport(transport, retries=2, backoff=0.01)
+
+    url = op.assertion(RETURN_TO)
+    result = Verification(url, transport=resilient).verify()
+
+    assert result['identity'] == 'https://eu.wargaming.net/id/1000000-JohnDoe/'
+    assert op.calls['check_authentication'] == 3
+
+
+def test_circuit_opens_on_failing_op(op, transport):
+    op.inject(status=503, times=10)
+    resilient = ResilientTransport(transport, retries=0,
+                                   failure_threshold=3)
+
+    for _ in range(3):
+        response = resilient.post(op.endpoint, 'openid.mode=associate')
+        assert response.status_code == 503
+
+    with pytest.raises(OpenIDCircuitOpen) as error:
+        resilient.post(op.endpoint, 'openid.mode=associate')
+
+    assert error.value.endpoint == op.endpoint
+    assert op.calls['associate'] == 3
+    assert resilient.state[op.endpoint]['circuit'] == 'open'
+    assert resilient.state[op.endpoint]['failures'] == 3
+
+
+def test_deadline_bounds_slow_op(op, transport):
+    op.inject(delay=1, times=3)
+    resilient = ResilientTransport(transport, deadline=0.3, retries=2)
+
+    started = time.monotonic()
+    with pytest.raises(exceptions.Timeout):
+        resilient.post(op.endpoint, 'openid.mode=check_authentication')
+
+    assert time.monotonic() - started < 0.8
+    # the read timed out: a POST is never sent twice
+    assert op.calls['check_authentication'] == 1
+
+
+def test_connection_errors_retried(transport):
+    with StandInOP() as op:
+        endpoint = op.endpoint
+    resilient = ResilientTransport(transport, retries=2, backoff=0.01,
+                                   failure_threshold=10)
+
+    with pytest.raises(exceptions.ConnectionError):
+        resilient.post(endpoint, 'openid.mode=check_authentication')
+
+    assert transport.stats['connections'] == 3
+
+
+def test_hedged_get_bounds_tail_latency(op, transport):
+    resilient = ResilientTransport(transport, hedge_after=0.05)
+    url = op.endpoint + '?openid.mode=checkid_setup'
+
+    op.inject(delay=1)
+    started = time.monotonic()
+    response = resilient.get(url, allow_redirects=False)
+
+    assert time.monotonic() - started < 0.5
+    assert response.status_code == 302
+    assert resilient.hedged == 1
+    assert op.calls['checkid_setup'] == 2
+    resilient.close()
+
+
+def test_hedge_after_p95(op, transport):
+    resilient = ResilientTransport(transport, min_samples=5)
+    url = op.endpoint + '?openid.mode=checkid_setup'
+    for _ in range(5):
+        resilient.get(url, allow_redirects=False)
+    assert resilient.state[op.endpoint]['p95'] < 0.5
+
+    op.inject(delay=1)
+    started = time.monotonic()
+    resilient.get(url, allow_redirects=False)
+
+    assert time.monotonic() - started < 0.5
+    assert resilient.hedged == 1
+    resilient.close()
+
+
+def test_post_not_hedged(op, transport):
+    resilient = ResilientTransport(transport, hedge_after=0.05)
+
+    op.inject(delay=0.3)
+    resilient.post(op.endpoint, 'openid.mode=check_authentication')
+
+    assert resilient.hedged == 0
+    assert op.calls['check_authentication'] == 1
@@ -0,0 +1,125 @@
+from unittest import mock
+
+import pytest
+
+from openid_wargaming.exceptions import OpenIDUnknownEndpoint
+from openid_wargaming.exceptions import OpenIDVerificationFailed
+from openid_wargaming.nonce import MemoryNonceStore
+from openid_wargaming.router import LatencyAverage, RealmRouter
+from openid_wargaming.testing import StandInOP
+from openid_wargaming.utils import REALMS
+
+
+RETURN_TO = 'https://somewhere.com/?request_id=ID1'
+
+
+@pytest.fixture
+def ops():
+    with StandInOP() as eu, StandInOP() as na:
+        yield eu, na
+
+
+@pytest.fixture
+def router(ops):
+    eu, na = ops
+    router = RealmRouter({'eu': [eu.endpoint], 'na': [na.endpoint]})
+    yield router
+    router.close()
+
+
+def test_default_realms():
+    router = RealmRouter()
+    assert set(router.transports) == {'eu', 'na', 'asia', 'ru'}
+    assert router.realm('https://na.wargaming.net/id/openid/') == 'na'
+    assert router.endpoint('eu') == REALMS['eu'][0]
+
+
+def test_latency_average():
+    average = LatencyAverage(alpha=0.5)
+    average.add(1)
+    assert average.value == 1
+    average.add(3)
+    assert average.value == 2
+
+
+def test_authenticate_on_realm_op(ops, router):
+    eu, na = ops
+    location = router.authenticate('na', return_to=RETURN_TO)
+
+    assert '/id/signin/' in location
+    assert na.calls['checkid_setup'] == 1
+    assert eu.calls['checkid_setup'] == 0
+
+
+def test_authenticate_offline(ops, router):
+    eu, _ = ops
+    destination = router.authenticate('eu', offline=True)
+    assert destination.startswith(eu.endpoint + '?')
+    assert eu.calls['checkid_setup'] == 0
+
+
+def test_verify_through_realm_pool(ops, router):
+    eu, na = ops
+    result = router.verify(na.assertion(RETURN_TO))
+
+    assert result['identity'] == 'https://eu.wargaming.net/id/1000000-JohnDoe/'
+    assert na.calls['check_authentication'] == 1
+    assert router.transports['na'].transport.stats['requests'] == 1
+    assert router.transports['eu'].transport.stats['requests'] == 0
+    assert router.stats[na.endpoint] is not None
+
+
+def test_unknown_op_endpoint_rejected_offline():
+    transport = mock.Mock()
+    router = RealmRouter(transport_factory=lambda: transport)
+    url = ('https://somewhere.com/?openid.mode=id_res'
+           '&openid.op_endpoint=https://evil.example.com/openid/'
+           '&openid.return_to=https://somewhere.com/')
+
+    with pytest.raises(OpenIDUnknownEndpoint) as error:
+        router.verify(url)
+
+    assert error.value.endpoint == 'https://evil.example.com/openid/'
+    assert not transport.get.called
+    assert not transport.post.called
+
+
+def test_lowest_latency_endpoint():
+    with StandInOP(latency=0.1) as slow, StandInOP() as fast:
+        router = RealmRouter({'eu': [slow.endpoint, fast.endpoint]})
+        assert router.endpoint('eu') == slow.endpoint  # not measured yet
+
+        router.warm()
+
+        assert router.stats[slow.endpoint] > router.stats[fast.endpoint]
+        assert router.endpoint('eu') == fast.endpoint
+        router.close()
+
+
+def test_failing_endpoint_penalized():
+    with StandInOP() as down:
+        endpoint = down.endpoint
+    with StandInOP() as up:
+        router = RealmRouter({'eu': [endpoint, up.endpoint]})
+        router.warm()
+
+        assert router.stats[endpoint] == router.penalty
+        assert router.endpoint('eu') == up.endpoint
+        router.close()
+
+
+def test_readme_example_with_nonce_store(ops):
+    eu, _ = ops
+    store = MemoryNonceStore()
+    router = RealmRouter({'eu': [eu.endpoint]}, store=store)
+
+    url = router.authenticate('eu', return_to=RETURN_TO)
+    assert '/id/signin/' in url
+    assert router.authenticate('eu', offline=True)
+
+    assertion = eu.assertion(RETURN_TO)
+    router.verify(assertion)
+    assert len(store) == 1
+    with pytest.raises(OpenIDVerificationFailed):
+        router.verify(assertion)
+    router.close()
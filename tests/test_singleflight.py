@@ -0,0 +1,186 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from openid_wargaming.asynchronous import AsyncVerification
+from openid_wargaming.exceptions import OpenIDVerificationFailed
+from openid_wargaming.nonce import MemoryNonceStore
+from openid_wargaming.singleflight import AsyncSingleFlight, SingleFlight
+from openid_wargaming.testing import StandInOP
+from openid_wargaming.transport import Transport
+from openid_wargaming.verification import Verification
+
+
+RETURN_TO = 'https://somewhere.com/?request_id=ID1'
+CONCURRENCY = 8
+
+
+@pytest.fixture
+def op():
+    # slow enough for every verification to start during the first one
+    with StandInOP(latency=0.3) as server:
+        yield server
+
+
+def test_single_flight_shares_result():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def slow():
+        release.wait()
+        return 'result'
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        futures = [executor.submit(flights.do, 'key', slow)
+                   for _ in range(CONCURRENCY)]
+        while flights.stats['shared'] < CONCURRENCY - 1:
+            time.sleep(0.001)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert results == ['result'] * CONCURRENCY
+    assert flights.stats == {'calls': 1, 'shared': CONCURRENCY - 1,
+                             'in_flight': 0}
+
+
+def test_single_flight_shares_exception():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait()
+        raise ValueError('down')
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(flights.do, 'key', failing)
+                   for _ in range(2)]
+        while flights.stats['shared'] < 1:
+            time.sleep(0.001)
+        release.set()
+
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+
+    assert flights.do('key', lambda: 'again') == 'again'
+    assert flights.stats['calls'] == 2
+
+
+def test_async_single_flight_different_keys():
+    flights = AsyncSingleFlight()
+
+    async def value(result):
+        await asyncio.sleep(0.01)
+        return result
+
+    async def run():
+        return await asyncio.gather(flights.do('a', value, 1),
+                                     flights.do('a', value, 1),
+                                     flights.do('b', value, 2))
+
+    assert asyncio.run(run()) == [1, 1, 2]
+    assert flights.stats == {'calls': 2, 'shared': 1, 'in_flight': 0}
+
+
+def test_async_single_flight_leader_cancelled():
+    flights = AsyncSingleFlight()
+
+    async def value(result):
+        await asyncio.sleep(0.05)
+        return result
+
+    async def run():
+        leader = asyncio.ensure_future(flights.do('a', value, 1))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flights.do('a', value, 1))
+        await asyncio.sleep(0.01)
+        leader.cancel()  # client of the first request gone
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(run()) == 1
+    assert flights.stats == {'calls': 1, 'shared': 1, 'in_flight': 0}
+
+
+def test_async_single_flight_shares_exception():
+    flights = AsyncSingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError('down')
+
+    async def run():
+        return await asyncio.gather(flights.do('a', failing),
+                                     flights.do('a', failing),
+                                     return_exceptions=True)
+
+    assert [type(error) for error in asyncio.run(run())] == \
+        [ValueError, ValueError]
+
+
+def test_concurrent_verifications_one_op_call(op):
+    url = op.assertion(RETURN_TO)
+    flights, transport = SingleFlight(), Transport(pool_maxsize=CONCURRENCY)
+
+    def verify(_):
+        return Verification(url, transport=transport,
+                            flights=flights).verify()
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        results = list(executor.map(verify, range(CONCURRENCY)))
+    transport.close()
+
+    assert len({result['identity'] for result in results}) == 1
+    assert op.calls['check_authentication'] == 1
+    assert flights.stats['shared'] == CONCURRENCY - 1
+
+
+def test_concurrent_verifications_nonce_committed_once(op):
+    url = op.assertion(RETURN_TO)
+    flights, store = SingleFlight(), MemoryNonceStore()
+
+    def verify(_):
+        try:
+            return Verification(url, store=store, flights=flights).verify()
+        except OpenIDVerificationFailed as error:
+            return error.validator
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        results = list(executor.map(verify, range(CONCURRENCY)))
+
+    assert results.count('commit_nonce') == CONCURRENCY - 1
+    assert op.calls['check_authentication'] == 1
+
+
+def test_forged_assertion_shares_failure(op):
+    url = op.assertion(RETURN_TO).replace('JohnDoe', 'Mallory')
+    flights = SingleFlight()
+
+    def verify(_):
+        with pytest.raises(OpenIDVerificationFailed):
+            Verification(url, flights=flights).verify()
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        list(executor.map(verify, range(CONCURRENCY)))
+
+    assert op.calls['check_authentication'] == 1
+
+
+def test_async_concurrent_verifications_one_op_call(op):
+    url = op.assertion(RETURN_TO)
+    flights = AsyncSingleFlight()
+
+    async def run():
+        return await asyncio.gather(*[
+            AsyncVerification(url, flights=flights).verify()
+            for _ in range(CONCURRENCY)])
+
+    results = asyncio.run(run())
+
+    assert len({result['identity'] for result in results}) == 1
+    assert op.calls['check_authentication'] == 1
+    assert flights.stats['shared'] == CONCURRENCY - 1
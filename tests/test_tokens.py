@@ -0,0 +1,168 @@
+from urllib.parse import parse_qs, quote, urlparse
+
+import pytest
+
+from openid_wargaming.authentication import Authentication
+from openid_wargaming.authentication import AuthenticationTemplate
+from openid_wargaming.exceptions import OpenIDInvalidToken
+from openid_wargaming.exceptions import OpenIDVerificationFailed
+from openid_wargaming.testing import StandInOP
+from openid_wargaming.tokens import make_token, read_token
+from openid_wargaming.verification import Verification
+
+
+SECRET = 'some secret'
+RETURN_TO_BASE = 'https://somewhere.com/callback'
+
+
+class Clock:
+    def __init__(self, now=1500000000):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_round_trip():
+    token = make_token(SECRET, 'ID.1', ttl=600)
+    assert read_token(SECRET, token) == 'ID.1'
+
+
+@pytest.mark.parametrize('token,message', [
+    (None, 'malformed token'),
+    ('ID1', 'malformed token'),
+    ('ID1.now.later.sig', 'malformed token'),
+])
+def test_malformed_token(token, message):
+    with pytest.raises(OpenIDInvalidToken) as error:
+        read_token(SECRET, token)
+    assert error.value.message == message
+
+
+def test_forged_token():
+    token = make_token(SECRET, 'ID1')
+    request_id, issued_at, expires_at, signature = token.split('.')
+    forged = '.'.join(('ID2', issued_at, expires_at, signature))
+
+    for token in (forged, make_token('other secret', 'ID1')):
+        with pytest.raises(OpenIDInvalidToken) as error:
+            read_token(SECRET, token)
+        assert error.value.message == 'forged token'
+
+
+def test_expired_token():
+    clock = Clock()
+    token = make_token(SECRET, 'ID1', ttl=600, clock=clock)
+
+    clock.now += 600
+    assert read_token(SECRET, token, clock=clock) == 'ID1'
+
+    clock.now += 1
+    with pytest.raises(OpenIDInvalidToken) as error:
+        read_token(SECRET, token, clock=clock)
+    assert error.value.message == 'expired token'
+
+
+def test_future_token():
+    clock = Clock()
+    token = make_token(SECRET, 'ID1', ttl=600, clock=Clock(clock.now + 61))
+
+    with pytest.raises(OpenIDInvalidToken) as error:
+        read_token(SECRET, token, skew=60, clock=clock)
+    assert error.value.message == 'token issued in the future'
+
+
+def test_read_token_non_ascii_signature():
+    with pytest.raises(OpenIDInvalidToken) as error:
+        read_token(SECRET, 'a.1.9999999999.\xe9')
+    assert error.value.message == 'forged token'
+
+
+def test_authentication_token_return_to():
+    auth = Authentication(return_to_base=RETURN_TO_BASE, request_id='ID1',
+                          secret=SECRET, token_ttl=600)
+
+    base, token = auth.return_to.split('?token=')
+    assert base == RETURN_TO_BASE
+    assert read_token(SECRET, token) == 'ID1'
+
+
+def test_template_token_return_to():
+    template = AuthenticationTemplate(RETURN_TO_BASE, RETURN_TO_BASE,
+                                      secret=SECRET, token_ttl=600)
+    for request_id, url in (template.start(), template.start('id &?.')):
+        return_to = parse_qs(urlparse(url).query)['openid.return_to'][0]
+        token = parse_qs(urlparse(return_to).query)['token'][0]
+
+        assert return_to.startswith(RETURN_TO_BASE + '?token=')
+        assert read_token(SECRET, token) == request_id
+
+
+def test_verification_with_token():
+    with StandInOP() as op:
+        auth = Authentication(return_to_base=RETURN_TO_BASE,
+                              secret=SECRET, token_ttl=600)
+        verify = Verification(op.assertion(auth.return_to), secret=SECRET)
+        verify.verify()
+
+    assert verify.request_id == auth.request_id
+
+
+def test_forged_callback_rejected_before_nonce_and_op():
+    with StandInOP() as op:
+        return_to = RETURN_TO_BASE + '?token=' + make_token('other', 'ID1')
+        reader = []
+        verify = Verification(op.assertion(return_to), secret=SECRET,
+                              reader=reader.append)
+
+        with pytest.raises(OpenIDVerificationFailed) as error:
+            verify.verify()
+
+        assert op.calls['check_authentication'] == 0
+
+    assert error.value.validator == 'verify_request_token'
+    assert verify.reason == 'forged token'
+    assert reader == []
+
+
+def test_missing_token_rejected():
+    with StandInOP() as op:
+        verify = Verification(op.assertion(RETURN_TO_BASE + '?request_id=1'),
+                              secret=SECRET)
+        assert not verify.verify_request_token()
+
+    assert verify.reason == 'missing token'
+
+
+def test_verification_with_state():
+    with StandInOP() as op:
+        auth = Authentication(return_to_base=RETURN_TO_BASE, secret=SECRET)
+        verify = Verification(op.assertion(auth.return_to), secret=SECRET)
+        verify.verify()
+
+    assert verify.request_id == auth.request_id
+
+
+def test_forged_state_rejected():
+    with StandInOP() as op:
+        auth = Authentication(return_to_base=RETURN_TO_BASE,
+                              request_id='ID1', secret='other')
+        verify = Verification(op.assertion(auth.return_to), secret=SECRET)
+
+        with pytest.raises(OpenIDVerificationFailed) as error:
+            verify.verify()
+
+        assert op.calls['check_authentication'] == 0
+
+    assert error.value.validator == 'verify_request_token'
+    assert verify.reason == 'forged state'
+
+
+def test_non_ascii_state_rejected():
+    verify = Verification(
+        'https://somewhere.com/?openid.return_to=' + quote(
+            RETURN_TO_BASE + '?request_id=ID1&state=\xe9', safe=''),
+        secret=SECRET)
+
+    assert not verify.verify_request_token()
+    assert verify.reason == 'forged state'
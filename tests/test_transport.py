@@ -0,0 +1,53 @@
+import pytest
+from requests import exceptions
+
+from openid_wargaming.authentication import Authentication
+from openid_wargaming.testing import StandInOP
+from openid_wargaming.transport import Transport
+from openid_wargaming.verification import Verification
+
+
+RETURN_TO = 'https://somewhere.com/?request_id=ID1'
+
+
+@pytest.fixture
+def transport():
+    transport = Transport(pool_maxsize=2, timeout=5)
+    yield transport
+    transport.close()
+
+
+def test_transport_defaults(transport):
+    assert transport.timeout == 5
+    assert transport.stats == {'requests': 0, 'connections': 0, 'reused': 0}
+
+
+def test_transport_reuses_connections(op, transport):
+    for _ in range(5):
+        url = op.assertion(RETURN_TO)
+        Verification(url, transport=transport).verify()
+
+    assert op.calls['check_authentication'] == 5
+    assert transport.stats == {'requests': 5, 'connections': 1, 'reused': 4}
+
+
+def test_transport_shared_by_authentication_and_verification(op, transport):
+    auth = Authentication(return_to=RETURN_TO, transport=transport)
+    location = auth.authenticate(op.endpoint)
+    Verification(op.assertion(RETURN_TO), transport=transport).verify()
+
+    assert '/id/signin/' in location
+    assert transport.stats['requests'] == 2
+    assert transport.stats['reused'] == 1
+
+
+def test_transport_retries_connection_errors():
+    transport = Transport(retries=2, timeout=1)
+    with StandInOP() as op:
+        endpoint = op.endpoint
+
+    with pytest.raises(exceptions.ConnectionError):
+        transport.post(endpoint, 'openid.mode=check_authentication')
+
+    # first attempt plus two retries
+    assert transport.stats['connections'] == 3
@@ -1,18 +1,36 @@
 from unittest import mock
 
 
-@mock.patch('openid_wargaming.utils.post')
+@mock.patch('openid_wargaming.utils.get')
 def test_create_return_to(mock_requests):
     from openid_wargaming.utils import create_return_to
     from uuid import uuid4
     from urllib.parse import urlparse
-    mock_requests.return_value = mock.MagicMock(json=lambda: {'name': uuid4().hex})
+    url = 'https://httpbin.org/get?uuid=' + uuid4().hex
+    mock_requests.return_value = mock.MagicMock(json=lambda: {'url': url})
     url = create_return_to(uuid4().hex)
     parsed = urlparse(url)
     assert 'http' in url
     assert True if [parsed.scheme, parsed.netloc, parsed.path] else False
 
 
+def test_build_return_to():
+    from openid_wargaming.utils import build_return_to
+    assert build_return_to('https://example.com/', 'ID1') == \
+        'https://example.com/?request_id=ID1'
+    assert build_return_to('https://example.com/?lang=en', 'ID1') == \
+        'https://example.com/?lang=en&request_id=ID1'
+
+
+def test_build_return_to_signed():
+    from openid_wargaming.utils import build_return_to, sign_state
+    from urllib.parse import urlparse, parse_qs
+    url = build_return_to('https://example.com/', 'ID1', secret=b'key')
+    query = parse_qs(urlparse(url).query)
+    assert query['state'][0] == sign_state(b'key', 'ID1')
+    assert sign_state(b'key', 'ID1') != sign_state(b'other', 'ID1')
+
+
 def test_saver():
     from openid_wargaming.utils import nonce_saver
     assert nonce_saver(None)
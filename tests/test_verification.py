@@ -1,8 +1,34 @@
+import time
 from unittest import mock
+from urllib.parse import parse_qs, urlencode
 
 import pytest
 
-from openid_wargaming.verification import Verification
+from openid_wargaming.exceptions import OpenIDVerificationFailed
+from openid_wargaming.exceptions import OpenIDUnknownEndpoint
+from openid_wargaming.identity import parse_identity, WargamingIdentity
+from openid_wargaming.verification import Verification, Verifier
+
+
+def positive_assertion(**fields):
+    """Well formed positive assertion with a fresh nonce"""
+    nonce = time.strftime('%Y-%m-%dT%H:%M:%SZunique', time.gmtime())
+    values = {
+        'openid.mode': 'id_res',
+        'openid.return_to': 'https://somewhere.com/?request_id=ID1',
+        'request_id': 'ID1',
+        'openid.response_nonce': nonce,
+        'openid.op_endpoint': 'http://somewhere.com',
+        'openid.identity': 'JohnDoe',
+        'openid.claimed_id': 'JohnDoe',
+        'openid.assoc_handle': 'handle',
+        'openid.signed': 'op_endpoint,claimed_id,identity,return_to,'
+                         'response_nonce,assoc_handle',
+        'openid.sig': 'c2lnbmF0dXJl',
+    }
+    values.update(fields)
+    return 'https://somewhere.com/?' + urlencode(
+        {key: value for key, value in values.items() if value is not None})
 
 
 @pytest.fixture
@@ -84,6 +110,19 @@ def test_return_url_query_params_present_on_the_current_url_and_with_same_value(
     assert verify.verify_return_url()
 
 
+def test_verification_from_request_parts():
+    query = positive_assertion().split('?', 1)[1]
+    verify = Verification.from_parts('https', 'somewhere.com', '/', query)
+
+    assert verify.parsed.fields == Verification(positive_assertion()).parsed.fields
+    assert verify.verify_return_url()
+
+    from openid_wargaming.exceptions import OpenIDFailReturnURLVerification
+    with pytest.raises(OpenIDFailReturnURLVerification):
+        Verification.from_parts('http', 'somewhere.com', '/',
+                                query).verify_return_url()
+
+
 def test_return_url_query_params_present_on_the_current_url_and_with_different_value():
     from openid_wargaming.exceptions import OpenIDFailReturnURLVerification
     assertion_url = 'https://somewhere.com/?openid.mode=id_res&openid.' \
@@ -157,6 +196,26 @@ def test_fields_presence_in_identity(verify):
     assert 'claimed_id' in verify.identify_the_end_user()
 
 
+def test_identify_the_end_user_as_identity():
+    assertion_url = 'https://somewhere.com/?openid.identity=https%3A%2F%2F' \
+                    'na.wargaming.net%2Fid%2F1000000-JohnDoe%2F' \
+                    '&openid.op_endpoint=https%3A%2F%2F' \
+                    'na.wargaming.net%2Fid%2Fopenid%2F'
+    verify = Verification(assertion_url)
+
+    with mock.patch('openid_wargaming.verification.parse_identity',
+                    wraps=parse_identity) as mock_parse:
+        identity = verify.identify_the_end_user(as_identity=True)
+        assert verify.identify_the_end_user(as_identity=True) is identity
+
+    assert identity == WargamingIdentity(1000000, 'JohnDoe', 'na')
+    assert mock_parse.call_count == 1
+
+
+def test_identify_the_end_user_not_wargaming(verify):
+    assert verify.identify_the_end_user(as_identity=True) is None
+
+
 def test_verify_failed():
     from openid_wargaming.exceptions import OpenIDVerificationFailed
     assertion_url = 'https://somewhere.com/?openid.mode=check_authentication' \
@@ -177,11 +236,249 @@ def test_verify_success(mock_request):
     field1: value1
     """
     mock_request.return_value.text = return_value
-    assertion_url = 'https://somewhere.com/?openid.mode=id_res' \
-                    '&openid.' \
-                    'return_to=https%3A%2F%2Fsomewhere.com%2F%3Frequest_id' \
-                    '%3DID1&request_id=ID1&openid.response_nonce=somevalue&' \
-                    'openid.op_endpoint=http://somewhere.com&' \
-                    'openid.identity=JohnDoe&openid.claimed_id=JohnDoe'
+    assertion_url = positive_assertion()
     verify = Verification(assertion_url)
     verify.verify()
+
+
+def test_parsed_assertion_fields(verify):
+    assert verify.parsed.fields['openid.identity'] == 'JohnDoe'
+    assert verify.parsed.return_to.netloc == 'another.url'
+    assert verify.parsed.return_to_fields == {}
+
+
+@mock.patch('openid_wargaming.verification.post')
+def test_assertion_is_parsed_only_once(mock_request):
+    mock_request.return_value.text = 'is_valid:true\n'
+    assertion_url = positive_assertion()
+
+    with mock.patch('openid_wargaming.verification.parse_qs',
+                    wraps=parse_qs) as mock_parse:
+        verify = Verification(assertion_url)
+        verify.verify()
+
+    # assertion query and return_to query
+    assert mock_parse.call_count == 2
+    assert verify.parsed.fields['openid.mode'] == 'id_res'
+
+
+def test_parse_l2l_keeps_colons_in_values(verify):
+    response = 'ns:http://specs.openid.net/auth/2.0\nis_valid:false\n'
+    assert verify.parse_l2l(response) == {
+        'ns': 'http://specs.openid.net/auth/2.0', 'is_valid': False}
+
+
+@pytest.mark.parametrize('fields,reason', [
+    ({'openid.sig': None}, 'missing signature'),
+    ({'openid.signed': 'op_endpoint,return_to,response_nonce'},
+     'field assoc_handle is not signed'),
+    ({'openid.signed': 'op_endpoint,return_to,response_nonce,assoc_handle,'
+                       'identity'}, 'field claimed_id is not signed'),
+    ({'openid.op_endpoint': None}, 'missing field op_endpoint'),
+])
+def test_verify_signed_fields_failed(fields, reason):
+    verify = Verification(positive_assertion(**fields))
+    assert not verify.verify_signed_fields()
+    assert verify.reason == reason
+
+
+def test_missing_op_endpoint_rejected_locally():
+    verify = Verification(positive_assertion(**{'openid.op_endpoint': None}),
+                          reader=lambda nonce: False)
+
+    with pytest.raises(OpenIDVerificationFailed) as error:
+        verify.verify()
+    assert error.value.validator == 'verify_signed_fields'
+
+
+def test_verify_signed_fields_without_identifier():
+    verify = Verification(positive_assertion(**{
+        'openid.identity': None, 'openid.claimed_id': None,
+        'openid.signed': 'op_endpoint,return_to,response_nonce,'
+                         'assoc_handle'}))
+    assert verify.verify_signed_fields()
+
+
+@pytest.mark.parametrize('nonce,reason', [
+    (None, 'missing nonce'),
+    ('somevalue', 'malformed nonce'),
+    ('2017-08-10T12:00:00Zunique', 'stale nonce'),
+    ('2999-08-10T12:00:00Zunique', 'stale nonce'),
+])
+def test_check_nonce_timestamp_failed(nonce, reason):
+    verify = Verification(positive_assertion(
+        **{'openid.response_nonce': nonce}))
+    assert not verify.check_nonce_timestamp()
+    assert verify.reason == reason
+
+
+def test_validators_cheapest_first(verify):
+    assert [validator.__name__ for validator in verify.validators] == [
+        'is_positive_assertion', 'verify_return_url', 'verify_request_token',
+        'verify_signed_fields', 'check_nonce_timestamp',
+        'check_nonce',
+        'verify_discovered_information', 'verify_signatures',
+        'commit_nonce']
+
+
+@pytest.mark.parametrize('fields', [
+    {'openid.mode': 'cancel'},
+    {'request_id': 'ID2'},
+    {'openid.sig': None},
+    {'openid.response_nonce': '2017-08-10T12:00:00Zunique'},
+])
+@mock.patch('openid_wargaming.verification.post')
+def test_junk_rejected_without_io(mock_request, fields):
+    reader = mock.Mock(return_value=False)
+    saver = mock.Mock()
+    verify = Verification(positive_assertion(**fields), reader=reader,
+                          saver=saver)
+
+    with pytest.raises(Exception):
+        verify.verify()
+
+    assert not mock_request.called
+    assert not reader.called
+    assert not saver.called
+
+
+@mock.patch('openid_wargaming.verification.post')
+def test_nonce_saved_only_after_valid_signature(mock_request):
+    mock_request.return_value.text = 'is_valid:false\n'
+    saver = mock.Mock()
+    verify = Verification(positive_assertion(), saver=saver)
+
+    with pytest.raises(OpenIDVerificationFailed) as error:
+        verify.verify()
+
+    assert error.value.validator == 'verify_signatures'
+    assert not saver.called
+
+    mock_request.return_value.text = 'is_valid:true\n'
+    Verification(positive_assertion(), saver=saver).verify()
+    assert saver.called
+
+
+@mock.patch('openid_wargaming.verification.post')
+def test_replay_rejected_before_signature(mock_request):
+    verify = Verification(positive_assertion(),
+                          reader=mock.Mock(return_value=True))
+
+    with pytest.raises(OpenIDVerificationFailed) as error:
+        verify.verify()
+
+    assert error.value.validator == 'check_nonce'
+    assert verify.reason == 'replayed nonce'
+    assert not mock_request.called
+
+
+def signed_transport(is_valid='true'):
+    transport = mock.Mock()
+    transport.post.return_value.text = 'is_valid:%s\n' % is_valid
+    return transport
+
+
+def test_verifier_verify():
+    transport = signed_transport()
+    verifier = Verifier(transport=transport)
+
+    identities = verifier.verify(positive_assertion())
+
+    assert identities == {'identity': 'JohnDoe', 'claimed_id': 'JohnDoe'}
+    assert transport.post.call_count == 1
+    assert verifier.verify(positive_assertion(), as_identity=True) is None
+
+
+def test_verifier_failure_state_not_shared():
+    transport = signed_transport()
+    verifier = Verifier(transport=transport,
+                        reader=lambda nonce: nonce.endswith('replayed'))
+    replayed = positive_assertion(**{
+        'openid.response_nonce': time.strftime('%Y-%m-%dT%H:%M:%SZreplayed',
+                                               time.gmtime())})
+
+    with pytest.raises(OpenIDVerificationFailed) as error:
+        verifier.verify(replayed)
+
+    assert error.value.validator == 'check_nonce'
+    assert verifier.verify(positive_assertion())
+    assert not hasattr(verifier.context, 'reason')
+
+
+def test_verifier_unknown_endpoint_rejected_first():
+    transport = signed_transport()
+    verifier = Verifier(['https://eu.wargaming.net/id/openid/'],
+                        transport=transport)
+
+    with pytest.raises(OpenIDUnknownEndpoint) as error:
+        verifier.verify(positive_assertion())
+
+    assert error.value.endpoint == 'http://somewhere.com'
+    assert not transport.post.called
+
+
+def test_verifier_shared_by_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    from openid_wargaming.nonce import MemoryNonceStore
+
+    verifier = Verifier(transport=signed_transport(),
+                        store=MemoryNonceStore())
+    urls = [positive_assertion(**{
+        'openid.response_nonce': time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                                               time.gmtime()) + str(index),
+        'openid.identity': 'Player%d' % index}) for index in range(64)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(verifier.verify, urls))
+
+    assert [result['identity'] for result in results] == \
+        ['Player%d' % index for index in range(64)]
+    with pytest.raises(OpenIDVerificationFailed) as error:
+        verifier.verify(urls[0])
+    assert error.value.validator == 'check_nonce'
+
+
+def test_verifier_observed_like_verification():
+    events, expected = [], []
+    observer = mock.Mock()
+    observer.record.side_effect = lambda *args: events.append(args[:2])
+    Verifier(transport=signed_transport(),
+             observer=observer).verify(positive_assertion())
+
+    observer.record.side_effect = lambda *args: expected.append(args[:2])
+    Verification(positive_assertion(), transport=signed_transport(),
+                 observer=observer).verify()
+
+    assert events == expected
+
+
+def test_verifier_rejects_async_verification():
+    from openid_wargaming.asynchronous import AsyncVerification
+
+    with pytest.raises(TypeError):
+        Verifier(verification=AsyncVerification)
+
+
+def test_verifier_unknown_argument():
+    with pytest.raises(TypeError):
+        Verifier(evidence={})
+
+
+@pytest.mark.usefixtures('trusted_op')
+def test_verifier_forged_assertion_rejected(op):
+    verifier = Verifier([op.endpoint])
+    url = op.assertion('https://somewhere.com/?request_id=ID1')
+
+    with pytest.raises(OpenIDVerificationFailed) as error:
+        verifier.verify(url.replace('JohnDoe', 'Admin'))
+
+    assert error.value.validator == 'verify_signatures'
+    assert verifier.verify(url, as_identity=True).nickname == 'JohnDoe'
+
+
+def test_identity_of_another_op_is_not_trusted(op):
+    url = op.assertion('https://somewhere.com/?request_id=ID1')
+    verify = Verification(url)
+
+    assert verify.verify()['identity'].startswith('https://eu.wargaming.net/')
+    assert verify.identity is None